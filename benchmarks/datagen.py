@@ -0,0 +1,192 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+
+"""Synthetic datalogger files for benchmarks.
+
+Generates CR10X mixed array files and TOA5 (CR1000 style) table files that look like
+real station output: 10 minute records, a daily summary array, CR10X floats without
+leading zeros and occasional truncated rows. Output is deterministic for a given seed.
+
+"""
+
+import os
+import random
+
+from datetime import datetime, timedelta
+
+SIZES = {'10k': 10000, '1m': 1000000, '10m': 10000000}
+
+START_TIME = datetime(2016, 1, 1)
+RECORD_INTERVAL = timedelta(minutes=10)
+TRUNCATED_ROW_INTERVAL = 1000
+
+MIXED_ARRAY_IDS = {
+    '100': {
+        'name': 'Measurements',
+        'column_names': ['ID', 'Year', 'Day', 'Hour_Minute', 'AirTC', 'RH', 'WS_ms', 'WindDir'],
+        'export_columns': ['Timestamp', 'AirTC', 'RH', 'WS_ms', 'WindDir'],
+        'time_columns': ['Year', 'Day', 'Hour_Minute'],
+        'time_parsed_column_name': 'Timestamp',
+        'to_utc': True,
+    },
+    '101': {
+        'name': 'Daily',
+        'column_names': ['ID', 'Year', 'Day', 'AirTC_Max', 'AirTC_Min', 'Rain_mm'],
+        'export_columns': ['Timestamp', 'AirTC_Max', 'AirTC_Min', 'Rain_mm'],
+        'time_columns': ['Year', 'Day'],
+        'time_parsed_column_name': 'Timestamp',
+        'include_time_zone': True,
+    },
+}
+
+TABLE_COLUMN_NAMES = ['TIMESTAMP', 'RECORD', 'AirTC', 'RH', 'WS_ms', 'WindDir', 'BattV']
+TABLE_UNITS = ['TS', 'RN', 'Deg C', '%', 'meters/second', 'degrees', 'Volts']
+TABLE_PROCESSING = ['', '', 'Smp', 'Smp', 'Avg', 'Smp', 'Min']
+
+
+def cr10x_float(value, decimals=3):
+    """Formats a float the way CR10X dataloggers do: no leading zero, no trailing zeros.
+
+    Parameters
+    ----------
+    value : float
+        Value to format.
+    decimals : int, optional
+        Maximum number of decimals.
+
+    Returns
+    -------
+    str
+        Formatted value, e.g. '.794', '-.5' or '14.05'.
+
+    """
+    formatted = '{value:.{decimals}f}'.format(value=value, decimals=decimals)
+    formatted = formatted.rstrip('0').rstrip('.')
+    if formatted.startswith('0.'):
+        formatted = formatted[1:]
+    elif formatted.startswith('-0.'):
+        formatted = '-' + formatted[2:]
+    elif formatted in ('', '-0', '-'):
+        formatted = '0'
+
+    return formatted
+
+
+def _measurement_values(rng):
+    return [
+        rng.gauss(8.0, 6.0),
+        rng.uniform(30.0, 100.0),
+        abs(rng.gauss(3.0, 2.0)),
+        rng.uniform(0.0, 360.0),
+    ]
+
+
+def generate_mixed_array_file(outfile_path, num_rows, seed=0):
+    """Writes a CR10X mixed array file.
+
+    Array id 100 is written every 10 minutes, array id 101 at the end of each day.
+    Every TRUNCATED_ROW_INTERVAL:th row misses its last value, which the
+    formatter writes to the array's mismatches file.
+
+    Parameters
+    ----------
+    outfile_path : str
+        Output file's absolute path.
+    num_rows : int
+        Number of rows (lines) to write.
+    seed : int, optional
+        Random seed.
+
+    """
+    rng = random.Random(seed)
+    time = START_TIME
+    num_written = 0
+
+    def write_row(f, values):
+        f.write(','.join(values) + '\n')
+
+    with open(outfile_path, 'w') as f:
+        while num_written < num_rows:
+            year = str(time.year)
+            day = str(time.timetuple().tm_yday)
+            values = ['100', year, day, str(time.hour * 100 + time.minute)] + [
+                cr10x_float(value) for value in _measurement_values(rng)]
+            if num_written % TRUNCATED_ROW_INTERVAL == TRUNCATED_ROW_INTERVAL - 1:
+                values = values[:-1]
+            write_row(f, values)
+            num_written += 1
+
+            previous_time = time
+            time += RECORD_INTERVAL
+            if time.date() != previous_time.date() and num_written < num_rows:
+                write_row(f, ['101', year, day, cr10x_float(rng.gauss(14.0, 6.0)),
+                              cr10x_float(rng.gauss(2.0, 6.0)),
+                              cr10x_float(rng.expovariate(0.5), 1)])
+                num_written += 1
+
+
+def generate_table_file(outfile_path, num_rows, seed=0):
+    """Writes a TOA5 table file, with the four TOA5 header lines.
+
+    Parameters
+    ----------
+    outfile_path : str
+        Output file's absolute path.
+    num_rows : int
+        Number of data rows to write.
+    seed : int, optional
+        Random seed.
+
+    """
+    rng = random.Random(seed)
+    time = START_TIME
+
+    def quote(values):
+        return ','.join('"{value}"'.format(value=value) for value in values)
+
+    with open(outfile_path, 'w') as f:
+        f.write(quote(['TOA5', 'Station', 'CR1000', '1234', 'CR1000.Std.22', 'CPU:station.CR1',
+                       '4321', 'Table']) + '\n')
+        f.write(quote(TABLE_COLUMN_NAMES) + '\n')
+        f.write(quote(TABLE_UNITS) + '\n')
+        f.write(quote(TABLE_PROCESSING) + '\n')
+        for record in range(num_rows):
+            time += RECORD_INTERVAL
+            values = ['{value:.4g}'.format(value=value) for value in _measurement_values(rng)]
+            values.append('{value:.4g}'.format(value=rng.uniform(12.0, 13.8)))
+            f.write('"{time}",{record},{values}\n'.format(
+                time=time.strftime('%Y-%m-%d %H:%M:%S'), record=record, values=','.join(values)))
+
+
+def get_data_files(data_dir, num_rows, seed=0):
+    """Returns the mixed array and table files with a given number of rows, generating
+    them if they do not exist yet.
+
+    Parameters
+    ----------
+    data_dir : str
+        Directory to keep the generated files in.
+    num_rows : int
+        Number of rows per file.
+    seed : int, optional
+        Random seed.
+
+    Returns
+    -------
+    tuple of str
+        Mixed array and table file paths.
+
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    files = []
+
+    for kind, generate in [('mixed', generate_mixed_array_file), ('table', generate_table_file)]:
+        file_path = os.path.join(data_dir, '{kind}_{num_rows}_{seed}.dat'.format(
+            kind=kind, num_rows=num_rows, seed=seed))
+        if not os.path.exists(file_path):
+            tmp_path = file_path + '.tmp'
+            generate(tmp_path, num_rows, seed)
+            os.replace(tmp_path, file_path)
+        files.append(file_path)
+
+    return tuple(files)
@@ -0,0 +1,341 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+
+"""Benchmarks for the logger files formatter.
+
+Times process_mixed_array and process_table_based end to end, and each stage of the
+pipeline on its own (read, update_column_names, parse_time, projection and export), on
+generated files of 10k, 1M or 10M rows (see datagen). Results are written as JSON, so
+runs from different commits can be compared:
+
+    python -m benchmarks.formatter_benchmarks --sizes 10k 1m --output before.json
+    python -m benchmarks.formatter_benchmarks --sizes 10k 1m --output after.json \\
+        --compare before.json
+
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+
+from datetime import datetime
+
+from campbellsciparser import cr
+
+from benchmarks import datagen
+from services import columnar
+from services import loggerfilesformatter
+from services import readers
+from services import timeparsing
+from services import writers
+
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'erkenlab-benchmarks')
+DEFAULT_SIZES = ['10k']
+
+TIME_ZONE = 'Europe/Stockholm'
+MIXED_ARRAY_TIME_FORMATS = ['%Y', '%j', '%H%M']
+TABLE_TIME_FORMATS = ['%Y-%m-%d %H:%M:%S']
+TABLE_HEADER_ROW = 1
+TABLE_FIRST_DATA_LINE = 4
+
+TABLE_INFO = {
+    'name': 'Table',
+    'header_row': TABLE_HEADER_ROW,
+    'line_num': TABLE_FIRST_DATA_LINE,
+    'time_zone': 'Etc/GMT-1',
+    'time_format_args_library': TABLE_TIME_FORMATS,
+    'time_columns': ['TIMESTAMP'],
+    'time_parsed_column_name': 'Timestamp',
+    'export_columns': ['Timestamp', 'AirTC', 'RH', 'WS_ms', 'BattV'],
+    'to_utc': True,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _record(name, size, num_rows, seconds):
+    return {
+        'name': name,
+        'size': size,
+        'rows': num_rows,
+        'seconds': seconds,
+        'rows_per_second': num_rows / seconds if seconds else None,
+    }
+
+
+def _datalogger_info(file_path, engine):
+    return {
+        'memory_structure': 'mixed array',
+        'engine': engine,
+        'file_path': file_path,
+        'line_num': 0,
+        'time_zone': TIME_ZONE,
+        'time_format_args_library': MIXED_ARRAY_TIME_FORMATS,
+        'array_ids': datagen.MIXED_ARRAY_IDS,
+    }
+
+
+def _benchmark_cfg(datalogger_info=None, table_info=None):
+    datalogger_cfg = datalogger_info or {'memory_structure': 'table based',
+                                         'tables': {'table': table_info}}
+    return {'sites': {'site': {'locations': {'location': {'dataloggers': {
+        'datalogger': datalogger_cfg}}}}}}
+
+
+def time_process_mixed_array(file_path, output_dir, engine='rows'):
+    """Times process_mixed_array on a whole file. """
+    datalogger_info = _datalogger_info(file_path, engine)
+    _, seconds = _timed(
+        loggerfilesformatter.process_mixed_array,
+        _benchmark_cfg(datalogger_info=datalogger_info), output_dir, 'site', 'location',
+        'datalogger', datalogger_info)
+
+    return seconds
+
+
+def time_process_table_based(file_path, output_dir):
+    """Times process_table_based on a whole file. """
+    table_info = dict(TABLE_INFO, file_path=file_path)
+    _, seconds = _timed(
+        loggerfilesformatter.process_table_based,
+        _benchmark_cfg(table_info=table_info), output_dir, 'site', 'location', 'datalogger',
+        'table', table_info)
+
+    return seconds
+
+
+def time_mixed_array_stages(file_path, output_dir):
+    """Times each stage of the (rows engine) mixed array pipeline.
+
+    Returns
+    -------
+    dict
+        Seconds per stage, summed over array ids.
+
+    """
+    array_id_names = {
+        array_id: array_id_info['name']
+        for array_id, array_id_info in datagen.MIXED_ARRAY_IDS.items()
+    }
+    timings = dict.fromkeys(
+        ['read', 'update_column_names', 'parse_time', 'projection', 'export'], 0.0)
+
+    read_result, timings['read'] = _timed(
+        readers.read_array_ids_data, file_path, fix_floats=True, array_id_names=array_id_names)
+
+    for array_id_info in datagen.MIXED_ARRAY_IDS.values():
+        data = read_result.data.get(array_id_info['name'], cr.DataSet())
+
+        (data, _), seconds = _timed(
+            cr.update_column_names, data, array_id_info['column_names'],
+            match_row_lengths=True, get_mismatched_row_lengths=True)
+        timings['update_column_names'] += seconds
+
+        data, seconds = _timed(
+            timeparsing.parse_time, data, TIME_ZONE, MIXED_ARRAY_TIME_FORMATS,
+            array_id_info['time_columns'],
+            time_parsed_column=array_id_info['time_parsed_column_name'],
+            to_utc=array_id_info.get('to_utc', False))
+        timings['parse_time'] += seconds
+
+        data, seconds = _timed(writers.ExportPlan(array_id_info['export_columns']).project, data)
+        timings['projection'] += seconds
+
+        outfile_path = os.path.join(output_dir, array_id_info['name'] + '.dat')
+        _, seconds = _timed(
+            writers.export_to_csv, data, outfile_path, export_header=True,
+            include_time_zone=array_id_info.get('include_time_zone', False))
+        timings['export'] += seconds
+
+    return timings
+
+
+def time_table_stages(file_path, output_dir):
+    """Times each stage of the table based pipeline.
+
+    Returns
+    -------
+    dict
+        Seconds per stage.
+
+    """
+    timings = {}
+    byte_offset = readers.find_line_offset(file_path, TABLE_FIRST_DATA_LINE)
+
+    read_result, timings['read'] = _timed(
+        readers.read_table_data, file_path, byte_offset=byte_offset, header_row=TABLE_HEADER_ROW)
+
+    data, timings['parse_time'] = _timed(
+        timeparsing.parse_time, read_result.data, TABLE_INFO['time_zone'], TABLE_TIME_FORMATS,
+        TABLE_INFO['time_columns'], time_parsed_column=TABLE_INFO['time_parsed_column_name'],
+        to_utc=TABLE_INFO['to_utc'])
+
+    data, timings['projection'] = _timed(
+        writers.ExportPlan(TABLE_INFO['export_columns']).project, data)
+
+    _, timings['export'] = _timed(
+        writers.export_to_csv, data, os.path.join(output_dir, 'Table.dat'), export_header=True)
+
+    return timings
+
+
+def run_benchmarks(sizes, data_dir=DEFAULT_DATA_DIR, repeat=1, engines=None):
+    """Runs the benchmarks.
+
+    Parameters
+    ----------
+    sizes : list of str or int
+        File sizes to benchmark, as keys of datagen.SIZES or numbers of rows.
+    data_dir : str, optional
+        Directory to keep the generated data files in.
+    repeat : int, optional
+        Number of times to run each benchmark. The fastest run is reported.
+    engines : list of str, optional
+        Mixed array engines to benchmark. Defaults to 'rows', and 'columnar' if numpy
+        is installed.
+
+    Returns
+    -------
+    dict
+        Benchmark results, with 'results' holding one record per benchmark and size.
+
+    """
+    if engines is None:
+        engines = ['rows'] + (['columnar'] if columnar.np is not None else [])
+
+    results = []
+
+    for size in sizes:
+        num_rows = datagen.SIZES.get(size, size)
+        num_rows = int(num_rows)
+        mixed_file_path, table_file_path = datagen.get_data_files(data_dir, num_rows)
+
+        benchmarks = [
+            ('process_mixed_array[{engine}]'.format(engine=engine),
+             lambda output_dir, engine=engine: {
+                 '': time_process_mixed_array(mixed_file_path, output_dir, engine)})
+            for engine in engines
+        ]
+        benchmarks += [
+            ('process_table_based',
+             lambda output_dir: {'': time_process_table_based(table_file_path, output_dir)}),
+            ('mixed_array', lambda output_dir: time_mixed_array_stages(mixed_file_path, output_dir)),
+            ('table', lambda output_dir: time_table_stages(table_file_path, output_dir)),
+        ]
+
+        for name, benchmark in benchmarks:
+            best = {}
+            for _ in range(repeat):
+                with tempfile.TemporaryDirectory() as output_dir:
+                    for stage, seconds in benchmark(output_dir).items():
+                        best[stage] = min(best.get(stage, seconds), seconds)
+            for stage, seconds in best.items():
+                stage_name = '.'.join(part for part in (name, stage) if part)
+                results.append(_record(stage_name, str(size), num_rows, seconds))
+
+    return {
+        'commit': _git_commit(),
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare_results(old, new):
+    """Compares two benchmark runs.
+
+    Parameters
+    ----------
+    old : dict
+        Baseline results, as returned by run_benchmarks.
+    new : dict
+        Results to compare against the baseline.
+
+    Returns
+    -------
+    list of tuple
+        (name, size, old seconds, new seconds, new / old) for benchmarks found in both.
+
+    """
+    old_seconds = {(record['name'], record['size']): record['seconds']
+                   for record in old['results']}
+    comparison = []
+
+    for record in new['results']:
+        key = (record['name'], record['size'])
+        if key in old_seconds:
+            ratio = record['seconds'] / old_seconds[key] if old_seconds[key] else None
+            comparison.append(key + (old_seconds[key], record['seconds'], ratio))
+
+    return comparison
+
+
+def main():
+    """Parses arguments from the command line and runs the benchmarks. """
+    parser = argparse.ArgumentParser(
+        prog='FormatterBenchmarks',
+        description='Benchmarks the logger files formatter on generated datalogger files.'
+    )
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES,
+                        help='File sizes: {sizes} or a number of rows.'.format(
+                            sizes=', '.join(datagen.SIZES)))
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, dest='data_dir',
+                        help='Directory to keep generated data files in.')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Runs per benchmark, the fastest is reported.')
+    parser.add_argument('--engines', nargs='+', choices=['rows', 'columnar'],
+                        help='Mixed array engines to benchmark.')
+    parser.add_argument('-o', '--output', help='JSON file to write the results to.')
+    parser.add_argument('--compare', help='JSON results file to compare against.')
+
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        if size not in datagen.SIZES and not size.isdigit():
+            parser.error("Unknown size: {size}".format(size=size))
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1.")
+
+    results = run_benchmarks(args.sizes, args.data_dir, args.repeat, args.engines)
+
+    for record in results['results']:
+        print("{name:<40} {size:>6} {seconds:10.3f} s {rows_per_second:12.0f} rows/s".format(
+            **record))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print()
+        for name, size, old_seconds, new_seconds, ratio in compare_results(old, results):
+            print("{name:<40} {size:>6} {old:10.3f} s -> {new:10.3f} s ({ratio:.2f}x)".format(
+                name=name, size=size, old=old_seconds, new=new_seconds, ratio=ratio or 0))
+
+
+if __name__ == '__main__':
+    main()
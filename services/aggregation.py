@@ -0,0 +1,246 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+
+"""Incremental hourly and daily aggregation of processed datalogger data.
+
+Aggregations are declared per array id or table in the configuration file, e.g.
+
+    aggregations:
+      hourly:
+        closed: right  # Windows (start, end], labelled by their end.
+        decimals: 3
+        columns:
+          AirTC: [mean, min, max]
+          Rain_mm: [total]
+
+Each aggregation's window defaults to its name (one of WINDOWS), or is given as
+'window'. The data must be in time order. The open window's running accumulators
+(count, total, min and max per column) are kept as the aggregation's state, stored
+next to the checkpoint. A window is emitted once a row of a later window arrives, so
+every run updates the open window and emits the windows it closed, without reading
+earlier data again. Rows belonging to an already emitted window are skipped.
+
+"""
+
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+from campbellsciparser import cr
+
+WINDOWS = OrderedDict([
+    ('hourly', timedelta(hours=1)),
+    ('daily', timedelta(days=1)),
+])
+
+STATISTICS = ('mean', 'min', 'max', 'total', 'count')
+
+CLOSED_SIDES = ('left', 'right')
+
+Aggregation = namedtuple('Aggregation', ['name', 'window', 'columns', 'closed', 'decimals'])
+
+
+class InvalidAggregationError(ValueError):
+    pass
+
+
+def compile_aggregations(aggregations_info):
+    """Validates and compiles the aggregations of an array id or table.
+
+    Parameters
+    ----------
+    aggregations_info : dict or None
+        Aggregations, by name. Each aggregation has 'columns' (statistics to compute,
+        by column name) and optionally a 'window', 'closed' side ('left' windows are
+        [start, end) and labelled by their start, 'right' windows (start, end] and
+        labelled by their end) and number of 'decimals'.
+
+    Returns
+    -------
+    list of Aggregation
+        Compiled aggregations, in configuration order.
+
+    Raises
+    ------
+    InvalidAggregationError: If an aggregation's window, closed side, columns or
+        statistics are not supported.
+
+    """
+    aggregations = []
+
+    for name, aggregation_info in (aggregations_info or {}).items():
+        window = aggregation_info.get('window', name)
+        closed = aggregation_info.get('closed', 'left')
+        decimals = aggregation_info.get('decimals')
+        columns = aggregation_info.get('columns') or {}
+
+        if window not in WINDOWS:
+            msg = "Unsupported aggregation window: {window}. Supported windows: {windows}"
+            raise InvalidAggregationError(msg.format(window=window, windows=', '.join(WINDOWS)))
+        if closed not in CLOSED_SIDES:
+            msg = "Unsupported closed side: {closed}. Supported sides: {sides}"
+            raise InvalidAggregationError(msg.format(closed=closed, sides=', '.join(CLOSED_SIDES)))
+        if not columns:
+            raise InvalidAggregationError(
+                "Aggregation {name} has no columns to aggregate!".format(name=name))
+        for column_name, statistics in columns.items():
+            unsupported = [statistic for statistic in statistics if statistic not in STATISTICS]
+            if unsupported or not statistics:
+                msg = "Unsupported statistics of {column_name}: {statistics}. Supported "
+                msg += "statistics: {supported}"
+                raise InvalidAggregationError(msg.format(
+                    column_name=column_name, statistics=statistics,
+                    supported=', '.join(STATISTICS)))
+
+        aggregations.append(Aggregation(
+            name, window, list(columns.items()), closed,
+            int(decimals) if decimals is not None else None))
+
+    return aggregations
+
+
+def get_window(value, window, closed='left'):
+    """Returns the label of the window holding a time.
+
+    Parameters
+    ----------
+    value : datetime
+        Time.
+    window : str
+        One of WINDOWS.
+    closed : str, optional
+        'left' for windows [start, end) labelled by their start, 'right' for windows
+        (start, end] labelled by their end.
+
+    Returns
+    -------
+    datetime
+        The window's start or end, in the time's time zone.
+
+    Example
+    -------
+    >>> get_window(datetime(2016, 5, 2, 12, 10), 'hourly', 'right')
+    datetime.datetime(2016, 5, 2, 13, 0)
+
+    """
+    wall = value.replace(tzinfo=None)
+    start = wall.replace(minute=0, second=0, microsecond=0)
+    if window == 'daily':
+        start = start.replace(hour=0)
+
+    label = start
+    if closed == 'right' and wall != start:
+        label = start + WINDOWS[window]
+
+    if value.tzinfo is None:
+        return label
+    if hasattr(value.tzinfo, 'localize'):  # pytz, the offset may differ at the label.
+        return value.tzinfo.localize(label)
+
+    return label.replace(tzinfo=value.tzinfo)
+
+
+def _to_float(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+
+    return number if number - number == 0 else None  # Skips NaN and infinity.
+
+
+def _format_number(number, decimals):
+    if decimals is None:
+        return str(number)
+
+    return '{number:.{decimals}f}'.format(number=number, decimals=decimals)
+
+
+def _make_row(time_column, window, accumulators, aggregation):
+    row = cr.Row([(time_column, window)])
+
+    for column_name, statistics in aggregation.columns:
+        count, total, minimum, maximum = accumulators[column_name]
+        for statistic in statistics:
+            name = '{column_name}_{statistic}'.format(
+                column_name=column_name, statistic=statistic)
+            if statistic == 'count':
+                row[name] = count
+            elif not count:
+                row[name] = ''
+            elif statistic == 'mean':
+                row[name] = _format_number(total / count, aggregation.decimals)
+            elif statistic == 'total':
+                row[name] = _format_number(total, aggregation.decimals)
+            else:
+                row[name] = _format_number(
+                    minimum if statistic == 'min' else maximum, aggregation.decimals)
+
+    return row
+
+
+def aggregate(aggregation, time_column, times, columns, state=None):
+    """Adds data to an aggregation's open window and returns the windows it closed.
+
+    Parameters
+    ----------
+    aggregation : Aggregation
+        Compiled aggregation, see compile_aggregations.
+    time_column : str or int
+        Name of the windows' time column in the aggregated data.
+    times : list of datetime
+        The data's (parsed) times, in time order.
+    columns : dict of list
+        The data's values of the aggregated columns, by column name.
+    state : dict, optional
+        The aggregation's state after the previous call, if any.
+
+    Returns
+    -------
+    tuple
+        Closed windows (DataSet, one row per window with a '<column>_<statistic>'
+        column per statistic) and the aggregation's updated state (dict).
+
+    Raises
+    ------
+    InvalidAggregationError: If an aggregated column is not found.
+
+    """
+    for column_name, _ in aggregation.columns:
+        if column_name not in columns:
+            raise InvalidAggregationError(
+                "{0} not found in column names!".format(column_name))
+
+    window, accumulators = None, None
+    if state:
+        window = datetime.fromisoformat(state['window'])
+        accumulators = state['accumulators']
+
+    closed_windows = cr.DataSet()
+
+    for i, value in enumerate(times):
+        label = get_window(value, aggregation.window, aggregation.closed)
+        if window is not None and label < window:
+            continue  # The window has already been emitted.
+        if window is None or label > window:
+            if window is not None:
+                closed_windows.append(_make_row(time_column, window, accumulators, aggregation))
+            window = label
+            accumulators = {
+                column_name: [0, 0.0, None, None] for column_name, _ in aggregation.columns}
+
+        for column_name, _ in aggregation.columns:
+            number = _to_float(columns[column_name][i])
+            if number is None:
+                continue
+            accumulator = accumulators[column_name]
+            accumulator[0] += 1
+            accumulator[1] += number
+            if accumulator[2] is None or number < accumulator[2]:
+                accumulator[2] = number
+            if accumulator[3] is None or number > accumulator[3]:
+                accumulator[3] = number
+
+    if window is None:
+        return closed_windows, state
+
+    return closed_windows, {'window': window.isoformat(), 'accumulators': accumulators}
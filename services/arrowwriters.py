@@ -0,0 +1,307 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+
+"""Writers for exporting processed datalogger data as compressed columnar files.
+
+Data is written as Parquet or Arrow IPC with native types: parsed time columns become
+timestamp columns (in UTC, tagged with the time zone) and columns whose values are all
+numeric become float64 columns. Everything else is kept as strings.
+
+Parquet and Arrow files can not be appended to, so each output is a directory (dataset)
+and every export adds a new part file to it. The first part fixes the dataset's schema,
+later parts are converted to it. Datasets can be read with e.g.
+pyarrow.dataset.dataset(path) or pandas.read_parquet(path). Requires pyarrow, which is
+only imported once a Parquet or Arrow output is used.
+
+A part file is written per exported chunk, i.e. per read chunk and per run. In watch
+mode that is a small part file every few seconds, so datasets written in watch mode
+need to be compacted from time to time (e.g. read and rewritten as one file while the
+formatter is stopped), or written as CSV instead.
+
+"""
+
+import os
+import re
+import tempfile
+
+from datetime import datetime
+
+from services import timeparsing
+
+# Imported by _require_pyarrow, see there.
+pa = None
+pc = None
+pq = None
+
+CSV_FORMAT = 'csv'
+PARQUET_FORMAT = 'parquet'
+ARROW_FORMAT = 'arrow'
+OUTPUT_FORMATS = (CSV_FORMAT, PARQUET_FORMAT, ARROW_FORMAT)
+
+COMPRESSION = 'zstd'
+PART_FILE_PATTERN = re.compile(r'part-(\d+)\.(parquet|arrow)\Z')
+
+
+class PyArrowNotInstalledError(ImportError):
+    pass
+
+
+class UnsupportedOutputFormatError(ValueError):
+    pass
+
+
+class SchemaMismatchError(ValueError):
+    pass
+
+
+def _require_pyarrow():
+    # pyarrow takes a few hundred milliseconds to import, which CSV only runs skip.
+    global pa, pc, pq
+    if pa is not None:
+        return
+
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError:
+        raise PyArrowNotInstalledError(
+            "Parquet and Arrow output formats require pyarrow to be installed.")
+
+    pa, pc, pq = pyarrow, pyarrow.compute, pyarrow.parquet
+
+
+def check_output_format(output_format):
+    """Validates an output format setting.
+
+    Parameters
+    ----------
+    output_format : str
+        One of OUTPUT_FORMATS.
+
+    Raises
+    ------
+    UnsupportedOutputFormatError: If the output format is not supported.
+    PyArrowNotInstalledError: If the output format requires pyarrow and it is not installed.
+
+    """
+    if output_format not in OUTPUT_FORMATS:
+        msg = "Unsupported output format: {output_format}. Supported formats: {formats}"
+        raise UnsupportedOutputFormatError(
+            msg.format(output_format=output_format, formats=', '.join(OUTPUT_FORMATS)))
+    if output_format != CSV_FORMAT:
+        _require_pyarrow()
+
+
+def get_output_path(output_dir, name, output_format):
+    """Returns the dataset directory for an array id or table.
+
+    Parameters
+    ----------
+    output_dir : str
+        Directory holding the datalogger's output.
+    name : str
+        Array id or table name.
+    output_format : str
+        PARQUET_FORMAT or ARROW_FORMAT.
+
+    Returns
+    -------
+    str
+        Dataset directory path, e.g. <output_dir>/<name>.parquet.
+
+    """
+    return os.path.join(output_dir, '{name}.{ext}'.format(name=name, ext=output_format))
+
+
+def _time_zone_name(tzinfo):
+    if tzinfo is None:
+        return None
+    zone = getattr(tzinfo, 'zone', None)  # pytz
+    if zone:
+        return zone
+
+    offset = timeparsing.format_utc_offset(int(tzinfo.utcoffset(None).total_seconds()))
+    return offset[:3] + ':' + offset[3:5]  # Arrow expects e.g. '+01:00'.
+
+
+def _string_array(values):
+    """Returns values as a string array, with empty strings as nulls. """
+    array = pa.array(values, type=pa.string()) if not isinstance(values, pa.Array) else values
+    if not len(array):
+        return array
+
+    return pc.if_else(pc.equal(array, ''), pa.scalar(None, pa.string()), array)
+
+
+def _infer_array(array):
+    if array.null_count == len(array):
+        return array  # Nothing to infer the type from.
+    try:
+        return array.cast(pa.float64())
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return array
+
+
+def _datetime_array(values):
+    tzinfo = next((value.tzinfo for value in values if value is not None), None)
+    return pa.array(values, type=pa.timestamp('us', tz=_time_zone_name(tzinfo)))
+
+
+def _parsed_times_array(parsed_times):
+    tz = _time_zone_name(parsed_times.tzinfos[0]) if parsed_times.tzinfos else None
+    if tz is None:
+        return pa.array(parsed_times.wall, type=pa.timestamp('us'))
+
+    utc = parsed_times.wall - parsed_times.utc_offsets.astype('timedelta64[s]')
+    return pa.array(utc.astype('datetime64[us]'), type=pa.timestamp('us', tz=tz))
+
+
+def _conform(table, schema, outfile_path):
+    """Converts a table to an existing dataset's schema. """
+    if table.schema.names != schema.names:
+        msg = "Columns {columns} do not match the existing dataset {outfile_path} ({schema})"
+        raise SchemaMismatchError(msg.format(
+            columns=table.schema.names, outfile_path=outfile_path, schema=schema.names))
+
+    arrays = []
+    for column, field in zip(table.columns, schema):
+        if column.type == field.type:
+            arrays.append(column)
+            continue
+        try:
+            arrays.append(column.cast(field.type))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            msg = "Column {name} can not be stored as {type} in {outfile_path}: {error}"
+            raise SchemaMismatchError(msg.format(
+                name=field.name, type=field.type, outfile_path=outfile_path, error=e))
+
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _part_files(outfile_path):
+    if not os.path.isdir(outfile_path):
+        return []
+
+    parts = []
+    for file_name in os.listdir(outfile_path):
+        match = PART_FILE_PATTERN.match(file_name)
+        if match:
+            parts.append((int(match.group(1)), os.path.join(outfile_path, file_name)))
+
+    return [file_path for _, file_path in sorted(parts)]
+
+
+def _read_schema(file_path):
+    if file_path.endswith('.parquet'):
+        return pq.read_schema(file_path)
+
+    with pa.memory_map(file_path) as source:
+        return pa.ipc.open_file(source).schema
+
+
+def _write_part(table, outfile_path, output_format):
+    parts = _part_files(outfile_path)
+    if parts:
+        table = _conform(table, _read_schema(parts[-1]), outfile_path)
+        part_num = int(PART_FILE_PATTERN.match(os.path.basename(parts[-1])).group(1)) + 1
+    else:
+        part_num = 0
+
+    os.makedirs(outfile_path, exist_ok=True)
+    part_path = os.path.join(outfile_path, 'part-{part_num:08d}.{ext}'.format(
+        part_num=part_num, ext=output_format))
+
+    fd, tmp_path = tempfile.mkstemp(dir=outfile_path, prefix='.part-', suffix='.tmp')
+    os.close(fd)
+    try:
+        if output_format == PARQUET_FORMAT:
+            pq.write_table(table, tmp_path, compression=COMPRESSION)
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=COMPRESSION)
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                    writer.write_table(table)
+        os.replace(tmp_path, part_path)  # Dataset readers skip hidden (.) files.
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    return part_path
+
+
+def _export_columns(column_names, arrays, outfile_path, output_format):
+    table = pa.Table.from_arrays(arrays, names=[str(name) for name in column_names])
+
+    return _write_part(table, outfile_path, output_format)
+
+
+def export_to_file(data, outfile_path, output_format, export_plan=None):
+    """Adds a data set to a Parquet or Arrow dataset as a new part file.
+
+    Parameters
+    ----------
+    data : DataSet
+        Data set to export.
+    outfile_path : str
+        Dataset directory, see get_output_path.
+    output_format : str
+        PARQUET_FORMAT or ARROW_FORMAT.
+    export_plan : ExportPlan, optional
+        Columns to export. If not given, all columns are exported.
+
+    Returns
+    -------
+    str or None
+        The part file written, or None if the data set is empty.
+
+    """
+    _require_pyarrow()
+    if not data:
+        return None
+
+    column_names = export_plan.columns(data[0]) if export_plan else list(data[0].keys())
+    arrays = []
+
+    for name in column_names:
+        values = [row.get(name) for row in data]
+        if any(isinstance(value, datetime) for value in values):
+            arrays.append(_datetime_array(values))
+        else:
+            arrays.append(_infer_array(_string_array(
+                [None if value is None else str(value) for value in values])))
+
+    return _export_columns(column_names, arrays, outfile_path, output_format)
+
+
+def export_columnar_to_file(data, outfile_path, output_format):
+    """Adds a columnar data set to a Parquet or Arrow dataset, see export_to_file.
+
+    Parameters
+    ----------
+    data : ColumnarDataSet
+        Data set to export.
+    outfile_path : str
+        Dataset directory, see get_output_path.
+    output_format : str
+        PARQUET_FORMAT or ARROW_FORMAT.
+
+    Returns
+    -------
+    str or None
+        The part file written, or None if the data set is empty.
+
+    """
+    _require_pyarrow()
+    if not len(data) or not data.column_names:
+        return None
+
+    arrays = []
+
+    for name in data.column_names:
+        if name in data.parsed_times:
+            arrays.append(_parsed_times_array(data.parsed_times[name]))
+        else:
+            arrays.append(_infer_array(_string_array(pa.array(data[name].astype(str)))))
+
+    return _export_columns(data.column_names, arrays, outfile_path, output_format)
@@ -0,0 +1,605 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+
+"""Tools for keeping track of how far into a datalogger file processing has come.
+
+A checkpoint holds the byte offset of the first unread line, the file's identity, a
+fingerprint of the file's first bytes and the last line read. If the file is later
+truncated, rotated or rewritten, the checkpoint no longer matches and reading resumes
+after the last line read, found by a binary search on the lines' timestamps.
+
+For files with a header row, the parsed header is cached with the checkpoint so that
+incremental runs do not parse the file's first lines again.
+
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+
+from collections import namedtuple
+
+from services import compression
+from services import readers
+
+FileIdentity = namedtuple('FileIdentity', ['inode', 'size', 'mtime'])
+
+FINGERPRINT_SIZE = 1024
+LAST_LINE_SEARCH_SIZE = 64 * 1024
+READ_BLOCK_SIZE = 1024 * 1024
+
+CHECKPOINT_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    key TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+)
+"""
+
+
+def get_file_identity(file_path):
+    """Returns the identity (inode, size and modification time) of a file.
+
+    Parameters
+    ----------
+    file_path : str
+        File's absolute path.
+
+    Returns
+    -------
+    FileIdentity
+        The file's inode, size in bytes and modification time.
+
+    """
+    st = os.stat(file_path)
+
+    return FileIdentity(st.st_ino, st.st_size, st.st_mtime)
+
+
+def get_fingerprint(file_path, size=FINGERPRINT_SIZE):
+    """Returns a fingerprint of a file's first bytes.
+
+    The first bytes hold the file's header (if any) and first data lines, so they change
+    when the file is rotated or rewritten, but not when lines are appended.
+
+    Parameters
+    ----------
+    file_path : str
+        File's absolute path.
+    size : int, optional
+        Number of bytes to fingerprint.
+
+    Returns
+    -------
+    tuple
+        SHA-1 hex digest and the number of bytes it covers, which is less than size
+        for shorter files.
+
+    """
+    with open(file_path, 'rb') as f:
+        first_bytes = f.read(size)
+
+    return hashlib.sha1(first_bytes).hexdigest(), len(first_bytes)
+
+
+def read_last_line(file_path, byte_offset, line_filter=None):
+    """Returns the last line before a byte offset.
+
+    Parameters
+    ----------
+    file_path : str
+        File's absolute path.
+    byte_offset : int
+        Byte offset of a line start, e.g. of the first unread line.
+    line_filter : callable, optional
+        Returns True for lines to consider. Lines up to LAST_LINE_SEARCH_SIZE bytes
+        before the byte offset are searched.
+
+    Returns
+    -------
+    tuple
+        The last (matching) line before the byte offset, without line break, or None
+        if there is none, and the number of lines following it.
+
+    """
+    search_offset = max(0, byte_offset - LAST_LINE_SEARCH_SIZE)
+
+    with compression.open_input(file_path, search_offset) as f:
+        lines = f.read(byte_offset - search_offset).split(b'\n')
+
+    # The last item follows the final line break, the first may be a partial line.
+    lines = lines[:-1] if search_offset == 0 else lines[1:-1]
+    for num_lines_after, raw_line in enumerate(reversed(lines)):
+        line = raw_line.rstrip(b'\r').decode(errors='replace')
+        if line_filter is None or line_filter(line):
+            return line, num_lines_after
+
+    return None, 0
+
+
+def read_header(file_path, header_row):
+    """Reads a file's header row, to be cached with the checkpoint.
+
+    Parameters
+    ----------
+    file_path : str
+        File's absolute path.
+    header_row : int
+        Header row number. NOTE: Zero-based numbering.
+
+    Returns
+    -------
+    dict
+        The header row number, its column names and a fingerprint of the bytes up to
+        and including the header row, see get_cached_header.
+
+    """
+    columns, header_size = readers.read_header(file_path, header_row)
+    header = {'header_row': header_row, 'columns': columns}
+
+    if header_size is not None:
+        header['fingerprint'], header['size'] = get_fingerprint(file_path, header_size)
+
+    return header
+
+
+def get_cached_header(checkpoint, header_row, file_identity, file_path):
+    """Returns the header cached with a checkpoint, if the file's header is unchanged.
+
+    The cached header is used if it is for the same header row and file (inode) and the
+    file's first bytes, up to and including the header row, still match its fingerprint.
+    Only those bytes are read; they are not parsed again.
+
+    Parameters
+    ----------
+    checkpoint : dict or None
+        Checkpoint information, as made by make_checkpoint.
+    header_row : int
+        Header row number. NOTE: Zero-based numbering.
+    file_identity : FileIdentity
+        The file's current identity.
+    file_path : str
+        File's absolute path.
+
+    Returns
+    -------
+    dict or None
+        Header information, as made by read_header, or None if no valid header is cached.
+
+    """
+    header = checkpoint.get('header') if checkpoint else None
+    if not header or header.get('header_row') != header_row or 'fingerprint' not in header:
+        return None
+    if checkpoint.get('inode') != file_identity.inode:
+        return None
+    if get_fingerprint(file_path, header['size']) != (header['fingerprint'], header['size']):
+        return None
+
+    return header
+
+
+def make_checkpoint(byte_offset, file_identity, file_path=None, line_filter=None, header=None,
+                    last_line=None):
+    """Creates a checkpoint, suitable for storing in the configuration file.
+
+    Parameters
+    ----------
+    byte_offset : int
+        Byte offset of the first unread line.
+    file_identity : FileIdentity
+        Identity of the file at the time it was read.
+    file_path : str, optional
+        File's absolute path. If given, the file's fingerprint, compression (if any)
+        and the last line read are added, see get_resume_offset and
+        resolve_start_position.
+    line_filter : callable, optional
+        Returns True for lines that can be resumed after, see read_last_line.
+    header : dict, optional
+        The file's header, as read by read_header, to cache with the checkpoint.
+    last_line : str, optional
+        The last line read, without line break. If given (and line_filter returns True
+        for it), it is not read back from the file, which for a compressed file means
+        decompressing everything before the byte offset.
+
+    Returns
+    -------
+    dict
+        Checkpoint information.
+
+    """
+    checkpoint = {
+        'byte_offset': byte_offset,
+        'inode': file_identity.inode,
+        'size': file_identity.size,
+        'mtime': file_identity.mtime,
+    }
+
+    if file_path is not None:
+        checkpoint['fingerprint'], checkpoint['fingerprint_size'] = get_fingerprint(file_path)
+        file_compression = compression.detect_compression(file_path)
+        if file_compression is not None:
+            checkpoint['compression'] = file_compression
+        if last_line is not None and (line_filter is None or line_filter(last_line)):
+            checkpoint['last_line'], checkpoint['num_lines_after'] = last_line, 0
+        else:
+            checkpoint['last_line'], checkpoint['num_lines_after'] = read_last_line(
+                file_path, byte_offset, line_filter)
+    if header is not None:
+        checkpoint['header'] = header
+
+    return checkpoint
+
+
+def get_resume_offset(checkpoint, file_identity, file_path=None):
+    """Returns the byte offset to resume reading from, if the checkpoint can be trusted.
+
+    A checkpoint is trusted if the file still has the same inode and has not shrunk
+    since it was made. A file with the same size but a different modification time,
+    or whose first bytes no longer match the checkpoint's fingerprint, has been
+    rewritten in place and the checkpoint is discarded.
+
+    Parameters
+    ----------
+    checkpoint : dict or None
+        Checkpoint information, as made by make_checkpoint.
+    file_identity : FileIdentity
+        The file's current identity.
+    file_path : str, optional
+        File's absolute path. If given, the file's fingerprint is checked.
+
+    Returns
+    -------
+    int or None
+        Byte offset of the first unread line, or None if the checkpoint is missing
+        or invalid.
+
+    """
+    if not checkpoint:
+        return None
+
+    try:
+        byte_offset = checkpoint['byte_offset']
+        inode = checkpoint['inode']
+        size = checkpoint['size']
+        mtime = checkpoint['mtime']
+    except KeyError:
+        return None
+
+    if inode != file_identity.inode:
+        return None
+    if file_identity.size < size:
+        return None
+    if file_identity.size < byte_offset and not checkpoint.get('compression'):
+        return None  # Byte offsets of compressed files are in the decompressed data.
+    if file_identity.size == size and file_identity.mtime != mtime:
+        return None
+
+    fingerprint = checkpoint.get('fingerprint')
+    if file_path is not None and fingerprint is not None:
+        if get_fingerprint(file_path, checkpoint['fingerprint_size'])[0] != fingerprint:
+            return None
+
+    return byte_offset
+
+
+def count_lines(file_path, byte_offset):
+    """Returns the number of lines before a byte offset.
+
+    Parameters
+    ----------
+    file_path : str
+        File's absolute path.
+    byte_offset : int
+        Byte offset of a line start.
+
+    Returns
+    -------
+    int
+        Number of lines before the byte offset.
+
+    """
+    num_lines = 0
+    with compression.open_input(file_path) as f:
+        remaining = byte_offset
+        while remaining > 0:
+            try:
+                block = f.read(min(READ_BLOCK_SIZE, remaining))
+            except EOFError:
+                break
+            if not block:
+                break
+            num_lines += block.count(b'\n')
+            remaining -= len(block)
+
+    return num_lines
+
+
+def _find_timed_line(f, byte_offset, start_offset, end_offset, line_time):
+    """Finds the first timed line starting at or after a byte offset and before end_offset.
+
+    Returns
+    -------
+    tuple or None
+        The line's start and end byte offsets and time.
+
+    """
+    if byte_offset > start_offset:
+        f.seek(byte_offset - 1)
+        f.readline()  # Move to the next line start.
+    else:
+        f.seek(start_offset)
+
+    line_start = f.tell()
+    while line_start < end_offset:
+        raw_line = f.readline()
+        if not raw_line.endswith(b'\n'):
+            return None  # Still being written.
+        value = line_time(raw_line.decode(errors='replace').rstrip('\r\n'))
+        if value is not None:
+            return line_start, line_start + len(raw_line), value
+        line_start += len(raw_line)
+
+    return None
+
+
+def _scan_time_offset(file_path, start_offset, line_time, after, inclusive):
+    """Linear search version of find_time_offset, for compressed files. """
+    byte_offset = low = start_offset
+
+    with compression.open_input(file_path, start_offset) as f:
+        for raw_line in compression.iter_lines(f):
+            byte_offset += len(raw_line)
+            value = line_time(raw_line.decode(errors='replace').rstrip('\r\n'))
+            if value is None:
+                continue
+            if value > after or (inclusive and value == after):
+                break
+            low = byte_offset
+
+    return low
+
+
+def find_time_offset(file_path, start_offset, line_time, after, inclusive=False):
+    """Binary searches a file for the first line with a time after a given time.
+
+    Lines must be in time order. Lines that have no time (line_time returns None) are
+    skipped. Compressed files can only be read forward and are searched line by line.
+
+    Parameters
+    ----------
+    file_path : str
+        File's absolute path.
+    start_offset : int
+        Byte offset of the first data line.
+    line_time : callable
+        Returns a line's time, or None if the line has no time.
+    after : object
+        Time to search for, comparable to the values returned by line_time.
+    inclusive : bool, optional
+        Find the first line with a time at or after the given time.
+
+    Returns
+    -------
+    int
+        Byte offset of the first line with a time after the given time, or of the
+        end of the last complete line.
+
+    """
+    if compression.detect_compression(file_path) is not None:
+        return _scan_time_offset(file_path, start_offset, line_time, after, inclusive)
+
+    low, high = start_offset, os.path.getsize(file_path)
+
+    with open(file_path, 'rb') as f:
+        while low < high:
+            middle = (low + high) // 2
+            timed_line = _find_timed_line(f, middle, low, high, line_time)
+            if timed_line is None:
+                high = middle
+            elif timed_line[2] > after or (inclusive and timed_line[2] == after):
+                high = timed_line[0]
+            else:
+                low = timed_line[1]
+
+    return low
+
+
+def find_line_after(file_path, start_offset, line_time, last_line, num_lines_after=0):
+    """Finds the line following a given line.
+
+    Parameters
+    ----------
+    file_path : str
+        File's absolute path.
+    start_offset : int
+        Byte offset of the first line with the same time as the given line, see
+        find_time_offset.
+    line_time : callable
+        Returns a line's time, or None if the line has no time.
+    last_line : str
+        Line to find.
+    num_lines_after : int, optional
+        Number of lines following the given line to skip as well.
+
+    Returns
+    -------
+    int
+        Byte offset of the line following the given line (and the lines after it) if
+        it is found among the lines with the same time, otherwise of the first line with
+        a later time.
+
+    """
+    last_time = line_time(last_line)
+    byte_offset = start_offset
+
+    with compression.open_input(file_path, start_offset) as f:
+        lines = compression.iter_lines(f)
+        for raw_line in lines:
+            line = raw_line.decode(errors='replace').rstrip('\r\n')
+            value = line_time(line)
+            if value is not None and value != last_time:
+                return byte_offset
+            byte_offset += len(raw_line)
+            if line == last_line:
+                for raw_line in itertools.islice(lines, num_lines_after):
+                    byte_offset += len(raw_line)
+                return byte_offset
+
+    return find_time_offset(file_path, start_offset, line_time, last_time)
+
+
+def resolve_start_position(file_path, line_num, checkpoint, file_identity, header_row=None,
+                           line_time=None):
+    """Determines where to start reading a file.
+
+    The byte offset stored in the checkpoint is used if it can be trusted. If the file
+    has been truncated, rotated or rewritten since, reading resumes after the
+    checkpoint's last line, found by a binary search on the lines' times (see
+    find_time_offset and find_line_after). Otherwise the file is scanned once from the
+    beginning to find the byte offset of the given line number.
+
+    Parameters
+    ----------
+    file_path : str
+        File's absolute path.
+    line_num : int
+        First unread line number. NOTE: Zero-based numbering.
+    checkpoint : dict or None
+        Checkpoint information, as made by make_checkpoint.
+    file_identity : FileIdentity
+        The file's current identity.
+    header_row : int, optional
+        File's header row. Lines up to and including the header row are never read
+        as data.
+    line_time : callable, optional
+        Returns a line's time, or None if the line has no time. Required to resume
+        after the checkpoint's last line.
+
+    Returns
+    -------
+    tuple of int
+        Byte offset and line number of the first unread line.
+
+    """
+    first_data_line_num = 0
+    if isinstance(header_row, int) and header_row >= 0:
+        first_data_line_num = header_row + 1
+
+    byte_offset = get_resume_offset(checkpoint, file_identity, file_path)
+    if byte_offset is not None and line_num >= first_data_line_num:
+        return byte_offset, line_num
+
+    last_line = checkpoint.get('last_line') if checkpoint else None
+    last_time = line_time(last_line) if line_time is not None and last_line else None
+    if last_time is not None:
+        start_offset = readers.find_line_offset(file_path, first_data_line_num)
+        byte_offset = find_line_after(
+            file_path, find_time_offset(file_path, start_offset, line_time, last_time, True),
+            line_time, last_line, checkpoint.get('num_lines_after', 0))
+        return byte_offset, count_lines(file_path, byte_offset)
+
+    line_num = max(line_num, first_data_line_num)
+    byte_offset = readers.find_line_offset(file_path, line_num)
+
+    return byte_offset, line_num
+
+
+def make_key(*parts):
+    """Creates a checkpoint store key, e.g. 'loggerfilesformatter/site/location/datalogger'.
+
+    Parameters
+    ----------
+    parts : str
+        Key parts. Parts that are None are skipped.
+
+    Returns
+    -------
+    str
+        Checkpoint store key.
+
+    """
+    return "/".join(str(part) for part in parts if part is not None)
+
+
+class CheckpointStore(object):
+    """Transactional store of per file (datalogger or table) checkpoints.
+
+    States are kept in an SQLite database in WAL mode, one row per key. Each save is
+    committed (and synced to disk) on its own, so progress made before a failure is
+    never lost. Several processes can use the same database.
+
+    Parameters
+    ----------
+    db_path : str
+        Database file's absolute path. Created if it does not exist.
+
+    Example
+    -------
+    >>> with CheckpointStore('/tmp/checkpoints.sqlite') as store:
+    ...     store.save('site/location/datalogger', {'line_num': 12})
+    ...     store.load('site/location/datalogger')
+    {'line_num': 12}
+
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+
+        self._connection = sqlite3.connect(db_path, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        with self._connection:
+            self._connection.execute(CHECKPOINT_STORE_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def load(self, key):
+        """Returns a stored state.
+
+        Parameters
+        ----------
+        key : str
+            State key.
+
+        Returns
+        -------
+        dict or None
+            The stored state, or None if nothing is stored for the key.
+
+        """
+        row = self._connection.execute(
+            "SELECT state FROM checkpoints WHERE key = ?", (key, )).fetchone()
+
+        if row is None:
+            return None
+
+        return json.loads(row[0])
+
+    def save(self, key, state):
+        """Stores a state, replacing any previously stored state, and commits.
+
+        Parameters
+        ----------
+        key : str
+            State key.
+        state : dict
+            State to store. Must be JSON serializable.
+
+        """
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO checkpoints (key, state) VALUES (?, ?)",
+                (key, json.dumps(state, sort_keys=True)))
+
+    def close(self):
+        """Closes the database connection. """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
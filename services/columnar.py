@@ -0,0 +1,552 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+
+"""Columnar (NumPy backed) processing of Campbell CR-type mixed array datalogger files.
+
+Rows are kept as one NumPy array per column instead of one ordered dictionary per row,
+so renaming, float fixing, array id splitting and projection are whole-column
+operations. Requires NumPy.
+
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+import pytz
+
+from campbellsciparser import cr
+
+from services import conversions
+from services import dedup
+from services import readers
+from services import timeparsing
+from services import writers
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MixedArrayData = namedtuple('MixedArrayData', ['array_ids', 'lengths', 'rows'])
+
+
+class NumpyNotInstalledError(ImportError):
+    pass
+
+
+def _require_numpy():
+    if np is None:
+        raise NumpyNotInstalledError("The columnar engine requires NumPy to be installed.")
+
+
+class ColumnarDataSet(object):
+    """Container holding a data set as one NumPy array per column.
+
+    Parameters
+    ----------
+    column_names : list of str or int, optional
+        Column names, in order.
+    columns : dict of ndarray, optional
+        Column values by column name. All columns must have the same length.
+    parsed_times : dict of ParsedTimes, optional
+        Parsed time columns, by column name. The column itself holds the wall clock
+        times as datetime64 values.
+
+    Example
+    -------
+    >>> data = ColumnarDataSet(['Label_1', 'Label_2'], {
+    ...     'Label_1': np.array(['1', '2']), 'Label_2': np.array(['3', '4'])})
+    >>> len(data)
+    2
+    >>> data.select(['Label_2']).column_names
+    ['Label_2']
+
+    """
+    def __init__(self, column_names=None, columns=None, parsed_times=None):
+        self.column_names = list(column_names) if column_names else []
+        self.columns = columns if columns else {}
+        self.parsed_times = parsed_times if parsed_times else {}
+
+    def __len__(self):
+        if not self.column_names:
+            return 0
+        return len(self.columns[self.column_names[0]])
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def select(self, column_names):
+        """Returns a data set with only the given columns, in the given order.
+
+        Columns not found in the data set are skipped.
+
+        Parameters
+        ----------
+        column_names : list of str or int
+            Columns to keep.
+
+        Returns
+        -------
+        ColumnarDataSet
+            Data set holding the selected columns.
+
+        """
+        selected = [name for name in column_names if name in self.columns]
+
+        return ColumnarDataSet(
+            selected,
+            {name: self.columns[name] for name in selected},
+            {name: parsed for name, parsed in self.parsed_times.items() if name in selected})
+
+    def take(self, indices):
+        """Returns a data set with only the given rows, in the given order.
+
+        Parameters
+        ----------
+        indices : ndarray
+            Row indices to keep.
+
+        Returns
+        -------
+        ColumnarDataSet
+            Data set holding the selected rows.
+
+        """
+        return ColumnarDataSet(
+            self.column_names,
+            {name: values[indices] for name, values in self.columns.items()},
+            {name: timeparsing.ParsedTimes(
+                parsed.wall[indices], parsed.utc_offsets[indices],
+                parsed.tzinfo_codes[indices], parsed.tzinfos)
+             for name, parsed in self.parsed_times.items()})
+
+    def datetimes(self, name):
+        """Returns a parsed time column's values as time zone aware datetimes.
+
+        Parameters
+        ----------
+        name : str or int
+            Column name.
+
+        Returns
+        -------
+        list of datetime
+            The column's datetime values.
+
+        """
+        return timeparsing.to_datetimes(self.parsed_times[name])
+
+    def to_strings(self, name, include_time_zone=False):
+        """Returns a column's values as output strings.
+
+        Parameters
+        ----------
+        name : str or int
+            Column name.
+        include_time_zone : bool, optional
+            Include time zone for datetime values.
+
+        Returns
+        -------
+        ndarray
+            The column's string representation.
+
+        """
+        if name in self.parsed_times:
+            return timeparsing.format_times(self.parsed_times[name], include_time_zone)
+
+        return self.columns[name].astype(str)
+
+
+def fix_float_values(values):
+    """Corrects leading zeros for floating point values, see readers.fix_float_values.
+
+    Parameters
+    ----------
+    values : ndarray
+        String values to correct.
+
+    Returns
+    -------
+    ndarray
+        The corrected values.
+
+    """
+    starts_with_dot = np.char.startswith(values, '.')
+    starts_with_minus_dot = np.char.startswith(values, '-.')
+
+    if not starts_with_dot.any() and not starts_with_minus_dot.any():
+        return values
+
+    return np.where(
+        starts_with_dot,
+        np.char.replace(values, '.', '0.'),
+        np.where(starts_with_minus_dot, np.char.replace(values, '-.', '-0.'), values))
+
+
+def read_mixed_array_data(infile_path, byte_offset=0):
+    """Reads mixed array data from a file, starting at a given byte offset.
+
+    Parameters
+    ----------
+    infile_path : str
+        Input file's absolute path.
+    byte_offset : int, optional
+        Byte offset of the first line to read.
+
+    Returns
+    -------
+    ReadResult
+        The rows' array ids, lengths and values (as MixedArrayData), the byte offset
+        following the last complete line and the number of lines read.
+
+    """
+    _require_numpy()
+
+    rows = []
+    num_lines = 0
+
+    for values, byte_offset, num_lines, _ in readers.read_rows(infile_path, byte_offset):
+        if values:
+            rows.append(values)
+
+    rows_array = np.empty(len(rows), dtype=object)
+    rows_array[:] = rows
+    array_ids = np.array([values[0] for values in rows], dtype=str)
+    lengths = np.array([len(values) for values in rows], dtype=int)
+
+    return readers.ReadResult(
+        MixedArrayData(array_ids, lengths, rows_array), byte_offset, num_lines)
+
+
+def count_array_ids(data, array_ids):
+    """Returns the number of rows belonging to any of the given array ids.
+
+    Parameters
+    ----------
+    data : MixedArrayData
+        Mixed array data.
+    array_ids : list of str
+        Array ids to count.
+
+    Returns
+    -------
+    int
+        Number of rows.
+
+    """
+    return int(np.isin(data.array_ids, list(array_ids)).sum())
+
+
+def split_array_id(data, array_id, column_names, fix_floats=True):
+    """Extracts one array id's rows from mixed array data and assigns column names.
+
+    Parameters
+    ----------
+    data : MixedArrayData
+        Mixed array data.
+    array_id : str
+        Array id to extract.
+    column_names : list of str
+        Names to map to each rows' values.
+    fix_floats : bool
+        Correct leading zeros for floating points values since many older CR-type
+        dataloggers strips leading zeros.
+
+    Returns
+    -------
+    tuple
+        The array id's rows whose number of columns matches the number of column names,
+        as a ColumnarDataSet, and a list of the rows that did not match.
+
+    """
+    array_id_mask = data.array_ids == array_id
+    matched_mask = array_id_mask & (data.lengths == len(column_names))
+    mismatched_mask = array_id_mask & ~matched_mask
+
+    mismatches = data.rows[mismatched_mask].tolist()
+    if fix_floats:
+        mismatches = [readers.fix_float_values(list(values)) for values in mismatches]
+
+    matched_rows = data.rows[matched_mask].tolist()
+    if not matched_rows:
+        return ColumnarDataSet(), mismatches
+
+    values = np.array(matched_rows, dtype=str)
+    if fix_floats:
+        values = fix_float_values(values)
+
+    columns = {name: values[:, i] for i, name in enumerate(column_names)}
+
+    return ColumnarDataSet(column_names, columns), mismatches
+
+
+def _parse_time_columns(data, time_zone, time_format_args_library, time_columns, to_utc):
+    """Parses time columns into vectorized parsed time values, see timeparsing.TimeParser.
+
+    Parameters
+    ----------
+    data : ColumnarDataSet
+        Data set to parse.
+    time_zone : str
+        String representation of a valid pytz time zone.
+    time_format_args_library : list of str
+        List of the maximum expected string format columns sequence to match against
+        when parsing time values.
+    time_columns : list of str or int
+        Column(s) (names or indices) to use for time conversion.
+    to_utc : bool
+        Convert time to UTC.
+
+    Returns
+    -------
+    ParsedTimes
+        Parsed time values.
+
+    """
+    value_time_columns = [name for name in data.column_names if name in time_columns]
+    if not value_time_columns:
+        msg = "First time column '{first_time_column}' not found in column names!"
+        raise cr.TimeColumnValueError(msg.format(first_time_column=time_columns[0]))
+
+    parser = timeparsing.get_time_parser(time_zone, time_format_args_library, to_utc)
+
+    return parser.parse_columns([data[name].astype(str) for name in value_time_columns])
+
+
+def _set_time_column(data, name, parsed_times):
+    data.columns[name] = parsed_times.wall
+    data.parsed_times[name] = parsed_times
+
+
+def parse_time(data, time_zone, time_format_args_library, time_columns,
+               time_parsed_column=None, to_utc=False):
+    """Parses specific time columns into a datetime column, see cr.parse_time.
+
+    The parsed column replaces the first time column and the other time columns are
+    removed.
+
+    Parameters
+    ----------
+    data : ColumnarDataSet
+        Data set to convert.
+    time_zone : str
+        String representation of a valid pytz time zone.
+    time_format_args_library : list of str
+        List of the maximum expected string format columns sequence to match against
+        when parsing time values.
+    time_columns : list of str or int
+        Column(s) (names or indices) to use for time conversion.
+    time_parsed_column : str, optional
+        Converted time column name. If not given, use the name of the first
+        time column.
+    to_utc : bool, optional
+        Convert time to UTC.
+
+    Returns
+    -------
+    ColumnarDataSet
+        Time converted data set.
+
+    """
+    if not time_columns:
+        raise cr.TimeColumnValueError("At least one time column is required!")
+    if not len(data):
+        return data
+
+    if time_columns[0] not in data:
+        msg = "First time column '{first_time_column}' not found in column names!"
+        raise cr.TimeColumnValueError(msg.format(first_time_column=time_columns[0]))
+
+    parsed_times = _parse_time_columns(
+        data, time_zone, time_format_args_library, time_columns, to_utc)
+
+    new_name = time_parsed_column if time_parsed_column else time_columns[0]
+    column_names = []
+    for name in data.column_names:
+        if name == time_columns[0]:
+            column_names.append(new_name)
+        elif name != new_name and name not in time_columns:
+            column_names.append(name)
+
+    data_converted = ColumnarDataSet(
+        column_names,
+        {name: data.columns[name] for name in column_names if name in data.columns},
+        {name: parsed for name, parsed in data.parsed_times.items() if name in column_names})
+    _set_time_column(data_converted, new_name, parsed_times)
+
+    return data_converted
+
+
+PARTITION_UNITS = {'daily': 'D', 'monthly': 'M', 'yearly': 'Y'}
+
+
+def partition_data(data, time_column, partition):
+    """Splits a data set into time partitions, see writers.partition_data.
+
+    Parameters
+    ----------
+    data : ColumnarDataSet
+        Data set to split.
+    time_column : str or int
+        Parsed time column.
+    partition : str or None
+        One of writers.PARTITION_FORMATS. If None, the data set is not split.
+
+    Returns
+    -------
+    list of tuple
+        (partition key, ColumnarDataSet) tuples, in order of first appearance.
+
+    """
+    if partition is None or not len(data):
+        return [(None, data)]
+
+    keys = np.datetime_as_string(
+        data.parsed_times[time_column].wall.astype(
+            'datetime64[{unit}]'.format(unit=PARTITION_UNITS[partition])))
+    unique_keys, first_indices, codes = np.unique(keys, return_index=True, return_inverse=True)
+    if len(unique_keys) == 1:
+        return [(str(unique_keys[0]), data)]
+
+    order = np.argsort(codes, kind='stable')
+    groups = np.split(order, np.cumsum(np.bincount(codes))[:-1])
+
+    return [(str(unique_keys[code]), data.take(groups[code]))
+            for code in np.argsort(first_indices)]
+
+
+def drop_emitted_rows(data, time_column, high_water_mark=None):
+    """Drops rows with a timestamp at or before the latest emitted, see dedup.drop_emitted_rows.
+
+    Parameters
+    ----------
+    data : ColumnarDataSet
+        Time parsed data set.
+    time_column : str or int
+        Parsed time column.
+    high_water_mark : str, optional
+        Stored high-water mark, see dedup.format_high_water_mark.
+
+    Returns
+    -------
+    tuple
+        The new rows (ColumnarDataSet) and the updated high-water mark (str).
+
+    """
+    if not len(data):
+        return data, high_water_mark
+
+    parsed_times = data.parsed_times[time_column]
+    utc = parsed_times.wall - parsed_times.utc_offsets.astype('timedelta64[s]')
+
+    latest = dedup.parse_high_water_mark(high_water_mark)
+    if latest is None:
+        latest = utc[0] - np.timedelta64(1, 'us')
+    else:
+        latest = np.datetime64(latest.replace(tzinfo=None), 'us')
+
+    # Latest timestamp before each row, including the rows before it.
+    running_latest = np.maximum.accumulate(np.concatenate([[latest], utc]))
+    keep = utc > running_latest[:-1]
+    latest = running_latest[-1].astype(datetime).replace(tzinfo=pytz.utc)
+
+    if not keep.all():
+        data = data.take(np.flatnonzero(keep))
+
+    return data, dedup.format_high_water_mark(latest)
+
+
+def convert_data_column_values(data, values_to_convert, time_zone, time_format_args_library,
+                               to_utc):
+    """Converts certain column values, see loggerfilesformatter.convert_data_column_values.
+
+    Parameters
+    ----------
+    data : ColumnarDataSet
+        Data set to convert.
+    values_to_convert : dict or ConversionPlan
+        Columns to convert, or a plan compiled from them.
+    time_zone : str
+        String representation of a valid pytz time zone.
+    time_format_args_library : list of str
+        List of the maximum expected string format columns sequence to match against
+        when parsing time values.
+    to_utc : bool
+        Convert time to UTC.
+
+    Returns
+    -------
+    ColumnarDataSet
+        Column values converted data set.
+
+    Raises
+    ------
+    UnsupportedValueConversionType: If a conversion's value type is not supported.
+    InvalidConversionError: If a numeric conversion is invalid or its column is not found.
+    TimeColumnValueError: If a conversion has no time columns or if a column to
+        convert is not found.
+
+    """
+    conversion_plan = values_to_convert
+    if not isinstance(conversion_plan, conversions.ConversionPlan):
+        conversion_plan = conversions.ConversionPlan(values_to_convert)
+
+    if not len(data):
+        return data
+
+    converted = {}
+
+    for column_name, numeric_conversion in conversion_plan.numeric_conversions.items():
+        if column_name not in data:
+            raise conversions.InvalidConversionError(
+                "{0} not found in column names!".format(column_name))
+        converted[column_name] = numeric_conversion.convert(data[column_name])
+
+    for column_name, value_time_columns in conversion_plan.time_conversions.items():
+        if not value_time_columns:
+            raise cr.TimeColumnValueError("At least one time column is required!")
+        if column_name not in data:
+            raise cr.TimeColumnValueError(
+                "{0} not found in column names!".format(column_name))
+
+        converted[column_name] = _parse_time_columns(
+            data, time_zone, time_format_args_library, value_time_columns, to_utc)
+
+    for column_name, converted_values in converted.items():
+        if column_name in conversion_plan.time_conversions:
+            _set_time_column(data, column_name, converted_values)
+        else:
+            data.columns[column_name] = converted_values
+
+    return data
+
+
+def export_to_csv(data, outfile_path, export_header=False, include_time_zone=False):
+    """Appends a columnar data set to a CSV file, see writers.export_to_csv.
+
+    Parameters
+    ----------
+    data : ColumnarDataSet
+        Data set to export.
+    outfile_path : str
+        Output file's absolute path.
+    export_header : bool, optional
+        Write file header at the top of the output file, if the file is empty.
+    include_time_zone : bool, optional
+        Include time zone in string converted datetime values.
+
+    """
+    if not len(data) or not data.column_names:
+        return
+
+    lines = data.to_strings(data.column_names[0], include_time_zone)
+    for name in data.column_names[1:]:
+        lines = np.char.add(np.char.add(lines, ','), data.to_strings(name, include_time_zone))
+
+    header = ",".join(str(name) for name in data.column_names) if export_header else None
+
+    writers.append_lines(outfile_path, lines.tolist(), header=header)
@@ -0,0 +1,268 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+
+"""Transparent gzip and zstd compression of datalogger input and output files.
+
+Compressed input files are detected by their extension (.gz, .zst) or, failing that,
+by their first (magic) bytes, and are decompressed while they are read. Byte offsets
+(and checkpoints) of compressed files refer to the decompressed data.
+
+Compressed output files are appended to one gzip member or zstd frame at a time.
+Concatenated members (frames) form a valid compressed file, so data already written
+is never rewritten, and every member is complete once it has been written. zstd
+requires the zstandard package.
+
+"""
+
+import gzip
+import io
+
+from collections import OrderedDict
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+
+COMPRESSION_EXTENSIONS = OrderedDict([
+    (GZIP, '.gz'),
+    (ZSTD, '.zst'),
+])
+
+MAGIC_BYTES = OrderedDict([
+    (GZIP, b'\x1f\x8b'),
+    (ZSTD, b'\x28\xb5\x2f\xfd'),
+])
+
+SKIP_BLOCK_SIZE = 1024 * 1024
+
+
+class UnsupportedCompressionError(ValueError):
+    pass
+
+
+class ZstandardNotInstalledError(ImportError):
+    pass
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ZstandardNotInstalledError(
+            "zstd compressed files require zstandard to be installed.")
+
+
+def check_compression(compression):
+    """Validates a compression setting.
+
+    Parameters
+    ----------
+    compression : str or None
+        One of COMPRESSION_EXTENSIONS, or None for no compression.
+
+    Raises
+    ------
+    UnsupportedCompressionError: If the compression is not supported.
+    ZstandardNotInstalledError: If zstd is used and zstandard is not installed.
+
+    """
+    if compression is None:
+        return
+    if compression not in COMPRESSION_EXTENSIONS:
+        msg = "Unsupported compression: {compression}. Supported compressions: {compressions}"
+        raise UnsupportedCompressionError(msg.format(
+            compression=compression, compressions=', '.join(COMPRESSION_EXTENSIONS)))
+    if compression == ZSTD:
+        _require_zstandard()
+
+
+def get_compressed_path(file_path, compression):
+    """Returns a file path with the compression's extension added.
+
+    Parameters
+    ----------
+    file_path : str
+        Uncompressed file path.
+    compression : str or None
+        One of COMPRESSION_EXTENSIONS. If None, the path is returned as is.
+
+    Returns
+    -------
+    str
+        Compressed file path, e.g. /data/Table.dat.gz for /data/Table.dat.
+
+    """
+    if compression is None:
+        return file_path
+
+    return file_path + COMPRESSION_EXTENSIONS[compression]
+
+
+def get_uncompressed_path(file_path):
+    """Returns a file path without its compression extension, if any.
+
+    Parameters
+    ----------
+    file_path : str
+        File path.
+
+    Returns
+    -------
+    str
+        Uncompressed file path, e.g. /data/Table.dat for /data/Table.dat.gz.
+
+    """
+    compression = get_path_compression(file_path)
+    if compression is None:
+        return file_path
+
+    return file_path[:-len(COMPRESSION_EXTENSIONS[compression])]
+
+
+def get_path_compression(file_path):
+    """Returns a file's compression, detected by extension only.
+
+    Parameters
+    ----------
+    file_path : str
+        File path.
+
+    Returns
+    -------
+    str or None
+        GZIP, ZSTD or None if the file name has no compression extension.
+
+    """
+    for compression, ext in COMPRESSION_EXTENSIONS.items():
+        if file_path.endswith(ext):
+            return compression
+
+    return None
+
+
+def detect_compression(file_path):
+    """Returns a file's compression, detected by extension or magic bytes.
+
+    Parameters
+    ----------
+    file_path : str
+        File's absolute path.
+
+    Returns
+    -------
+    str or None
+        GZIP, ZSTD or None if the file is not compressed (or does not exist).
+
+    """
+    compression = get_path_compression(file_path)
+    if compression is not None:
+        return compression
+
+    try:
+        with open(file_path, 'rb') as f:
+            first_bytes = f.read(max(len(magic) for magic in MAGIC_BYTES.values()))
+    except FileNotFoundError:
+        return None
+
+    for compression, magic in MAGIC_BYTES.items():
+        if first_bytes.startswith(magic):
+            return compression
+
+    return None
+
+
+def _skip(f, num_bytes):
+    while num_bytes > 0:
+        skipped = len(f.read(min(SKIP_BLOCK_SIZE, num_bytes)))
+        if not skipped:
+            break
+        num_bytes -= skipped
+
+
+def open_input(file_path, byte_offset=0):
+    """Opens a (possibly compressed) file for binary reading at a given byte offset.
+
+    Compressed files can only be read forward: positioning the file decompresses
+    everything before the byte offset.
+
+    Parameters
+    ----------
+    file_path : str
+        File's absolute path.
+    byte_offset : int, optional
+        Byte offset (in the decompressed data) to position the file at.
+
+    Returns
+    -------
+    file object
+        Readable, line iterable binary file.
+
+    """
+    compression = detect_compression(file_path)
+
+    if compression == GZIP:
+        f = gzip.open(file_path, 'rb')
+    elif compression == ZSTD:
+        _require_zstandard()
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            open(file_path, 'rb'), read_across_frames=True)
+        _skip(reader, byte_offset)
+        return io.BufferedReader(reader)
+    else:
+        f = open(file_path, 'rb')
+
+    f.seek(byte_offset)
+
+    return f
+
+
+def iter_lines(f):
+    """Iterates over a binary file's complete lines.
+
+    Stops at a trailing line without a line break, or where a compressed file ends in
+    the middle of a gzip member; both are still being written.
+
+    Parameters
+    ----------
+    f : file object
+        File opened for binary reading, see open_input.
+
+    Yields
+    ------
+    bytes
+        The next line, including the line break.
+
+    """
+    try:
+        for raw_line in f:
+            if not raw_line.endswith(b'\n'):
+                return
+            yield raw_line
+    except EOFError:
+        return
+
+
+def compress(data, compression):
+    """Compresses data as one complete gzip member or zstd frame.
+
+    Parameters
+    ----------
+    data : bytes
+        Data to compress.
+    compression : str
+        One of COMPRESSION_EXTENSIONS.
+
+    Returns
+    -------
+    bytes
+        Compressed data, which can be appended to a file of the same compression.
+
+    """
+    if compression == GZIP:
+        return gzip.compress(data, mtime=0)
+
+    _require_zstandard()
+    return zstandard.ZstdCompressor().compress(data)
+
@@ -0,0 +1,188 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+
+"""Column value conversions, declared per array id or table in the configuration file.
+
+Besides time conversions, numeric columns can be converted with a linear transform
+(e.g. calibration scale and offset) or a polynomial (e.g. a sensor's mV to °C curve):
+
+    convert_data_column_values:
+      AirTC:
+        value_type: linear
+        scale: 0.1
+        offset: -40.0
+      WaterTC:
+        value_type: polynomial
+        coefficients: [-0.5, 25.1, 0.012]  # -0.5 + 25.1 * x + 0.012 * x ** 2
+        decimals: 3
+
+Conversions are compiled once into a ConversionPlan and numeric conversions are applied
+to whole columns with NumPy. Values that are not numbers (e.g. empty or NAN) are kept as
+they are. Converted values are written with the given number of decimals, or as the
+shortest representation of the float value. Numeric conversions require NumPy.
+
+"""
+
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TIME_VALUE_TYPE = 'time'
+LINEAR_VALUE_TYPE = 'linear'
+POLYNOMIAL_VALUE_TYPE = 'polynomial'
+VALUE_TYPES = (TIME_VALUE_TYPE, LINEAR_VALUE_TYPE, POLYNOMIAL_VALUE_TYPE)
+
+
+class UnsupportedValueConversionType(ValueError):
+    pass
+
+
+class InvalidConversionError(ValueError):
+    pass
+
+
+class NumpyNotInstalledError(ImportError):
+    pass
+
+
+def _require_numpy():
+    if np is None:
+        raise NumpyNotInstalledError("Numeric conversions require NumPy to be installed.")
+
+
+def _to_numbers(values):
+    """Returns values as floats, with NaN for values that are not numbers. """
+    try:
+        return values.astype(float)
+    except ValueError:
+        pass
+
+    numbers = np.empty(len(values))
+    for i, value in enumerate(values):
+        try:
+            numbers[i] = float(value)
+        except ValueError:
+            numbers[i] = np.nan
+
+    return numbers
+
+
+class NumericConversion(object):
+    """Polynomial conversion of a numeric column, y = c0 + c1 * x + c2 * x ** 2 + ...
+
+    Parameters
+    ----------
+    coefficients : list of float
+        Coefficients, in increasing powers of x.
+    decimals : int, optional
+        Number of decimals to write converted values with.
+
+    Example
+    -------
+    >>> NumericConversion([-40.0, 0.1]).convert(['650', '', 'NAN']).tolist()
+    ['25.0', '', 'NAN']
+
+    """
+    def __init__(self, coefficients, decimals=None):
+        _require_numpy()
+        self.coefficients = np.array(coefficients, dtype=float)[::-1]  # As for np.polyval.
+        self.decimals = int(decimals) if decimals is not None else None
+
+    def convert(self, values):
+        """Converts a column's values.
+
+        Parameters
+        ----------
+        values : list or ndarray of str
+            Column values.
+
+        Returns
+        -------
+        ndarray of str
+            Converted values.
+
+        """
+        values = np.asarray(values, dtype=str)
+        numbers = _to_numbers(values)
+        is_number = np.isfinite(numbers)
+
+        converted = np.polyval(self.coefficients, numbers[is_number])
+        if self.decimals is not None:
+            converted = np.char.mod('%.{decimals}f'.format(decimals=self.decimals), converted)
+        else:
+            converted = converted.astype(str)
+
+        result = values.astype(np.result_type(values.dtype, converted.dtype))
+        result[is_number] = converted
+
+        return result
+
+
+def _compile_numeric_conversion(column_name, convert_column_info):
+    value_type = convert_column_info.get('value_type')
+    decimals = convert_column_info.get('decimals')
+
+    try:
+        if value_type == LINEAR_VALUE_TYPE:
+            coefficients = [float(convert_column_info.get('offset', 0.0)),
+                            float(convert_column_info.get('scale', 1.0))]
+        else:
+            coefficients = [float(c) for c in convert_column_info.get('coefficients') or []]
+    except (TypeError, ValueError):
+        coefficients = None
+
+    if not coefficients:
+        msg = "Invalid {value_type} conversion of {column_name}: {info}"
+        raise InvalidConversionError(msg.format(
+            value_type=value_type, column_name=column_name, info=convert_column_info))
+
+    return NumericConversion(coefficients, decimals)
+
+
+class ConversionPlan(object):
+    """Column value conversions, compiled once per array id or table.
+
+    Parameters
+    ----------
+    values_to_convert : dict
+        Columns to convert, by column name. Each column's 'value_type' is one of
+        VALUE_TYPES. Time conversions list their 'value_time_columns', linear
+        conversions their 'scale' and 'offset' and polynomial conversions their
+        'coefficients' (in increasing powers). Numeric conversions take an optional
+        number of 'decimals'.
+
+    Attributes
+    ----------
+    time_conversions : OrderedDict
+        Time columns to parse, by column name.
+    numeric_conversions : OrderedDict
+        NumericConversion, by column name.
+
+    Raises
+    ------
+    UnsupportedValueConversionType: If a conversion's value type is not supported.
+    InvalidConversionError: If a numeric conversion has no valid coefficients.
+
+    """
+    def __init__(self, values_to_convert=None):
+        self.time_conversions = OrderedDict()
+        self.numeric_conversions = OrderedDict()
+
+        for column_name, convert_column_info in (values_to_convert or {}).items():
+            value_type = convert_column_info.get('value_type')
+
+            if value_type == TIME_VALUE_TYPE:
+                self.time_conversions[column_name] = convert_column_info.get('value_time_columns')
+            elif value_type in VALUE_TYPES:
+                self.numeric_conversions[column_name] = _compile_numeric_conversion(
+                    column_name, convert_column_info)
+            else:
+                msg = "Unsupported value type: {value_type}. Supported value types: {types}"
+                raise UnsupportedValueConversionType(msg.format(
+                    value_type=value_type, types=', '.join(VALUE_TYPES)))
+
+    def __bool__(self):
+        return bool(self.time_conversions or self.numeric_conversions)
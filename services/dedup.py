@@ -0,0 +1,103 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+
+"""Timestamp based deduplication of processed datalogger data.
+
+When a datalogger's memory is re-collected (e.g. after a memory wrap) or LoggerNet
+re-appends overlapping data, lines that were already processed show up again past the
+file's checkpoint. Each output keeps a high-water mark, the latest timestamp emitted so
+far, stored next to the checkpoint. Rows with a timestamp at or before the mark are
+dropped, at the cost of one comparison per row and without re-reading earlier output.
+
+The high-water mark assumes the data is in time order: a row older than the newest row
+already emitted is treated as a duplicate.
+
+"""
+
+from datetime import datetime
+
+import pytz
+
+from campbellsciparser import cr
+
+
+def _to_utc(value):
+    if value.tzinfo is None:
+        return pytz.utc.localize(value)  # Naive times are taken to be in UTC.
+    return value.astimezone(pytz.utc)
+
+
+def format_high_water_mark(value):
+    """Formats a timestamp as a high-water mark, suitable for storing with the checkpoint.
+
+    Parameters
+    ----------
+    value : datetime or None
+        Latest timestamp emitted.
+
+    Returns
+    -------
+    str or None
+        UTC timestamp in ISO 8601 format, e.g. '2016-05-02T12:34:15+00:00'.
+
+    """
+    if value is None:
+        return None
+
+    return _to_utc(value).isoformat()
+
+
+def parse_high_water_mark(high_water_mark):
+    """Parses a stored high-water mark, see format_high_water_mark.
+
+    Parameters
+    ----------
+    high_water_mark : str or None
+        Stored high-water mark.
+
+    Returns
+    -------
+    datetime or None
+        UTC timestamp, or None if no mark is stored.
+
+    """
+    if not high_water_mark:
+        return None
+
+    return _to_utc(datetime.fromisoformat(high_water_mark))
+
+
+def drop_emitted_rows(data, time_column, high_water_mark=None):
+    """Drops rows with a timestamp at or before the latest timestamp emitted.
+
+    Parameters
+    ----------
+    data : DataSet
+        Time parsed data set.
+    time_column : str or int
+        Parsed time column.
+    high_water_mark : str, optional
+        Stored high-water mark, see format_high_water_mark. If not given, only rows
+        older than or equal to an earlier row of the data set are dropped.
+
+    Returns
+    -------
+    tuple
+        The new rows (DataSet) and the updated high-water mark (str).
+
+    """
+    latest = parse_high_water_mark(high_water_mark)
+    if not data:
+        return data, high_water_mark
+
+    data_new = cr.DataSet()
+
+    for row in data:
+        value = row[time_column]
+        if value.tzinfo is None:
+            value = pytz.utc.localize(value)
+        if latest is None or value > latest:
+            data_new.append(row)
+            latest = value
+
+    return data_new, format_high_water_mark(latest)
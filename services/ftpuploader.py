@@ -6,65 +6,129 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import argparse
 import ftplib
-import logging.config
+import logging
+import posixpath
 import time
 
 from campbellsciparser import cr
 
+from services import checkpoints
+from services import compression
+from services import metrics
 from services import utils
+from services import writers
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 APP_CONFIG_PATH = os.path.join(BASE_DIR, 'cfg/ftpuploader.yaml')
 FTP_CONFIG_PATH = os.path.join(BASE_DIR, 'cfg/ftpsettings.yaml')
 LOGGING_CONFIG_PATH = os.path.join(BASE_DIR, 'cfg/logging.yaml')
+PROGRAM_NAME = 'ftpuploader'
+CHECKPOINT_STORE_PATH = os.path.join(BASE_DIR, 'cfg/checkpoints.sqlite')
+CHECKPOINT_KEY_PREFIX = PROGRAM_NAME
+CHECKPOINT_FIELDS = ('line_num', 'remote_header')
 
-logging_conf = utils.load_config(LOGGING_CONFIG_PATH)
-logging.config.dictConfig(logging_conf)
 logger_info = logging.getLogger('ftpuploader_info')
 logger_debug = logging.getLogger('ftpuploader_debug')
 
-ftp_cfg = utils.load_config(FTP_CONFIG_PATH)
 
-ftpsettings = ftp_cfg['settings']
-ftpserver = ftpsettings['ftp-address']
-username = ftpsettings.get('username')
-password = ftpsettings.get('password')
+class FTPSession(object):
+    """FTP session that connects on first use.
 
-ftplogging = ftp_cfg['logging']
-debuglevel = ftplogging['debuglevel']
+    Creating a session only stores the settings; the connection is opened when the
+    first upload needs it and closed by close (or when leaving the with block).
 
-if username and password:
-    session = ftplib.FTP(ftpserver, username, password)
-else:
-    session = ftplib.FTP(ftpserver)
+    Parameters
+    ----------
+    ftp_cfg : dict
+        FTP settings, as stored in the FTP configuration file. The 'settings' section
+        holds the 'ftp-address' and optional 'username' and 'password', the optional
+        'logging' section the ftplib 'debuglevel'.
+
+    """
+    def __init__(self, ftp_cfg):
+        ftpsettings = ftp_cfg['settings']
+        self.ftpserver = ftpsettings['ftp-address']
+        self.username = ftpsettings.get('username')
+        self.password = ftpsettings.get('password')
+        self.debuglevel = ftp_cfg.get('logging', {}).get('debuglevel', 0)
+        self.root_dir = None
+        self._session = None
+
+    @classmethod
+    def from_config_file(cls, ftp_config_path):
+        """Creates a session from an FTP configuration file. Does not connect. """
+        return cls(utils.load_config(ftp_config_path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def session(self):
+        """The ftplib.FTP connection, opened on first access. """
+        if self._session is None:
+            logger_debug.debug("Connecting to {server}".format(server=self.ftpserver))
+            if self.username and self.password:
+                session = ftplib.FTP(self.ftpserver, self.username, self.password)
+            else:
+                session = ftplib.FTP(self.ftpserver)
+            session.set_debuglevel(self.debuglevel)
+            self.root_dir = session.pwd()
+            self._session = session
+
+        return self._session
 
-session.set_debuglevel(debuglevel)
+    def cd_tree(self, remote_dir):
+        """Changes to a directory relative to the login directory, creating it if missing. """
+        session = self.session
+        cd_tree(session, posixpath.join(self.root_dir, remote_dir))
 
+    def close(self):
+        """Closes the connection, if it was opened. """
+        if self._session is not None:
+            self._session.quit()
+            self._session = None
 
-def cd_tree(current_dir):
+
+def cd_tree(session, current_dir):
     if current_dir != "":
         try:
             session.cwd(current_dir)
         except ftplib.error_perm:
-            cd_tree("/".join(current_dir.split("/")[:-1]))
+            cd_tree(session, "/".join(current_dir.split("/")[:-1]))
             session.mkd(current_dir)
             session.cwd(current_dir)
 
 
-def transfer_rows(cfg, output_dir, site, location, file, file_info):
+def transfer_rows(cfg, output_dir, site, location, file, file_info, ftp_session,
+                  checkpoint_store=None, run_metrics=metrics.NULL_METRICS):
+    checkpoint_key = checkpoints.make_key(CHECKPOINT_KEY_PREFIX, site, location, file)
+    if checkpoint_store is not None:
+        state = checkpoint_store.load(checkpoint_key)
+        if state:
+            file_info.update(state)
+
     name = file_info.get('name', file)
     file_path = file_info.get('file_path')
     line_num = file_info.get('line_num')
     header_row = file_info.get('header_row')
+    output_compression = file_info.get('compression')
+    compression.check_compression(output_compression)
 
     file_ext = os.path.splitext(os.path.abspath(file_path))[1]  # Get file extension
     logging.info("Processing file: {file}".format(file=file))
 
-    data = cr.read_table_data(
-        infile_path=file_path,
-        header_row=header_row,
-        first_line_num=line_num,
-    )
+    file_metrics = run_metrics.scope(site=site, location=location, file=file)
+
+    with file_metrics.stage('read') as stage:
+        data = cr.read_table_data(
+            infile_path=file_path,
+            header_row=header_row,
+            first_line_num=line_num,
+        )
+        stage.add(rows=len(data))
 
     num_of_new_rows = 0
     num_of_new_rows += len(data)
@@ -74,46 +138,74 @@ def transfer_rows(cfg, output_dir, site, location, file, file_info):
     if num_of_new_rows == 0:
         logger_info.info("No work to be done for table: {table}".format(table=name))
     else:
-        file_name = name + file_ext
+        # Compressed uploads are appended to the remote file as new gzip members (or
+        # zstd frames), which still decompress as one file.
+        file_name = compression.get_compressed_path(name + file_ext, output_compression)
         output_file_path = os.path.join(
             os.path.abspath(output_dir), site, location, file_name)
 
-        os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
+        with file_metrics.stage('ftp_session'):
+            ftp_session.cd_tree(posixpath.join(site, location, file))
+            session = ftp_session.session
 
-        if file_name not in session.nlst():
-            cr.export_to_csv(
-                data=data,
-                outfile_path=output_file_path,
-                export_header=True
-            )
-            with open(output_file_path, 'rb') as f:  # File to send.
-                session.storbinary('STOR ' + file_name, f)  # Send the file.
-        else:
-            cr.export_to_csv(
+        # The remote file has a header once it has been uploaded. Configurations from
+        # before the 'remote_header' setting are checked against the server once.
+        remote_header = file_info.get('remote_header')
+        if remote_header is None:
+            remote_header = file_name in session.nlst()
+
+        if os.path.exists(output_file_path):
+            os.remove(output_file_path)  # Left behind by an interrupted upload.
+
+        with file_metrics.stage('export') as stage:
+            writers.export_to_csv(
                 data=data,
                 outfile_path=output_file_path,
-                export_header=False
+                export_header=not remote_header
             )
-            with open(output_file_path, 'rb') as f:  # File to send.
-                session.storbinary('APPE ' + file_name, f)  # Send the file.
+            stage.add(rows=num_of_new_rows)
 
+        with file_metrics.stage('upload') as stage:
+            with open(output_file_path, 'rb') as f:  # File to send.
+                if remote_header:
+                    session.storbinary('APPE ' + file_name, f)  # Append to the remote file.
+                else:
+                    session.storbinary('STOR ' + file_name, f)  # Create the remote file.
+            stage.add(rows=num_of_new_rows, bytes=os.path.getsize(output_file_path))
 
         os.remove(output_file_path)
         new_line_num = line_num + num_of_new_rows
         cfg['sites'][site]['locations'][location]['files'][file][
             'line_num'] = new_line_num
+        cfg['sites'][site]['locations'][location]['files'][file][
+            'remote_header'] = True
+
+        if checkpoint_store is not None:
+            with file_metrics.stage('checkpoint'):
+                checkpoint_store.save(
+                    checkpoint_key, {field: file_info.get(field) for field in CHECKPOINT_FIELDS})
 
 
-def process_sites(cfg, args):
+def process_sites(cfg, args, ftp_session=None):
     """Unpacks data from the configuration file, calls the core function and updates line
         number information if tracking is enabled.
 
+    Each file's line number is committed to the checkpoint store as soon as its rows
+    are uploaded.
+
     Parameters
     ----------
     cfg : dict
         Program's configuration file.
     args : Namespace
         Arguments passed by the user. Includes site, location and file information.
+    ftp_session : FTPSession, optional
+        Session to upload with. Defaults to a session using the FTP configuration file.
+        The session only connects once there are rows to upload, and is closed when done.
+
+    If a metrics file is given by the --metrics-file argument or the 'metrics_file'
+    setting, the time, rows and bytes per file and stage (read, ftp_session, export,
+    upload and checkpoint) are written to it when done.
 
     """
     try:
@@ -134,7 +226,14 @@ def process_sites(cfg, args):
     configured_sites_msg = ', '.join("{site}".format(site=site) for site in sites)
     logger_debug.debug("Configured sites: {sites}.".format(sites=configured_sites_msg))
 
-    root_dir = session.pwd()
+    checkpoint_store_path = cfg['settings'].get('checkpoint_store_path', CHECKPOINT_STORE_PATH)
+    checkpoint_store = checkpoints.CheckpointStore(checkpoint_store_path)
+
+    if ftp_session is None:
+        ftp_session = FTPSession.from_config_file(FTP_CONFIG_PATH)
+
+    metrics_file = getattr(args, 'metrics_file', None) or cfg['settings'].get('metrics_file')
+    run_metrics = metrics.Metrics(PROGRAM_NAME) if metrics_file else metrics.NULL_METRICS
 
     try:
         if args.site:
@@ -147,8 +246,6 @@ def process_sites(cfg, args):
                 location=location) for location in locations)
             logger_debug.debug("Configured locations: {locations}.".format(
                 locations=configured_locations_msg))
-            cd_tree(args.site)
-            site_dir = session.pwd()
             if args.location:
                 # Process specific location
                 logger_info.info("Processing location: {location}".format(location=args.location))
@@ -158,76 +255,71 @@ def process_sites(cfg, args):
                     file=file) for file in files)
                 logger_debug.debug("Configured files: {files}.".format(
                     files=configured_files_msg))
-                cd_tree(args.location)
-                location_dir = session.pwd()
                 if args.file:
                     # Process specific file
                     file_info = files[args.file]
-                    cd_tree(args.file)
                     transfer_rows(
                         cfg,
                         output_dir,
                         args.site,
                         args.location,
                         args.file,
-                        file_info)
+                        file_info,
+                        ftp_session,
+                        checkpoint_store,
+                        run_metrics)
                 else:
                     # Process all files
                     for file, file_info in files.items():
-                        cd_tree(location_dir)
-                        cd_tree(file)
                         transfer_rows(
                             cfg,
                             output_dir,
                             args.site,
                             args.location,
                             file,
-                            file_info)
+                            file_info,
+                            ftp_session,
+                            checkpoint_store,
+                            run_metrics)
             else:
                 # Process all locations
                 for location, location_info in locations.items():
                     files = location_info['files']
-                    cd_tree(site_dir)
-                    cd_tree(location)
-                    location_dir = session.pwd()
                     for file, file_info in files.items():
-                        cd_tree(location_dir)
-                        cd_tree(file)
                         transfer_rows(
                             cfg,
                             output_dir,
                             args.site,
                             location,
                             file,
-                            file_info)
+                            file_info,
+                            ftp_session,
+                            checkpoint_store,
+                            run_metrics)
         else:
             # Process all sites
             for site, site_info in sites.items():
                 locations = site_info['locations']
-                cd_tree(root_dir)
-                cd_tree(site)
-                site_dir = session.pwd()
                 for location, location_info in locations.items():
                     files = location_info['files']
-                    cd_tree(site_dir)
-                    cd_tree(location)
-                    location_dir = session.pwd()
                     for file, file_info in files.items():
-                        cd_tree(location_dir)
-                        cd_tree(file)
                         transfer_rows(
                             cfg,
                             output_dir,
                             site,
                             location,
                             file,
-                            file_info)
+                            file_info,
+                            ftp_session,
+                            checkpoint_store,
+                            run_metrics)
     except Exception as e:
         print(e)
-    else:
-        utils.save_config(APP_CONFIG_PATH, cfg)
     finally:
-        session.quit()
+        checkpoint_store.close()
+        ftp_session.close()
+        if metrics_file:
+            metrics.write_metrics(run_metrics, metrics_file)
 
 
 def setup_parser():
@@ -244,8 +336,15 @@ def setup_parser():
                         dest='location', help='Specific location to upload.')
     parser.add_argument('-f', '--file', action='store', required=False,
                         dest='file', help='Specific file to upload.')
+    parser.add_argument('--metrics-file', action='store', required=False,
+                        dest='metrics_file',
+                        help='Write per-stage metrics to this file (Prometheus textfile if it '
+                             'ends with .prom, JSON otherwise).')
 
     args = parser.parse_args()
+
+    utils.setup_logging(utils.load_config(LOGGING_CONFIG_PATH))
+
     logger_debug.debug("Arguments passed by user")
     args_msg = ', '.join("{arg}: {value}".format(
         arg=arg, value=value) for (arg, value) in vars(args).items())
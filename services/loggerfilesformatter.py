@@ -8,65 +8,70 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import argparse
-import logging.config
+import copy
+import csv
+import logging
 import time
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 from campbellsciparser import cr
 
+from services import aggregation
+from services import arrowwriters
+from services import checkpoints
+from services import columnar
+from services import compression
+from services import conversions
+from services import dedup
+from services import metrics
+from services import readers
+from services import timeparsing
 from services import utils
+from services import watching
+from services import writers
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 APP_CONFIG_PATH = os.path.join(BASE_DIR, 'cfg/loggerfilesformatter.yaml')
 LOGGING_CONFIG_PATH = os.path.join(BASE_DIR, 'cfg/logging.yaml')
 
-logging_conf = utils.load_config(LOGGING_CONFIG_PATH)
-logging.config.dictConfig(logging_conf)
-logger_info = logging.getLogger('loggerfilesformatter_info')
-logger_debug = logging.getLogger('loggerfilesformatter_debug')
+PROGRAM_NAME = 'loggerfilesformatter'
 
+CHECKPOINT_STORE_PATH = os.path.join(BASE_DIR, 'cfg/checkpoints.sqlite')
+CHECKPOINT_KEY_PREFIX = PROGRAM_NAME
+CHECKPOINT_FIELDS = ('line_num', 'checkpoint', 'high_water_marks', 'aggregates')
 
-class NoHeadersException(ValueError):
-    pass
+# Errors that skip a job, instead of stopping the other jobs.
+SKIPPED_JOB_ERRORS = (writers.HeaderMismatchError, )
 
+DEFAULT_POLL_INTERVAL = 2.0
 
-class UnsupportedValueConversionType(ValueError):
-    pass
+logger_info = logging.getLogger('loggerfilesformatter_info')
+logger_debug = logging.getLogger('loggerfilesformatter_debug')
 
 
-def update_column_values_generator(data_old, data_new):
-    """Iterates one old and one new data set, replacing the modified columns.
+class NoHeadersException(ValueError):
+    pass
 
-    Parameters
-    ----------
-    data_old : DataSet
-        Data set to update.
-    data_new : DataSet
-        Data set to read updates from.
 
-    Yields
-    ------
-    DataSet
-        Updated data set.
+UnsupportedValueConversionType = conversions.UnsupportedValueConversionType
 
-    """
-    for row_old, row_new in zip(data_old, data_new):
-        for name, value_new in row_new.items():
-            row_old[name] = value_new
-        yield row_old
 
+def convert_data_column_values(data, values_to_convert, time_zone, time_format_args_library, to_utc):
+    """Converts certain column values, in place.
 
-def convert_data_time_values(data, column_name, value_time_columns, time_zone,
-                             time_format_args_library, to_utc):
-    """Convert time values (data column).
+    Time conversions are applied in one pass over the rows, numeric conversions to
+    whole columns at once (see conversions module). Only the converted columns are
+    modified and each conversion reads the row's original (unconverted) values.
 
     Parameters
     ----------
     data : DataSet
-        Data set to convert.
-    column_name: str or int
-        Time column name (or index) to convert.
-    value_time_columns : list of str or int
-        Column(s) (names or indices) to use for time conversion.
+        data set to convert.
+    values_to_convert : dict or ConversionPlan
+        Columns to convert, or a plan compiled from them.
     time_zone : str
         String representation of a valid pytz time zone. (See pytz docs
         for a list of valid time zones). The time zone refers to collected data's
@@ -80,158 +85,509 @@ def convert_data_time_values(data, column_name, value_time_columns, time_zone,
     Returns
     -------
     DataSet
-        Data time converted data set.
+        Column values converted data set.
+
+    Raises
+    ------
+    UnsupportedValueConversionType: If a conversion's value type is not supported.
+    InvalidConversionError: If a numeric conversion is invalid or its column is not found.
+    TimeColumnValueError: If a conversion has no time columns or if a column to
+        convert is not found.
 
     """
-    return cr.parse_time(
-        data=data,
-        time_zone=time_zone,
-        time_format_args_library=time_format_args_library,
-        time_parsed_column=column_name,
-        time_columns=value_time_columns,
-        replace_time_column=column_name,
-        to_utc=to_utc)
+    conversion_plan = values_to_convert
+    if not isinstance(conversion_plan, conversions.ConversionPlan):
+        conversion_plan = conversions.ConversionPlan(values_to_convert)
+
+    time_conversions = list(conversion_plan.time_conversions.items())
+    for column_name, value_time_columns in time_conversions:
+        if not value_time_columns:
+            raise cr.TimeColumnValueError("At least one time column is required!")
+
+    converted_columns = []
+    for column_name, numeric_conversion in conversion_plan.numeric_conversions.items():
+        try:
+            values = [row[column_name] for row in data]
+        except KeyError:
+            msg = "{0} not found in column names!".format(column_name)
+            raise conversions.InvalidConversionError(msg)
+        converted_columns.append((column_name, numeric_conversion.convert(values).tolist()))
 
+    if time_conversions:
+        time_parser = timeparsing.get_time_parser(time_zone, time_format_args_library, to_utc)
 
-def make_data_set_backup(data):
-    """Returns a copy of the given data set.
+        for row in data:
+            converted_values = []
+            for column_name, value_time_columns in time_conversions:
+                if column_name not in row:
+                    msg = "{0} not found in column names!".format(column_name)
+                    raise cr.TimeColumnValueError(msg)
+                converted_values.append((column_name, time_parser.parse(
+                    [value for name, value in row.items() if name in value_time_columns])))
+
+            for column_name, converted_value in converted_values:
+                row[column_name] = converted_value
+
+    for column_name, converted_values in converted_columns:
+        for row, converted_value in zip(data, converted_values):
+            row[column_name] = converted_value
+
+    return data
+
+
+def get_checkpoint_key(job):
+    """Returns a job's checkpoint store key.
 
     Parameters
     ----------
-    data : DataSet
-        Data set to backup.
+    job : tuple
+        Job as a (site, location, datalogger, table) tuple.
 
     Returns
     -------
-    DataSet
-        Copy of given data set.
+    str
+        Checkpoint store key.
 
     """
-    return cr.DataSet(
-        [cr.Row([(name, value) for name, value in row.items()])
-         for row in data]
-    )
+    return checkpoints.make_key(CHECKPOINT_KEY_PREFIX, *job)
 
 
-def make_export_data_set(data, columns_to_export):
-    """Create an 'export' data set, i.e. a data set filtered by columns to export.
+def _make_line_time(split_line, time_indices, time_zone, time_format_args_library):
+    time_parser = timeparsing.get_time_parser(time_zone, time_format_args_library)
+
+    def line_time(line):
+        values = split_line(line)
+        if values is None:
+            return None
+        try:
+            return time_parser.try_parse([values[i] for i in time_indices])
+        except IndexError:
+            return None
+
+    return line_time
+
+
+def _get_time_indices(array_id_info):
+    column_names = array_id_info.get('column_names') or []
+    time_columns = array_id_info.get('time_columns') or []
+
+    return [i for i, name in enumerate(column_names) if name in time_columns]
+
+
+def get_array_id_line_time(array_ids_info, array_id, time_zone, time_format_args_library):
+    """Returns a function giving the time of a mixed array file's lines of one array id.
+
+    Used to resume reading a truncated or rotated file, see
+    checkpoints.resolve_start_position. Lines of other array ids have no time.
 
     Parameters
     ----------
-    data : DataSet
-        Data set to extract columns from.
+    array_ids_info : dict of dict
+        File processing and exporting information, by array id.
+    array_id : str
+        Array id whose lines to parse.
+    time_zone : str
+        String representation of a valid pytz time zone.
+    time_format_args_library : list of str
+        List of the maximum expected string format columns sequence to match against
+        when parsing time values.
+
+    Returns
+    -------
+    callable or None
+        Function returning a line's time, or None if the array id's time columns
+        are not known.
+
+    """
+    time_indices = _get_time_indices(array_ids_info.get(array_id) or {})
+    if not time_indices:
+        return None
+
+    def split_line(line):
+        values = line.split(',')
+        return values if values[0] == array_id else None
+
+    return _make_line_time(split_line, time_indices, time_zone, time_format_args_library)
+
+
+def get_table_line_time(layout, time_columns, time_zone, time_format_args_library):
+    """Returns a function giving the time of a table based file's lines.
+
+    Used to resume reading a truncated or rotated file, see
+    checkpoints.resolve_start_position.
 
-    columns_to_export : list of str or int
-        Columns to extract from source data set.
+    Parameters
+    ----------
+    layout : ColumnLayout
+        The file's columns, see readers.ColumnLayout.
+    time_columns : list of str
+        Time columns.
+    time_zone : str
+        String representation of a valid pytz time zone.
+    time_format_args_library : list of str
+        List of the maximum expected string format columns sequence to match against
+        when parsing time values.
 
     Returns
     -------
-    DataSet
-        Data set ready to export.
+    callable or None
+        Function returning a line's time, or None if the time columns are not found.
+
+    """
+    time_indices = layout.indices(time_columns)
+    if not time_indices:
+        return None
+
+    def split_line(line):
+        return next(csv.reader([line]), None)
+
+    return _make_line_time(split_line, time_indices, time_zone, time_format_args_library)
+
+
+def _log_resync(checkpoint, file_identity, file_path, byte_offset):
+    if checkpoint and checkpoints.get_resume_offset(checkpoint, file_identity, file_path) is None:
+        logger_info.warning(
+            "{file_path} has been truncated, rotated or rewritten. Resuming at byte "
+            "offset {byte_offset}".format(file_path=file_path, byte_offset=byte_offset))
+
+
+def load_checkpoints(cfg, jobs, checkpoint_store):
+    """Updates the jobs' configuration sections with their stored checkpoints.
+
+    Jobs without a stored checkpoint keep the configuration file's values.
+
+    Parameters
+    ----------
+    cfg : dict
+        Program's configuration file.
+    jobs : list of tuple
+        Jobs as (site, location, datalogger, table) tuples.
+    checkpoint_store : CheckpointStore
+        Checkpoint store to read from.
+
+    Returns
+    -------
+        Updated configuration file.
 
     """
-    data_to_export = cr.DataSet()
-    for row in data:
-        data_to_export.append(cr.Row(
-            [(name, value) for name, value in row.items() if name in columns_to_export]
-        ))
+    for job in jobs:
+        state = checkpoint_store.load(get_checkpoint_key(job))
+        if state:
+            get_job_cfg(cfg, job).update(state)
 
-    return data_to_export
+    return cfg
 
 
-def restore_data_after_data_time_conversion(data, data_backup, converted_column_name):
-    """Convenience for restoring time values that was removed for data time conversion.
+def get_checkpoint_state(file_cfg):
+    """Returns a copy of a file's line number, checkpoint and related state.
 
     Parameters
     ----------
-    data : DataSet
-        Data time value converted data set.
-    data_backup : DataSet
-        Source data set.
-    converted_column_name : str or int
-        Column name (or index) that was converted.
+    file_cfg : dict
+        The file's (datalogger or table) section of the configuration file.
 
     Returns
     -------
-    DataSet
-        Data time converted data set with its original time values restored.
+    dict
+        The file's CHECKPOINT_FIELDS values.
 
     """
-    data_converted = []
+    return copy.deepcopy({
+        field: file_cfg[field] for field in CHECKPOINT_FIELDS if file_cfg.get(field) is not None})
 
-    for row in data:
-        converted_values = cr.Row()
-        for converted_name, converted_value in row.items():
-            if converted_name == converted_column_name:
-                converted_values[converted_column_name] = converted_value
 
-                data_converted.append(converted_values)
+def restore_checkpoint(cfg, job, state, checkpoint_store=None):
+    """Resets a failed job's line number and checkpoint to the last committed ones.
+
+    A failed job may have updated its state in memory (e.g. a high-water mark) without
+    writing the matching output, so it is reset to the state committed to the checkpoint
+    store, or else to the state it started with. The job then starts over from there.
+
+    Parameters
+    ----------
+    cfg : dict
+        Program's configuration file.
+    job : tuple
+        Job as a (site, location, datalogger, table) tuple.
+    state : dict
+        The job's state when it started, see get_checkpoint_state.
+    checkpoint_store : CheckpointStore, optional
+        Checkpoint store the job commits checkpoints to.
 
-    data_merged = [row for row in update_column_values_generator(
-        data_old=data_backup,
-        data_new=data_converted
-    )]
+    """
+    if checkpoint_store is not None:
+        state = checkpoint_store.load(get_checkpoint_key(job)) or state
 
-    return data_merged
+    job_cfg = get_job_cfg(cfg, job)
+    for field in CHECKPOINT_FIELDS:
+        job_cfg.pop(field, None)
+    job_cfg.update(copy.deepcopy(state))
 
 
-def convert_data_column_values(data, values_to_convert, time_zone, time_format_args_library, to_utc):
-    """Converts certain column values.
+def update_checkpoint(file_cfg, line_num, read_result, file_identity, checkpoint_store=None,
+                      checkpoint_key=None, line_filter=None, header=None):
+    """Updates a file's line number and byte offset checkpoint after a read.
 
     Parameters
     ----------
-    data : DataSet
-        data set to convert.
-    values_to_convert : dict
-        Columns to convert.
+    file_cfg : dict
+        The file's (datalogger or table) section of the configuration file.
+    line_num : int
+        Line number the read started at.
+    read_result : ReadResult
+        Result of the read.
+    file_identity : FileIdentity
+        Identity of the file at the time it was read.
+    checkpoint_store : CheckpointStore, optional
+        If given, the checkpoint is committed to the store. The read data must already
+        be written to disk.
+    checkpoint_key : str, optional
+        The file's checkpoint store key.
+    line_filter : callable, optional
+        Returns True for lines the checkpoint can resume after, see
+        checkpoints.make_checkpoint.
+    header : dict, optional
+        The file's header to cache with the checkpoint, see checkpoints.read_header.
+
+    Returns
+    -------
+    int
+        Line number following the read.
+
+    """
+    new_line_num = line_num + read_result.num_lines
+    logger_info.info("Updated up to line number {num}".format(num=new_line_num))
+    file_cfg['line_num'] = new_line_num
+    file_cfg['checkpoint'] = checkpoints.make_checkpoint(
+        read_result.byte_offset, file_identity, file_cfg.get('file_path'), line_filter, header,
+        read_result.last_line)
+
+    if checkpoint_store is not None:
+        checkpoint_store.save(checkpoint_key, {
+            field: file_cfg[field] for field in CHECKPOINT_FIELDS
+            if file_cfg.get(field) is not None})
+
+    return new_line_num
+
+
+def prepare_array_id_data(array_id_data, array_id_info, time_zone, time_format_args_library,
+                          job_metrics=metrics.NULL_SCOPE):
+    """Assigns column names to an array id's rows, converts column values and parses time.
+
+    Parameters
+    ----------
+    array_id_data : DataSet
+        The array id's rows.
+    array_id_info : dict
+        The array id's processing and exporting information.
     time_zone : str
-        String representation of a valid pytz time zone. (See pytz docs
-        for a list of valid time zones). The time zone refers to collected data's
-        time zone, which defaults to UTC and is used for localization and time conversion.
+        String representation of a valid pytz time zone.
     time_format_args_library : list of str
         List of the maximum expected string format columns sequence to match against
         when parsing time values.
-    to_utc : bool
-        If the data type to convert is 'time', convert to UTC.
+    job_metrics : ScopedMetrics, optional
+        Records the time and rows per stage.
 
     Returns
     -------
-    DataSet
-        Column values converted data set.
+    tuple
+        Time converted data set (DataSet) and rows with mismatched lengths (DataSet).
 
     """
-    data_converted = cr.DataSet()
+    column_names = array_id_info.get('column_names')
+    logger_debug.debug("Column names : {column_names}".format(column_names=column_names))
 
-    data_backup = make_data_set_backup(data)
+    time_columns = array_id_info.get('time_columns')
+    logger_debug.debug("Time columns: {time_columns}".format(time_columns=time_columns))
 
-    for column_name, convert_column_info in values_to_convert.items():
-        value_type = convert_column_info.get('value_type')
-        value_time_columns = convert_column_info.get('value_time_columns')
+    time_parsed_column_name = array_id_info.get('time_parsed_column_name', 'Timestamp')
+    logger_debug.debug("Time parsed column {time_parsed_column_name}".format(
+        time_parsed_column_name=time_parsed_column_name))
 
-        if value_type == 'time':
-            array_id_data_converted_values_all = convert_data_time_values(
-                data=data,
-                column_name=column_name,
-                value_time_columns=value_time_columns,
+    to_utc = array_id_info.get('to_utc', False)
+    logger_debug.debug("To UTC {to_utc}".format(to_utc=to_utc))
+
+    column_values_to_convert = array_id_info.get('convert_data_column_values')
+    logger_debug.debug("Convert column_values: {column_values_to_convert}".format(
+        column_values_to_convert=column_values_to_convert))
+
+    logger_info.info("Assigning column names")
+
+    with job_metrics.stage('update_column_names') as stage:
+        array_id_data_with_column_names, mismatches = cr.update_column_names(
+            data=array_id_data,
+            column_names=column_names,
+            match_row_lengths=True,
+            get_mismatched_row_lengths=True)
+        stage.add(rows=len(array_id_data))
+
+    logger_info.info("Number of matched row lengths: {matched}".format(
+        matched=len(array_id_data_with_column_names)))
+    logger_info.info("Number of mismatched row lengths: {mismatched}".format(
+        mismatched=len(mismatches)))
+
+    if column_values_to_convert:
+        with job_metrics.stage('convert_column_values') as stage:
+            array_id_data_with_column_names = convert_data_column_values(
+                data=array_id_data_with_column_names,
+                values_to_convert=column_values_to_convert,
                 time_zone=time_zone,
                 time_format_args_library=time_format_args_library,
                 to_utc=to_utc
             )
-        else:
-            msg = "Only time conversion is supported in this version."
-            raise UnsupportedValueConversionType(msg)
+            stage.add(rows=len(array_id_data_with_column_names))
 
-        data_converted = restore_data_after_data_time_conversion(
-            data=array_id_data_converted_values_all,
-            data_backup=data_backup,
-            converted_column_name=column_name
-        )
+    with job_metrics.stage('parse_time') as stage:
+        array_id_data_time_converted = timeparsing.parse_time(
+            data=array_id_data_with_column_names,
+            time_zone=time_zone,
+            time_format_args_library=time_format_args_library,
+            time_parsed_column=time_parsed_column_name,
+            time_columns=time_columns,
+            to_utc=to_utc)
+        stage.add(rows=len(array_id_data_time_converted))
+
+    return array_id_data_time_converted, mismatches
+
+
+def prepare_array_ids(data, time_zone, time_format_args_library, array_ids_info,
+                      job_metrics=metrics.NULL_SCOPE):
+    """Prepares each array id's rows for export, see prepare_array_id_data.
+
+    Parameters
+    ----------
+    data : dict of DataSet
+        Mixed array data set, split by array ids.
+    time_zone : str
+        String representation of a valid pytz time zone.
+    time_format_args_library : list of str
+        List of the maximum expected string format columns sequence to match against
+        when parsing time values.
+    array_ids_info : dict of dict
+        File processing and exporting information.
+    job_metrics : ScopedMetrics, optional
+        Records the time and rows per stage.
+
+    Returns
+    -------
+    dict of tuple
+        Time converted data set and mismatched rows, by array name. Array ids without
+        rows are left out.
+
+    """
+    prepared_data = {}
+
+    for array_id, array_id_info in array_ids_info.items():
+        array_name = array_id_info.get('name', array_id)
+
+        array_id_data = data.get(array_name, cr.DataSet())
 
-    return data_converted
+        if not array_id_data:
+            logger_debug.debug("No work to be done for array: {array_name}".format(
+                array_name=array_name))
+            continue
+
+        logger_info.info("Processing array: {array_name}".format(array_name=array_name))
+        logger_info.info("{num} new rows".format(num=len(array_id_data)))
+
+        prepared_data[array_name] = prepare_array_id_data(
+            array_id_data, array_id_info, time_zone, time_format_args_library, job_metrics)
+
+    return prepared_data
+
+
+def aggregate_and_export(data, name, aggregations, aggregates, time_column, output_path, file_ext,
+                         output_format=arrowwriters.CSV_FORMAT, output_compression=None,
+                         include_time_zone=False, output_files=None,
+                         job_metrics=metrics.NULL_SCOPE):
+    """Adds new data to an array id's or table's aggregations and exports closed windows.
+
+    Each aggregation is exported to its own file, named <name>_<aggregation name>.
+
+    Parameters
+    ----------
+    data : DataSet or ColumnarDataSet
+        Time parsed (and deduplicated) new data.
+    name : str
+        Array or table name.
+    aggregations : list of Aggregation
+        Compiled aggregations, see aggregation.compile_aggregations.
+    aggregates : dict of dict
+        Aggregation states per array or table name, by aggregation name. Updated in place.
+    time_column : str or int
+        Parsed time column.
+    output_path : str
+        Directory to export to.
+    file_ext : str
+        Output file extension.
+    output_format : str, optional
+        One of arrowwriters.OUTPUT_FORMATS.
+    output_compression : str, optional
+        Compression of CSV output files.
+    include_time_zone : bool, optional
+        Include time zone in the windows' time values.
+    output_files : OutputFiles, optional
+        Open output files to write to.
+    job_metrics : ScopedMetrics, optional
+        Records the time and rows per stage.
+
+    """
+    if not len(data):
+        return
+
+    with job_metrics.stage('aggregate') as stage:
+        stage.add(rows=len(data))
+        column_names = {
+            column_name for compiled in aggregations for column_name, _ in compiled.columns}
+        if isinstance(data, columnar.ColumnarDataSet):
+            times = data.datetimes(time_column)
+            columns = {
+                column_name: data[column_name] for column_name in column_names
+                if column_name in data}
+        else:
+            times = [row[time_column] for row in data]
+            columns = {
+                column_name: [row[column_name] for row in data] for column_name in column_names
+                if column_name in data[0]}
+
+        states = aggregates.setdefault(name, {})
+        closed_windows = []
+        for compiled in aggregations:
+            windows, states[compiled.name] = aggregation.aggregate(
+                compiled, time_column, times, columns, states.get(compiled.name))
+            closed_windows.append((compiled, windows))
+
+    with job_metrics.stage('export') as stage:
+        for compiled, windows in closed_windows:
+            if not windows:
+                continue
+            logger_info.info("Number of closed {aggregation} windows: {num}".format(
+                aggregation=compiled.name, num=len(windows)))
+            aggregation_name = '{name}_{aggregation}'.format(name=name, aggregation=compiled.name)
+            if output_format == arrowwriters.CSV_FORMAT:
+                writers.export_to_csv(
+                    data=windows,
+                    outfile_path=compression.get_compressed_path(
+                        os.path.join(output_path, aggregation_name + file_ext),
+                        output_compression),
+                    export_header=True,
+                    include_time_zone=include_time_zone,
+                    output_files=output_files
+                )
+            else:
+                arrowwriters.export_to_file(
+                    data=windows,
+                    outfile_path=arrowwriters.get_output_path(
+                        output_path, aggregation_name, output_format),
+                    output_format=output_format
+                )
+            stage.add(rows=len(windows))
 
 
 def process_array_ids(site, location, datalogger, data, time_zone, time_format_args_library,
-                      output_dir, array_ids_info, file_ext):
+                      output_dir, array_ids_info, file_ext, output_files=None,
+                      high_water_marks=None, aggregates=None, job_metrics=metrics.NULL_SCOPE,
+                      prepared=False):
     """Splits apart mixed array location files into subfiles based on each rows' array id.
 
     Parameters
@@ -243,7 +599,8 @@ def process_array_ids(site, location, datalogger, data, time_zone, time_format_a
     datalogger : str
         Datalogger id.
     data : dict of DataSet
-        Mixed array data set, split by array ids.
+        Mixed array data set, split by array ids. If prepared, the data as returned by
+        prepare_array_ids instead.
     time_zone : str
         String representation of a valid pytz time zone. (See pytz docs
         for a list of valid time zones). The time zone refers to collected data's
@@ -257,6 +614,18 @@ def process_array_ids(site, location, datalogger, data, time_zone, time_format_a
         File processing and exporting information.
     file_ext : str
         Output file extension.
+    output_files : OutputFiles, optional
+        Open output files to write to.
+    high_water_marks : dict of str, optional
+        Latest timestamp emitted per array name, for array ids with deduplication
+        enabled (see dedup module). Updated in place.
+    aggregates : dict of dict, optional
+        Aggregation states per array name, for array ids with aggregations (see
+        aggregation module). Updated in place.
+    job_metrics : ScopedMetrics, optional
+        Records the time and rows per stage.
+    prepared : bool, optional
+        The data has already been prepared for export, e.g. in another process.
 
     Raises
     ------
@@ -264,41 +633,46 @@ def process_array_ids(site, location, datalogger, data, time_zone, time_format_a
 
     """
 
+    if not prepared:
+        data = prepare_array_ids(
+            data, time_zone, time_format_args_library, array_ids_info, job_metrics)
+
     for array_id, array_id_info in array_ids_info.items():
         array_name = array_id_info.get('name', array_id)
 
-        logger_info.info("Processing array: {array_name}".format(array_name=array_name))
-        array_id_data = data.get(array_name)
-        logger_info.info("{num} new rows".format(num=len(array_id_data)))
-
-        if not array_id_data:
-            logger_info.info("No work to be done for array: {array_name}".format(array_name=array_name))
+        if array_name not in data:
             continue
 
-        column_names = array_id_info.get('column_names')
-        logger_debug.debug("Column names : {column_names}".format(column_names=column_names))
+        array_id_data_time_converted, mismatches = data[array_name]
 
         export_columns = array_id_info.get('export_columns')
         logger_debug.debug(
             "Export columns: {export_columns}".format(export_columns=export_columns))
+        export_plan = writers.ExportPlan(export_columns)
 
         include_time_zone = array_id_info.get('include_time_zone', False)
         logger_debug.debug("Include time zone: {include_time_zone}".format(
             include_time_zone=include_time_zone))
 
-        time_columns = array_id_info.get('time_columns')
-        logger_debug.debug("Time columns: {time_columns}".format(time_columns=time_columns))
-
         time_parsed_column_name = array_id_info.get('time_parsed_column_name', 'Timestamp')
-        logger_debug.debug("Time parsed column {time_parsed_column_name}".format(
-            time_parsed_column_name=time_parsed_column_name))
 
-        to_utc = array_id_info.get('to_utc', False)
-        logger_debug.debug("To UTC {to_utc}".format(to_utc=to_utc))
+        output_format = array_id_info.get('output_format', arrowwriters.CSV_FORMAT)
+        logger_debug.debug("Output format: {output_format}".format(output_format=output_format))
+        arrowwriters.check_output_format(output_format)
 
-        column_values_to_convert = array_id_info.get('convert_data_column_values')
-        logger_debug.debug("Convert column_values: {column_values_to_convert}".format(
-            column_values_to_convert=column_values_to_convert))
+        partition = array_id_info.get('partition')
+        logger_debug.debug("Partition: {partition}".format(partition=partition))
+        writers.check_partition(partition)
+
+        output_compression = array_id_info.get('compression')
+        logger_debug.debug("Compression: {compression}".format(compression=output_compression))
+        compression.check_compression(output_compression)
+
+        deduplicate = array_id_info.get('deduplicate', False)
+        logger_debug.debug("Deduplicate: {deduplicate}".format(deduplicate=deduplicate))
+
+        aggregations = aggregation.compile_aggregations(array_id_info.get('aggregations'))
+        logger_debug.debug("Aggregations: {aggregations}".format(aggregations=aggregations))
 
         array_id_file = array_name + file_ext
         logger_debug.debug("Array id file: {array_id_file}".format(
@@ -313,57 +687,238 @@ def process_array_ids(site, location, datalogger, data, time_zone, time_format_a
         logger_debug.debug("Array id mismatched file: {array_id_mismatches_file}".format(
             array_id_mismatches_file=array_id_mismatches_file))
 
-        array_id_mismatches_file_path = os.path.join(
-            os.path.abspath(output_dir), site, location, datalogger, array_id_mismatches_file)
+        array_id_mismatches_file_path = compression.get_compressed_path(os.path.join(
+            os.path.abspath(output_dir), site, location, datalogger, array_id_mismatches_file),
+            output_compression)
         logger_debug.debug(
             "Array id mismatched file path: {array_id_mismatches_file_path}".format(
                 array_id_mismatches_file_path=array_id_mismatches_file_path))
 
-        logger_info.info("Assigning column names")
+        if deduplicate and high_water_marks is not None:
+            with job_metrics.stage('deduplicate') as stage:
+                stage.add(rows=len(array_id_data_time_converted))
+                array_id_data_time_converted, high_water_marks[array_name] = \
+                    dedup.drop_emitted_rows(
+                        array_id_data_time_converted, time_parsed_column_name,
+                        high_water_marks.get(array_name))
+            logger_info.info("Number of new rows after deduplication: {num}".format(
+                num=len(array_id_data_time_converted)))
+
+        if aggregations and aggregates is not None:
+            aggregate_and_export(
+                data=array_id_data_time_converted,
+                name=array_name,
+                aggregations=aggregations,
+                aggregates=aggregates,
+                time_column=time_parsed_column_name,
+                output_path=os.path.dirname(array_id_file_path),
+                file_ext=file_ext,
+                output_format=output_format,
+                output_compression=output_compression,
+                include_time_zone=include_time_zone,
+                output_files=output_files,
+                job_metrics=job_metrics
+            )
 
-        array_id_data_with_column_names, mismatches = cr.update_column_names(
-            data=array_id_data,
-            column_names=column_names,
-            match_row_lengths=True,
-            get_mismatched_row_lengths=True)
+        if output_format != arrowwriters.CSV_FORMAT:
+            array_id_file_path = arrowwriters.get_output_path(
+                os.path.dirname(array_id_file_path), array_name, output_format)
+
+        with job_metrics.stage('export') as stage:
+            partitions = writers.partition_data(
+                array_id_data_time_converted, time_parsed_column_name, partition)
+            for partition_key, partition_data in partitions:
+                partition_file_path = writers.get_partition_path(array_id_file_path, partition_key)
+                if output_format == arrowwriters.CSV_FORMAT:
+                    writers.export_to_csv(
+                        data=partition_data,
+                        outfile_path=compression.get_compressed_path(
+                            partition_file_path, output_compression),
+                        export_header=True,
+                        include_time_zone=include_time_zone,
+                        export_plan=export_plan,
+                        output_files=output_files
+                    )
+                else:
+                    arrowwriters.export_to_file(
+                        data=partition_data,
+                        outfile_path=partition_file_path,
+                        output_format=output_format,
+                        export_plan=export_plan
+                    )
+
+            if mismatches:
+                writers.export_to_csv(
+                    data=mismatches,
+                    outfile_path=array_id_mismatches_file_path,
+                    output_files=output_files
+                )
+            stage.add(rows=len(array_id_data_time_converted) + len(mismatches))
+
+
+def process_array_ids_columnar(site, location, datalogger, data, time_zone,
+                               time_format_args_library, output_dir, array_ids_info, file_ext,
+                               high_water_marks=None, aggregates=None,
+                               job_metrics=metrics.NULL_SCOPE):
+    """Columnar version of process_array_ids, see columnar module.
+
+    Parameters
+    ----------
+    site : str
+        Site id.
+    location : str
+        Location id.
+    datalogger : str
+        Datalogger id.
+    data : MixedArrayData
+        Mixed array data, as read by columnar.read_mixed_array_data.
+    time_zone : str
+        String representation of a valid pytz time zone. (See pytz docs
+        for a list of valid time zones). The time zone refers to collected data's
+        time zone, which defaults to UTC and is used for localization and time conversion.
+    time_format_args_library : list of str
+        List of the maximum expected string format columns sequence to match against
+        when parsing time values.
+    output_dir : str
+        Output directory.
+    array_ids_info : dict of dict
+        File processing and exporting information.
+    file_ext : str
+        Output file extension.
+    high_water_marks : dict of str, optional
+        Latest timestamp emitted per array name, see process_array_ids.
+    aggregates : dict of dict, optional
+        Aggregation states per array name, see process_array_ids.
+    job_metrics : ScopedMetrics, optional
+        Records the time and rows per stage.
+
+    Raises
+    ------
+    UnsupportedValueConversionType: If an unsupported data value conversion type is given.
+
+    """
+    for array_id, array_id_info in array_ids_info.items():
+        array_name = array_id_info.get('name', array_id)
+
+        logger_info.info("Processing array: {array_name}".format(array_name=array_name))
+
+        column_names = array_id_info.get('column_names')
+        export_plan = writers.ExportPlan(array_id_info.get('export_columns'))
+        include_time_zone = array_id_info.get('include_time_zone', False)
+        time_columns = array_id_info.get('time_columns')
+        time_parsed_column_name = array_id_info.get('time_parsed_column_name', 'Timestamp')
+        to_utc = array_id_info.get('to_utc', False)
+        conversion_plan = conversions.ConversionPlan(
+            array_id_info.get('convert_data_column_values'))
+        output_format = array_id_info.get('output_format', arrowwriters.CSV_FORMAT)
+        arrowwriters.check_output_format(output_format)
+        partition = array_id_info.get('partition')
+        writers.check_partition(partition)
+        output_compression = array_id_info.get('compression')
+        compression.check_compression(output_compression)
+        deduplicate = array_id_info.get('deduplicate', False)
+        aggregations = aggregation.compile_aggregations(array_id_info.get('aggregations'))
+
+        with job_metrics.stage('update_column_names') as stage:
+            array_id_data, mismatches = columnar.split_array_id(
+                data, array_id, column_names, fix_floats=True)
+            stage.add(rows=len(array_id_data) + len(mismatches))
+
+        num_of_new_rows = len(array_id_data) + len(mismatches)
+        logger_info.info("{num} new rows".format(num=num_of_new_rows))
+
+        if num_of_new_rows == 0:
+            logger_info.info("No work to be done for array: {array_name}".format(array_name=array_name))
+            continue
 
         logger_info.info("Number of matched row lengths: {matched}".format(
-            matched=len(array_id_data_with_column_names)))
+            matched=len(array_id_data)))
         logger_info.info("Number of mismatched row lengths: {mismatched}".format(
             mismatched=len(mismatches)))
 
-        if column_values_to_convert:
-            array_id_data_with_column_names = convert_data_column_values(
-                data=array_id_data_with_column_names,
-                values_to_convert=column_values_to_convert,
+        output_path = os.path.join(os.path.abspath(output_dir), site, location, datalogger)
+        array_id_file_path = os.path.join(output_path, array_name + file_ext)
+        array_id_mismatches_file_path = compression.get_compressed_path(os.path.join(
+            output_path, array_name + ' Mismatches' + file_ext), output_compression)
+
+        if conversion_plan:
+            with job_metrics.stage('convert_column_values') as stage:
+                array_id_data = columnar.convert_data_column_values(
+                    data=array_id_data,
+                    values_to_convert=conversion_plan,
+                    time_zone=time_zone,
+                    time_format_args_library=time_format_args_library,
+                    to_utc=to_utc
+                )
+                stage.add(rows=len(array_id_data))
+
+        with job_metrics.stage('parse_time') as stage:
+            array_id_data_time_converted = columnar.parse_time(
+                data=array_id_data,
                 time_zone=time_zone,
                 time_format_args_library=time_format_args_library,
-                to_utc=to_utc
+                time_columns=time_columns,
+                time_parsed_column=time_parsed_column_name,
+                to_utc=to_utc)
+            stage.add(rows=len(array_id_data_time_converted))
+
+        if deduplicate and high_water_marks is not None:
+            with job_metrics.stage('deduplicate') as stage:
+                stage.add(rows=len(array_id_data_time_converted))
+                array_id_data_time_converted, high_water_marks[array_name] = \
+                    columnar.drop_emitted_rows(
+                        array_id_data_time_converted, time_parsed_column_name,
+                        high_water_marks.get(array_name))
+            logger_info.info("Number of new rows after deduplication: {num}".format(
+                num=len(array_id_data_time_converted)))
+
+        if aggregations and aggregates is not None:
+            aggregate_and_export(
+                data=array_id_data_time_converted,
+                name=array_name,
+                aggregations=aggregations,
+                aggregates=aggregates,
+                time_column=time_parsed_column_name,
+                output_path=output_path,
+                file_ext=file_ext,
+                output_format=output_format,
+                output_compression=output_compression,
+                include_time_zone=include_time_zone,
+                job_metrics=job_metrics
             )
 
-        array_id_data_time_converted = cr.parse_time(
-            data=array_id_data_with_column_names,
-            time_zone=time_zone,
-            time_format_args_library=time_format_args_library,
-            time_parsed_column=time_parsed_column_name,
-            time_columns=time_columns,
-            to_utc=to_utc)
-
-        data_to_export = make_export_data_set(
-            data=array_id_data_time_converted, columns_to_export=export_columns)
-
-        cr.export_to_csv(
-            data=data_to_export,
-            outfile_path=array_id_file_path,
-            export_header=True,
-            include_time_zone=include_time_zone
-        )
+        if output_format != arrowwriters.CSV_FORMAT:
+            array_id_file_path = arrowwriters.get_output_path(
+                output_path, array_name, output_format)
+
+        with job_metrics.stage('export') as stage:
+            partitions = columnar.partition_data(
+                array_id_data_time_converted, time_parsed_column_name, partition)
+            for partition_key, partition_data in partitions:
+                partition_file_path = writers.get_partition_path(array_id_file_path, partition_key)
+                if output_format == arrowwriters.CSV_FORMAT:
+                    columnar.export_to_csv(
+                        data=export_plan.select(partition_data),
+                        outfile_path=compression.get_compressed_path(
+                            partition_file_path, output_compression),
+                        export_header=True,
+                        include_time_zone=include_time_zone
+                    )
+                else:
+                    arrowwriters.export_columnar_to_file(
+                        data=export_plan.select(partition_data),
+                        outfile_path=partition_file_path,
+                        output_format=output_format
+                    )
 
-        if mismatches:
-            cr.export_to_csv(data=mismatches, outfile_path=array_id_mismatches_file_path)
+            if mismatches:
+                writers.append_lines(
+                    array_id_mismatches_file_path, [",".join(values) for values in mismatches])
+            stage.add(rows=num_of_new_rows)
 
 
-def process_mixed_array(cfg, output_dir, site, location, datalogger, datalogger_info, track=False):
+def process_mixed_array(cfg, output_dir, site, location, datalogger, datalogger_info, track=False,
+                        checkpoint_store=None, job_metrics=metrics.NULL_SCOPE):
     """Splits apart mixed array location files into subfiles based on each rows' array id.
 
     Parameters
@@ -381,7 +936,13 @@ def process_mixed_array(cfg, output_dir, site, location, datalogger, datalogger_
     datalogger_info : dict
         Datalogger information including the datalogger's array ids lookup table, source file
         path and last read line number.
-    track: If true, update configuration file with the last read line number.
+    track: If true, update configuration file with the last read line number and byte
+        offset checkpoint.
+    checkpoint_store : CheckpointStore, optional
+        If given (and tracking), the checkpoint is committed to the store after each
+        chunk (or byte range), once its output is written.
+    job_metrics : ScopedMetrics, optional
+        Records the time, rows and bytes per stage.
 
     Returns
     -------
@@ -398,6 +959,9 @@ def process_mixed_array(cfg, output_dir, site, location, datalogger, datalogger_
     line_num = datalogger_info.get('line_num', 0)
     logger_debug.debug("Line num: {line_num}".format(line_num=line_num))
 
+    checkpoint = datalogger_info.get('checkpoint')
+    logger_debug.debug("Checkpoint: {checkpoint}".format(checkpoint=checkpoint))
+
     time_zone = datalogger_info.get('time_zone')
     logger_debug.debug("Time zone: {time_zone}".format(time_zone=time_zone))
 
@@ -410,51 +974,331 @@ def process_mixed_array(cfg, output_dir, site, location, datalogger, datalogger_
         for array_id, array_id_info in array_ids_info.items()
     }
 
-    data = cr.read_array_ids_data(
-        infile_path=file_path,
-        first_line_num=line_num,
-        fix_floats=True,
-        array_id_names=array_id_names
-    )
+    last_line = checkpoint.get('last_line') if checkpoint else None
+    line_time = get_array_id_line_time(
+        array_ids_info, last_line.split(',')[0], time_zone,
+        time_format_args_library) if last_line else None
 
-    num_of_new_rows = 0
+    file_identity = checkpoints.get_file_identity(file_path)
+    byte_offset, line_num = checkpoints.resolve_start_position(
+        file_path, line_num, checkpoint, file_identity, line_time=line_time)
+    _log_resync(checkpoint, file_identity, file_path, byte_offset)
+    logger_debug.debug("Byte offset: {byte_offset}".format(byte_offset=byte_offset))
+
+    engine = datalogger_info.get('engine', 'rows')
+    logger_debug.debug("Engine: {engine}".format(engine=engine))
+
+    chunk_size = datalogger_info.get('chunk_size', readers.DEFAULT_ARRAY_CHUNK_SIZE)
+    logger_debug.debug("Chunk size: {chunk_size}".format(chunk_size=chunk_size))
+
+    # Get file extension, e.g. '.dat' for compressed input files named *.dat.gz.
+    file_ext = os.path.splitext(compression.get_uncompressed_path(os.path.abspath(file_path)))[1]
+    logger_debug.debug("File ext: {file_ext}".format(file_ext=file_ext))
+
+    high_water_marks = dict(datalogger_info.get('high_water_marks') or {})
+    logger_debug.debug("High-water marks: {high_water_marks}".format(
+        high_water_marks=high_water_marks))
+
+    aggregates = dict(datalogger_info.get('aggregates') or {})
+    logger_debug.debug("Aggregates: {aggregates}".format(aggregates=aggregates))
+
+    parallel_workers = int(datalogger_info.get('parallel_workers') or 1)
+    logger_debug.debug("Parallel workers: {parallel_workers}".format(
+        parallel_workers=parallel_workers))
+
+    byte_ranges = []
+    if parallel_workers > 1 and engine == 'columnar':
+        logger_info.info("The columnar engine reads files serially, ignoring parallel workers")
+    elif parallel_workers > 1:
+        byte_ranges = readers.split_byte_ranges(
+            file_path, byte_offset,
+            int(datalogger_info.get('parallel_range_size') or readers.DEFAULT_RANGE_SIZE))
+        logger_debug.debug("Byte ranges: {num}".format(num=len(byte_ranges)))
+
+    line_times = {
+        array_id: get_array_id_line_time(
+            array_ids_info, array_id, time_zone, time_format_args_library)
+        for array_id in array_ids_info
+    }
+
+    def has_time(line):
+        line_time = line_times.get(line.split(',', 1)[0])
+        return line_time is not None and line_time(line) is not None
+
+    def commit(read_result):
+        # Called once the read data's output is written, see update_checkpoint.
+        if high_water_marks:
+            datalogger_info['high_water_marks'] = high_water_marks
+        if aggregates:
+            datalogger_info['aggregates'] = aggregates
+        if track:
+            with job_metrics.stage('checkpoint'):
+                update_checkpoint(
+                    datalogger_info, line_num, read_result, file_identity, checkpoint_store,
+                    get_checkpoint_key((site, location, datalogger, None)), has_time)
+
+    if engine == 'columnar':
+        with job_metrics.stage('read') as stage:
+            read_result = columnar.read_mixed_array_data(
+                infile_path=file_path,
+                byte_offset=byte_offset
+            )
+            stage.add(rows=read_result.num_lines, bytes=read_result.byte_offset - byte_offset)
+        num_of_new_rows = columnar.count_array_ids(read_result.data, array_ids_info.keys())
+
+        if num_of_new_rows:
+            process_array_ids_columnar(
+                site=site,
+                location=location,
+                datalogger=datalogger,
+                data=read_result.data,
+                time_zone=time_zone,
+                time_format_args_library=time_format_args_library,
+                output_dir=output_dir,
+                array_ids_info=array_ids_info,
+                file_ext=file_ext,
+                high_water_marks=high_water_marks,
+                aggregates=aggregates,
+                job_metrics=job_metrics
+            )
+        commit(read_result)
+    elif len(byte_ranges) > 1:
+        num_of_new_rows = 0
+        read_byte_offset, read_num_lines = byte_offset, 0
+
+        range_results = run_byte_ranges_in_pool(
+            _prepare_array_ids_range, byte_ranges, parallel_workers, job_metrics,
+            file_path, array_ids_info, time_zone, time_format_args_library)
+
+        with writers.OutputFiles() as output_files:
+            for range_result, num_of_rows in job_metrics.iterate('read', range_results):
+                # Range results hold the byte offset and number of lines of the range.
+                job_metrics.add('read', rows=range_result.num_lines,
+                                bytes=range_result.byte_offset - read_byte_offset)
+                read_byte_offset = range_result.byte_offset
+                read_num_lines += range_result.num_lines
+                num_of_new_rows += num_of_rows
+
+                process_array_ids(
+                    site=site,
+                    location=location,
+                    datalogger=datalogger,
+                    data=range_result.data,
+                    time_zone=time_zone,
+                    time_format_args_library=time_format_args_library,
+                    output_dir=output_dir,
+                    array_ids_info=array_ids_info,
+                    file_ext=file_ext,
+                    output_files=output_files,
+                    high_water_marks=high_water_marks,
+                    aggregates=aggregates,
+                    job_metrics=job_metrics,
+                    prepared=True
+                )
+                commit(readers.ReadResult(
+                    None, read_byte_offset, read_num_lines, range_result.last_line))
+    else:
+        read_results = readers.read_array_ids_chunks(
+            infile_path=file_path,
+            chunk_size=int(chunk_size) if chunk_size else None,
+            byte_offset=byte_offset,
+            fix_floats=True,
+            array_id_names=array_id_names
+        )
 
-    for array_id, array_id_data in data.items():
-        num_of_new_rows += len(array_id_data)
+        num_of_new_rows = 0
+        read_byte_offset, read_num_lines = byte_offset, 0
+
+        with writers.OutputFiles() as output_files:
+            for read_result in job_metrics.iterate('read', read_results):
+                # Read results hold the byte offset and number of lines read so far.
+                job_metrics.add('read', rows=read_result.num_lines - read_num_lines,
+                                bytes=read_result.byte_offset - read_byte_offset)
+                read_byte_offset, read_num_lines = read_result.byte_offset, read_result.num_lines
+
+                for array_id_data in read_result.data.values():
+                    num_of_new_rows += len(array_id_data)
+
+                process_array_ids(
+                    site=site,
+                    location=location,
+                    datalogger=datalogger,
+                    data=read_result.data,
+                    time_zone=time_zone,
+                    time_format_args_library=time_format_args_library,
+                    output_dir=output_dir,
+                    array_ids_info=array_ids_info,
+                    file_ext=file_ext,
+                    output_files=output_files,
+                    high_water_marks=high_water_marks,
+                    aggregates=aggregates,
+                    job_metrics=job_metrics
+                )
+                commit(read_result)
 
     logger_info.info("Found {num} new rows".format(num=num_of_new_rows))
     if num_of_new_rows == 0:
         logger_info.info("No work to be done for location: {location}".format(location=location))
-        return cfg
 
-    file_ext = os.path.splitext(os.path.abspath(file_path))[1]  # Get file extension
-    logger_debug.debug("File ext: {file_ext}".format(file_ext=file_ext))
+    return cfg
 
-    process_array_ids(
-        site=site,
-        location=location,
-        datalogger=datalogger,
-        data=data,
-        time_zone=time_zone,
-        time_format_args_library=time_format_args_library,
-        output_dir=output_dir,
-        array_ids_info=array_ids_info,
-        file_ext=file_ext
-    )
 
-    if track:
-        if num_of_new_rows > 0:
-            new_line_num = line_num + num_of_new_rows
-            logger_info.info("Updated up to line number {num}".format(num=new_line_num))
-            cfg['sites'][site]['locations'][location]['dataloggers'][datalogger]['line_num'] = new_line_num
+def prepare_table_data(data, table_info, job_metrics=metrics.NULL_SCOPE, conversion_plan=None):
+    """Parses time and converts column values of table based data.
+
+    Parameters
+    ----------
+    data : DataSet
+        Table data, as read.
+    table_info : dict
+        Table-based file information.
+    job_metrics : ScopedMetrics, optional
+        Records the time and rows per stage.
+    conversion_plan : ConversionPlan, optional
+        The table's column value conversions, compiled once. If not given, compiled
+        from the table information.
+
+    Returns
+    -------
+    DataSet
+        Time converted data set.
 
-    msg = "Done processing datalogger: {datalogger}"
-    logger_info.info(msg.format(datalogger=datalogger))
+    """
+    time_zone = table_info.get('time_zone')
+    time_format_args_library = table_info.get('time_format_args_library')
+    to_utc = table_info.get('to_utc', False)
+    if conversion_plan is None:
+        conversion_plan = conversions.ConversionPlan(table_info.get('convert_data_column_values'))
 
-    return cfg
+    with job_metrics.stage('parse_time') as stage:
+        data = timeparsing.parse_time(
+            data=data,
+            time_zone=time_zone,
+            time_format_args_library=time_format_args_library,
+            time_parsed_column=table_info.get('time_parsed_column_name'),
+            time_columns=table_info.get('time_columns'),
+            to_utc=to_utc
+        )
+        stage.add(rows=len(data))
+
+    if data and conversion_plan:
+        with job_metrics.stage('convert_column_values') as stage:
+            data = convert_data_column_values(
+                data=data,
+                values_to_convert=conversion_plan,
+                time_zone=time_zone,
+                time_format_args_library=time_format_args_library,
+                to_utc=to_utc
+            )
+            stage.add(rows=len(data))
+
+    return data
 
 
-def process_table_based(cfg, output_dir, site, location, datalogger, table, table_info, track=False):
+def _worker_metrics(metrics_enabled):
+    if not metrics_enabled:
+        return metrics.NULL_METRICS, metrics.NULL_SCOPE
+
+    range_metrics = metrics.Metrics(PROGRAM_NAME)
+    return range_metrics, range_metrics.scope()
+
+
+def _prepare_table_range(metrics_enabled, file_path, header, table_info, byte_range):
+    """Process pool entry point. Reads and prepares one byte range of a table based file.
+
+    Returns
+    -------
+    tuple
+        ReadResult holding the prepared data, and the range's metrics samples.
+
+    """
+    range_metrics, job_metrics = _worker_metrics(metrics_enabled)
+    start, end = byte_range
+
+    read_result = readers.read_table_data(
+        file_path, byte_offset=start, header=header, end_offset=end)
+    data = prepare_table_data(read_result.data, table_info, job_metrics)
+
+    return read_result._replace(data=data), range_metrics.snapshot()
+
+
+def _prepare_array_ids_range(metrics_enabled, file_path, array_ids_info, time_zone,
+                             time_format_args_library, byte_range):
+    """Process pool entry point. Reads and prepares one byte range of a mixed array file.
+
+    Returns
+    -------
+    tuple
+        ReadResult holding the prepared data (see prepare_array_ids) and the number of
+        lines in the range, the number of rows read, and the range's metrics samples.
+
+    """
+    range_metrics, job_metrics = _worker_metrics(metrics_enabled)
+    start, end = byte_range
+    array_id_names = {
+        array_id: array_id_info.get('name', array_id)
+        for array_id, array_id_info in array_ids_info.items()
+    }
+
+    read_result = readers.read_array_ids_data(
+        file_path, byte_offset=start, array_id_names=array_id_names, end_offset=end)
+    num_of_rows = sum(len(array_id_data) for array_id_data in read_result.data.values())
+
+    data = prepare_array_ids(
+        read_result.data, time_zone, time_format_args_library, array_ids_info, job_metrics)
+
+    return (read_result._replace(data=data), num_of_rows), range_metrics.snapshot()
+
+
+def run_byte_ranges_in_pool(func, byte_ranges, workers, job_metrics, *args):
+    """Runs a function on byte ranges of a file in a pool of worker processes.
+
+    Results are yielded in byte range order, so they can be written to the output as
+    if the file had been read serially. At most two ranges per worker are processed
+    ahead of the results consumed.
+
+    Parameters
+    ----------
+    func : callable
+        Module level function, called with (metrics_enabled, *args, byte_range) and
+        returning a result and its metrics samples.
+    byte_ranges : list of tuple
+        (start, end) byte ranges, see readers.split_byte_ranges.
+    workers : int
+        Number of worker processes.
+    job_metrics : ScopedMetrics
+        Collects the time, rows and bytes per stage recorded by the workers.
+    args
+        Arguments passed to func.
+
+    Yields
+    ------
+    object
+        func's result for each byte range.
+
+    """
+    metrics_enabled = job_metrics is not metrics.NULL_SCOPE
+    futures = deque()
+
+    def next_result():
+        result, samples = futures.popleft().result()
+        for sample in samples:
+            job_metrics.add(sample['stage'], rows=sample['rows'], bytes=sample['bytes'],
+                            seconds=sample['seconds'], calls=sample['calls'])
+        return result
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(utils.get_logging_config(), )) as executor:
+        for byte_range in byte_ranges:
+            futures.append(executor.submit(func, metrics_enabled, *args, byte_range))
+            if len(futures) > 2 * workers:
+                yield next_result()
+        while futures:
+            yield next_result()
+
+
+def process_table_based(cfg, output_dir, site, location, datalogger, table, table_info, track=False,
+                        checkpoint_store=None, job_metrics=metrics.NULL_SCOPE):
     """
     Parameters
     ----------
@@ -472,7 +1316,13 @@ def process_table_based(cfg, output_dir, site, location, datalogger, table, tabl
         Table-based file id.
     table_info : dict
         Table-based file information.
-    track: If true, update configuration file with the last read line number.
+    track: If true, update configuration file with the last read line number and byte
+        offset checkpoint.
+    checkpoint_store : CheckpointStore, optional
+        If given (and tracking), the checkpoint is committed to the store after each
+        chunk is written.
+    job_metrics : ScopedMetrics, optional
+        Records the time, rows and bytes per stage.
 
     Returns
     -------
@@ -487,6 +1337,7 @@ def process_table_based(cfg, output_dir, site, location, datalogger, table, tabl
 
     export_columns = table_info.get('export_columns')
     logger_debug.debug("Export columns: {export_columns}".format(export_columns=export_columns))
+    export_plan = writers.ExportPlan(export_columns)
 
     name = table_info.get('name', table)
     logger_debug.debug("Name: {name}".format(name=name))
@@ -494,6 +1345,7 @@ def process_table_based(cfg, output_dir, site, location, datalogger, table, tabl
     convert_column_values = table_info.get('convert_data_column_values')
     logger_debug.debug("Convert column values: {convert_column_values}".format(
         convert_column_values=convert_column_values))
+    conversion_plan = conversions.ConversionPlan(convert_column_values)
 
     file_path = table_info.get('file_path')
     logger_debug.debug("File path: {file_path}".format(file_path=file_path))
@@ -501,6 +1353,9 @@ def process_table_based(cfg, output_dir, site, location, datalogger, table, tabl
     line_num = table_info.get('line_num', 0)
     logger_debug.debug("Line num: {line_num}".format(line_num=line_num))
 
+    checkpoint = table_info.get('checkpoint')
+    logger_debug.debug("Checkpoint: {checkpoint}".format(checkpoint=checkpoint))
+
     time_columns = table_info.get('time_columns')
     logger_debug.debug("Time columns: {time_columns}".format(time_columns=time_columns))
 
@@ -521,127 +1376,218 @@ def process_table_based(cfg, output_dir, site, location, datalogger, table, tabl
     include_time_zone = table_info.get('include_time_zone', False)
     logger_debug.debug("Include time zone: {include_time_zone}".format(include_time_zone=include_time_zone))
 
-    file_ext = os.path.splitext(os.path.abspath(file_path))[1]  # Get file extension
+    output_format = table_info.get('output_format', arrowwriters.CSV_FORMAT)
+    logger_debug.debug("Output format: {output_format}".format(output_format=output_format))
+    arrowwriters.check_output_format(output_format)
+
+    partition = table_info.get('partition')
+    logger_debug.debug("Partition: {partition}".format(partition=partition))
+    writers.check_partition(partition)
+
+    output_compression = table_info.get('compression')
+    logger_debug.debug("Compression: {compression}".format(compression=output_compression))
+    compression.check_compression(output_compression)
+
+    deduplicate = table_info.get('deduplicate', False)
+    logger_debug.debug("Deduplicate: {deduplicate}".format(deduplicate=deduplicate))
+
+    aggregations = aggregation.compile_aggregations(table_info.get('aggregations'))
+    logger_debug.debug("Aggregations: {aggregations}".format(aggregations=aggregations))
+
+    # Get file extension, e.g. '.dat' for compressed input files named *.dat.gz.
+    file_ext = os.path.splitext(compression.get_uncompressed_path(os.path.abspath(file_path)))[1]
     logger_debug.debug("File ext: {file_ext}".format(file_ext=file_ext))
 
     if column_names:
-        data = cr.read_table_data(
-            infile_path=file_path,
-            header=column_names,
-            first_line_num=line_num,
-            parse_time_columns=True,
-            time_zone=time_zone,
-            time_format_args_library=time_format_args_library,
-            time_parsed_column=time_parsed_column_name,
-            time_columns=time_columns,
-            to_utc=to_utc
-        )
+        header_row = None
     elif header_row:
         header_row = int(header_row)
-        data = cr.read_table_data(
-            infile_path=file_path,
-            header_row=header_row,
-            first_line_num=line_num,
-            parse_time_columns=True,
-            time_zone=time_zone,
-            time_format_args_library=time_format_args_library,
-            time_parsed_column=time_parsed_column_name,
-            time_columns=time_columns,
-            to_utc=to_utc
-        )
     else:
         raise NoHeadersException("Headers representation not found!")
 
-    num_of_new_rows = 0
-    num_of_new_rows += len(data)
+    file_identity = checkpoints.get_file_identity(file_path)
 
-    logger_info.info("Found {num} new rows".format(num=num_of_new_rows))
-    if num_of_new_rows == 0:
-        logger_info.info("No work to be done for table: {table}".format(table=name))
-        return cfg
+    header = None
+    if header_row is not None:
+        header = checkpoints.get_cached_header(checkpoint, header_row, file_identity, file_path)
+        if header is None:
+            header = checkpoints.read_header(file_path, header_row)
+    layout = readers.ColumnLayout(column_names or header['columns'])
+    logger_debug.debug("Columns: {columns}".format(columns=layout.columns))
 
-    if convert_column_values:
-        data = convert_data_column_values(
-            data=data,
-            values_to_convert=convert_column_values,
-            time_zone=time_zone,
-            time_format_args_library=time_format_args_library,
-            to_utc=to_utc
-        )
+    line_time = None
+    if checkpoint:
+        line_time = get_table_line_time(
+            layout, time_columns, time_zone, time_format_args_library)
 
-    data_to_export = make_export_data_set(
-        data=data, columns_to_export=export_columns)
+    byte_offset, line_num = checkpoints.resolve_start_position(
+        file_path, line_num, checkpoint, file_identity, header_row=header_row,
+        line_time=line_time)
+    _log_resync(checkpoint, file_identity, file_path, byte_offset)
+    logger_debug.debug("Byte offset: {byte_offset}".format(byte_offset=byte_offset))
+
+    chunk_size = table_info.get('chunk_size')
+    logger_debug.debug("Chunk size: {chunk_size}".format(chunk_size=chunk_size))
 
     file_name = name + file_ext
     outfile_path = os.path.join(
         os.path.abspath(output_dir), site, location, datalogger, file_name)
+    if output_format != arrowwriters.CSV_FORMAT:
+        outfile_path = arrowwriters.get_output_path(
+            os.path.dirname(outfile_path), name, output_format)
+
+    parallel_workers = int(table_info.get('parallel_workers') or 1)
+    logger_debug.debug("Parallel workers: {parallel_workers}".format(
+        parallel_workers=parallel_workers))
+
+    byte_ranges = []
+    if parallel_workers > 1:
+        byte_ranges = readers.split_byte_ranges(
+            file_path, byte_offset,
+            int(table_info.get('parallel_range_size') or readers.DEFAULT_RANGE_SIZE))
+        logger_debug.debug("Byte ranges: {num}".format(num=len(byte_ranges)))
+
+    prepared = len(byte_ranges) > 1
+    if prepared:
+        read_results = run_byte_ranges_in_pool(
+            _prepare_table_range, byte_ranges, parallel_workers, job_metrics,
+            file_path, layout.columns, table_info)
+    else:
+        read_results = readers.read_table_chunks(
+            infile_path=file_path,
+            chunk_size=int(chunk_size) if chunk_size else None,
+            byte_offset=byte_offset,
+            header=layout.columns
+        )
 
-    cr.export_to_csv(
-        data=data_to_export,
-        outfile_path=outfile_path,
-        export_header=True,
-        include_time_zone=include_time_zone
-    )
+    num_of_new_rows = 0
+    read_byte_offset = byte_offset
+
+    for read_result in job_metrics.iterate('read', read_results):
+        job_metrics.add('read', rows=read_result.num_lines,
+                        bytes=read_result.byte_offset - read_byte_offset)
+        read_byte_offset = read_result.byte_offset
+
+        data = read_result.data
+        if not prepared:
+            data = prepare_table_data(data, table_info, job_metrics, conversion_plan)
+
+        if deduplicate:
+            with job_metrics.stage('deduplicate') as stage:
+                stage.add(rows=len(data))
+                high_water_marks = dict(table_info.get('high_water_marks') or {})
+                data, high_water_marks[name] = dedup.drop_emitted_rows(
+                    data, time_parsed_column_name or time_columns[0], high_water_marks.get(name))
+                if high_water_marks[name] is not None:
+                    table_info['high_water_marks'] = high_water_marks
+
+        if aggregations:
+            aggregates = dict(table_info.get('aggregates') or {})
+            aggregate_and_export(
+                data=data,
+                name=name,
+                aggregations=aggregations,
+                aggregates=aggregates,
+                time_column=time_parsed_column_name or time_columns[0],
+                output_path=os.path.dirname(outfile_path),
+                file_ext=file_ext,
+                output_format=output_format,
+                output_compression=output_compression,
+                include_time_zone=include_time_zone,
+                job_metrics=job_metrics
+            )
+            if aggregates:
+                table_info['aggregates'] = aggregates
+
+        num_of_new_rows += len(data)
+        logger_info.info("Found {num} new rows".format(num=len(data)))
+
+        if data:
+            with job_metrics.stage('export') as stage:
+                partitions = writers.partition_data(
+                    data, time_parsed_column_name or time_columns[0], partition)
+                for partition_key, partition_data in partitions:
+                    partition_file_path = writers.get_partition_path(outfile_path, partition_key)
+                    if output_format == arrowwriters.CSV_FORMAT:
+                        writers.export_to_csv(
+                            data=partition_data,
+                            outfile_path=compression.get_compressed_path(
+                                partition_file_path, output_compression),
+                            export_header=True,
+                            include_time_zone=include_time_zone,
+                            export_plan=export_plan
+                        )
+                    else:
+                        arrowwriters.export_to_file(
+                            data=partition_data,
+                            outfile_path=partition_file_path,
+                            output_format=output_format,
+                            export_plan=export_plan
+                        )
+                stage.add(rows=len(data))
+
+        if track:
+            with job_metrics.stage('checkpoint'):
+                line_num = update_checkpoint(
+                    cfg['sites'][site]['locations'][location]['dataloggers'][datalogger]['tables'][table],
+                    line_num, read_result, file_identity, checkpoint_store,
+                    get_checkpoint_key((site, location, datalogger, table)), header=header)
 
-    if track:
-        if num_of_new_rows > 0:
-            new_line_num = line_num + num_of_new_rows
-            logger_info.info("Updated up to line number {num}".format(num=new_line_num))
-            cfg['sites'][site]['locations'][location]['dataloggers'][datalogger]['tables'][table]['line_num'] = new_line_num
+    if num_of_new_rows == 0:
+        logger_info.info("No work to be done for table: {table}".format(table=name))
+        return cfg
 
     logger_info.info("Done processing table {table}".format(table=table))
 
     return cfg
 
 
-def process_sites(cfg, args):
-    """Unpacks data from the configuration file, calls the core function and updates line
-        number information if tracking is enabled.
+def collect_jobs(cfg, args):
+    """Collects the dataloggers and tables to process, in configuration file order.
+
+    Mixed array dataloggers are processed as a whole, table based dataloggers are
+    processed one table at a time. Each job writes its own output files and can be run
+    independently of the others.
 
     Parameters
     ----------
     cfg : dict
         Program's configuration file.
     args : Namespace
-        Arguments passed by the user. Includes site, location and tracking information.
+        Arguments passed by the user. Includes site, location, datalogger and table
+        information.
 
-    """
-    try:
-        output_dir = cfg['settings']['data_output_dir']
-    except KeyError:
-        output_dir = os.path.expanduser("~")
-        msg = "No output directory set! "
-        msg += "Files will be output to the user's default directory at {output_dir}"
-        msg = msg.format(output_dir=output_dir)
-        logger_info.info(msg)
+    Returns
+    -------
+    list of tuple
+        Jobs as (site, location, datalogger, table) tuples. The table is None for mixed
+        array dataloggers.
 
-    logger_debug.debug("Output directory: {dir}".format(dir=output_dir))
-    logger_debug.debug("Getting configured sites.")
+    Raises
+    ------
+    TypeError: If an unsupported datalogger memory structure is configured.
 
+    """
     sites = cfg['sites']
 
     configured_sites_msg = ', '.join("{site}".format(site=site) for site in sites)
     logger_debug.debug("Configured sites: {sites}.".format(sites=configured_sites_msg))
 
-    if args.track:
-        logger_info.info("Tracking is enabled.")
-    else:
-        logger_info.info("Tracking is disabled.")
+    jobs = []
 
     if args.site:
-        # Process specific site
-        logger_info.info("Processing site: {site}".format(site=args.site))
-        site_info = sites[args.site]
-        logger_debug.debug("Getting configured locations.")
+        sites = {args.site: sites[args.site]}
+
+    for site, site_info in sites.items():
+        logger_debug.debug("Getting configured locations for site: {site}".format(site=site))
         locations = site_info['locations']
         configured_locations_msg = ', '.join("{location}".format(
             location=location) for location in locations)
         logger_debug.debug("Configured locations: {locations}.".format(
             locations=configured_locations_msg))
         if args.location:
-            # Process specific location
-            logger_info.info("Processing location: {location}".format(location=args.location))
-            location_info = locations[args.location]
+            locations = {args.location: locations[args.location]}
+        for location, location_info in locations.items():
             logger_debug.debug("Getting location configuration.")
             dataloggers = location_info['dataloggers']
             configured_dataloggers_msg = ', '.join("{datalogger}".format(
@@ -649,152 +1595,510 @@ def process_sites(cfg, args):
             logger_debug.debug("Configured dataloggers: {dataloggers}.".format(
                 dataloggers=configured_dataloggers_msg))
             if args.datalogger:
-                # Process specific datalogger
-                logger_info.info(
-                    "Processing datalogger: {datalogger}".format(datalogger=args.datalogger))
-                datalogger_info = dataloggers[args.datalogger]
+                dataloggers = {args.datalogger: dataloggers[args.datalogger]}
+            for datalogger, datalogger_info in dataloggers.items():
                 logger_debug.debug("Getting datalogger memory structure.")
                 memory_structure = datalogger_info['memory_structure']
                 if memory_structure == 'mixed array':
-                    cfg = process_mixed_array(
-                        cfg, output_dir, args.site, args.location, args.datalogger,
-                        datalogger_info, args.track)
+                    jobs.append((site, location, datalogger, None))
                 elif memory_structure == 'table based':
                     tables = datalogger_info['tables']
                     configured_tables_msg = ', '.join("{table}".format(
                         table=table) for table in tables)
                     logger_debug.debug("Configured tables: {tables}.".format(
                         tables=configured_tables_msg))
-                    if args.table:
-                        # Process specific table based file
-                        table_info = tables[args.table]
-                        cfg = process_table_based(
-                            cfg, output_dir, args.site, args.location, args.datalogger,
-                            args.table, table_info, args.track
-                        )
-                    else:
-                        # Process all table based files
-                        for table, table_info in tables.items():
-                            cfg = process_table_based(
-                                cfg, output_dir, args.site, args.location, args.datalogger,
-                                table, table_info, args.track
-                            )
+                    if args.datalogger and args.table:
+                        tables = {args.table: tables[args.table]}
+                    for table in tables:
+                        jobs.append((site, location, datalogger, table))
                 else:
                     raise TypeError("Unsupported datalogger memory structure type!")
-            else:
-                # Process all dataloggers
-                for datalogger, datalogger_info in dataloggers.items():
-                    logger_info.info(
-                        "Processing datalogger: {datalogger}".format(
-                            datalogger=datalogger))
-                    memory_structure = datalogger_info['memory_structure']
-                    if memory_structure == 'mixed array':
-                        cfg = process_mixed_array(
-                            cfg, output_dir, args.site, args.location, datalogger,
-                            datalogger_info, args.track)
-                    elif memory_structure == 'table based':
-                        tables = datalogger_info['tables']
-                        configured_tables_msg = ', '.join("{table}".format(
-                            table=table) for table in tables)
-                        logger_debug.debug("Configured tables: {tables}.".format(
-                            tables=configured_tables_msg))
-                        # Process all table based files
-                        for table, table_info in tables.items():
-                            cfg = process_table_based(
-                                cfg, output_dir, args.site, args.location, datalogger,
-                                table, table_info, args.track
-                            )
-                    else:
-                        raise TypeError("Unsupported datalogger memory structure type!")
 
-        else:
-            # Process all locations
-            for location, location_info in locations.items():
-                logger_info.info(
-                    "Processing location: {location}".format(location=location))
-                logger_debug.debug("Getting location configuration.")
-                dataloggers = location_info['dataloggers']
-                configured_dataloggers_msg = ', '.join("{datalogger}".format(
-                    datalogger=datalogger) for datalogger in dataloggers)
-                logger_debug.debug("Configured dataloggers: {dataloggers}.".format(
-                    dataloggers=configured_dataloggers_msg))
-                # Process all dataloggers
-                for datalogger, datalogger_info in dataloggers.items():
-                    logger_info.info(
-                        "Processing datalogger: {datalogger}".format(
-                            datalogger=datalogger))
-                    memory_structure = datalogger_info['memory_structure']
-                    if memory_structure == 'mixed array':
-                        cfg = process_mixed_array(
-                            cfg, output_dir, args.site, location, datalogger,
-                            datalogger_info, args.track)
-                    elif memory_structure == 'table based':
-                        tables = datalogger_info['tables']
-                        configured_tables_msg = ', '.join("{table}".format(
-                            table=table) for table in tables)
-                        logger_debug.debug("Configured tables: {tables}.".format(
-                            tables=configured_tables_msg))
-                        # Process all table based files
-                        for table, table_info in tables.items():
-                            cfg = process_table_based(
-                                cfg, output_dir, args.site, location, datalogger, table,
-                                table_info, args.track
-                            )
-                    else:
-                        raise TypeError(
-                            "Unsupported datalogger memory structure type!")
+    return jobs
+
+
+def get_job_cfg(cfg, job):
+    """Returns the configuration section (datalogger or table) a job reads and updates.
+
+    Parameters
+    ----------
+    cfg : dict
+        Program's configuration file.
+    job : tuple
+        Job as a (site, location, datalogger, table) tuple.
+
+    Returns
+    -------
+    dict
+        The job's datalogger section for mixed array dataloggers, otherwise the job's
+        table section.
+
+    """
+    site, location, datalogger, table = job
+    datalogger_info = cfg['sites'][site]['locations'][location]['dataloggers'][datalogger]
+
+    if table is None:
+        return datalogger_info
+
+    return datalogger_info['tables'][table]
+
+
+def run_job(cfg, output_dir, job, track=False, checkpoint_store=None,
+            run_metrics=metrics.NULL_METRICS):
+    """Processes a single datalogger (mixed array) or table (table based).
+
+    Parameters
+    ----------
+    cfg : dict
+        Program's configuration file.
+    output_dir : str
+        Output directory.
+    job : tuple
+        Job as a (site, location, datalogger, table) tuple.
+    track: If true, update configuration file with the last read line number and byte
+        offset checkpoint.
+    checkpoint_store : CheckpointStore, optional
+        Checkpoint store to commit checkpoints to, if tracking.
+    run_metrics : Metrics, optional
+        Records the job's time, rows and bytes per stage, labelled with the job.
+
+    Returns
+    -------
+        Updated configuration file.
+
+    """
+    site, location, datalogger, table = job
+    logger_info.info("Processing site: {site}, location: {location}, datalogger: {datalogger}".format(
+        site=site, location=location, datalogger=datalogger))
+
+    job_metrics = run_metrics.scope(
+        site=site, location=location, datalogger=datalogger, table=table)
 
-        logger_info.info("Done processing site: {site}".format(site=args.site))
+    with job_metrics.stage('total'):
+        if table is None:
+            datalogger_info = get_job_cfg(cfg, job)
+            return process_mixed_array(
+                cfg, output_dir, site, location, datalogger, datalogger_info, track,
+                checkpoint_store, job_metrics)
+
+        table_info = get_job_cfg(cfg, job)
+        return process_table_based(
+            cfg, output_dir, site, location, datalogger, table, table_info, track,
+            checkpoint_store, job_metrics)
+
+
+def _run_job_in_worker(job_cfg, output_dir, job, track, checkpoint_store_path,
+                       metrics_enabled=False):
+    """Process pool entry point. Runs a job on its own configuration section.
+
+    Parameters
+    ----------
+    job_cfg : dict
+        The job's configuration section, see get_job_cfg.
+    output_dir : str
+        Output directory.
+    job : tuple
+        Job as a (site, location, datalogger, table) tuple.
+    track: If true, update the job's configuration section with the last read line
+        number and byte offset checkpoint.
+    checkpoint_store_path : str or None
+        Checkpoint store to commit checkpoints to, if tracking.
+    metrics_enabled : bool, optional
+        Record the job's metrics.
+
+    Returns
+    -------
+    tuple
+        The job's updated configuration section and its metrics samples (see
+        Metrics.snapshot).
+
+    """
+    site, location, datalogger, table = job
+
+    if table is None:
+        datalogger_cfg = job_cfg
     else:
-        # Process all sites
-        for site, site_info in sites.items():
-            logger_info.info("Processing site: {site}".format(site=site))
-            locations = site_info['locations']
-            configured_locations_msg = ', '.join("{location}".format(
-                location=location) for location in locations)
-            logger_debug.debug("Configured locations: {locations}.".format(
-                locations=configured_locations_msg))
-            # Process all locations
-            for location, location_info in locations.items():
-                logger_info.info(
-                    "Processing location: {location}".format(location=location))
-                logger_debug.debug("Getting location configuration.")
-                dataloggers = location_info['dataloggers']
-                configured_dataloggers_msg = ', '.join("{datalogger}".format(
-                    datalogger=datalogger) for datalogger in dataloggers)
-                logger_debug.debug("Configured dataloggers: {dataloggers}.".format(
-                    dataloggers=configured_dataloggers_msg))
-                # Process all dataloggers
-                for datalogger, datalogger_info in dataloggers.items():
-                    logger_info.info(
-                        "Processing datalogger: {datalogger}".format(
-                            datalogger=datalogger))
-                    memory_structure = datalogger_info['memory_structure']
-                    if memory_structure == 'mixed array':
-                        cfg = process_mixed_array(
-                            cfg, output_dir, site, location, datalogger,
-                            datalogger_info, args.track)
-                    elif memory_structure == 'table based':
-                        tables = datalogger_info['tables']
-                        configured_tables_msg = ', '.join("{table}".format(
-                            table=table) for table in tables)
-                        logger_debug.debug("Configured tables: {tables}.".format(
-                            tables=configured_tables_msg))
-                        # Process all table based files
-                        for table, table_info in tables.items():
-                            cfg = process_table_based(
-                                cfg, output_dir, site, location, datalogger, table,
-                                table_info, args.track
-                            )
-                    else:
-                        raise TypeError(
-                            "Unsupported datalogger memory structure type!")
+        datalogger_cfg = {'tables': {table: job_cfg}}
+
+    cfg = {'sites': {site: {'locations': {location: {'dataloggers': {
+        datalogger: datalogger_cfg}}}}}}
+
+    run_metrics = metrics.Metrics(PROGRAM_NAME) if metrics_enabled else metrics.NULL_METRICS
+
+    if checkpoint_store_path is None:
+        cfg = run_job(cfg, output_dir, job, track, run_metrics=run_metrics)
+    else:
+        with checkpoints.CheckpointStore(checkpoint_store_path) as checkpoint_store:
+            cfg = run_job(cfg, output_dir, job, track, checkpoint_store, run_metrics)
+
+    return get_job_cfg(cfg, job), run_metrics.snapshot()
+
+
+def _init_worker(logging_conf):
+    """Process pool initializer. Configures logging like the parent process. """
+    if logging_conf is not None:
+        utils.setup_logging(logging_conf)
+
+
+def make_worker_pool(workers):
+    """Returns a pool of worker processes for run_jobs_in_pool.
 
-            logger_info.info("Done processing site: {site}".format(site=args.site))
+    Parameters
+    ----------
+    workers : int
+        Number of worker processes.
+
+    Returns
+    -------
+    ProcessPoolExecutor
+        Worker pool, with logging configured like the parent process.
+
+    """
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(utils.get_logging_config(), ))
+
+
+def run_jobs_in_pool(cfg, output_dir, jobs, workers, track=False, checkpoint_store_path=None,
+                     run_metrics=metrics.NULL_METRICS, skipped_errors=SKIPPED_JOB_ERRORS,
+                     executor=None):
+    """Processes jobs in a pool of worker processes.
+
+    Each worker gets a copy of its job's configuration section. The updated sections are
+    merged back into the configuration file in job order, so the result does not depend
+    on which job finishes first. Failed jobs are handled as in run_jobs.
+
+    Parameters
+    ----------
+    cfg : dict
+        Program's configuration file.
+    output_dir : str
+        Output directory.
+    jobs : list of tuple
+        Jobs as (site, location, datalogger, table) tuples.
+    workers : int
+        Number of worker processes.
+    track: If true, update configuration file with the last read line number and byte
+        offset checkpoint.
+    checkpoint_store_path : str, optional
+        Checkpoint store the workers commit checkpoints to, if tracking.
+    run_metrics : Metrics, optional
+        Collects the metrics recorded by the workers.
+    skipped_errors : tuple of type, optional
+        Errors that skip a job, see run_jobs.
+    executor : ProcessPoolExecutor, optional
+        Worker pool to use, see make_worker_pool. Its workers (and their time parser
+        caches) are kept after the jobs are done. If not given, a pool is created for
+        the jobs only.
+
+    Returns
+    -------
+        Updated configuration file.
+
+    """
+    if executor is None:
+        with make_worker_pool(workers) as executor:
+            return run_jobs_in_pool(cfg, output_dir, jobs, workers, track,
+                                    checkpoint_store_path, run_metrics, skipped_errors, executor)
+
+    futures = [
+        executor.submit(_run_job_in_worker, get_job_cfg(cfg, job), output_dir, job, track,
+                        checkpoint_store_path, run_metrics.enabled)
+        for job in jobs
+    ]
+    for job, future in zip(jobs, futures):
+        try:
+            job_cfg, samples = future.result()
+        except skipped_errors:
+            logger_info.exception("Skipped failed job: {job}".format(job=job))
+            if track and checkpoint_store_path is not None:
+                with checkpoints.CheckpointStore(checkpoint_store_path) as checkpoint_store:
+                    restore_checkpoint(
+                        cfg, job, get_checkpoint_state(get_job_cfg(cfg, job)), checkpoint_store)
+            continue
+        run_metrics.merge(samples)
+        if track:
+            get_job_cfg(cfg, job).update(job_cfg)
+
+    return cfg
+
+
+def get_output_dir(cfg):
+    """Returns the configured output directory, or the user's home directory if not set.
+
+    Parameters
+    ----------
+    cfg : dict
+        Program's configuration file.
+
+    Returns
+    -------
+    str
+        Output directory.
+
+    """
+    try:
+        output_dir = cfg['settings']['data_output_dir']
+    except KeyError:
+        output_dir = os.path.expanduser("~")
+        msg = "No output directory set! "
+        msg += "Files will be output to the user's default directory at {output_dir}"
+        msg = msg.format(output_dir=output_dir)
+        logger_info.info(msg)
+
+    logger_debug.debug("Output directory: {dir}".format(dir=output_dir))
+
+    return output_dir
+
+
+def open_checkpoint_store(cfg, track=False):
+    """Opens the checkpoint store, see checkpoints.CheckpointStore.
+
+    The store's path is read from the 'checkpoint_store_path' setting and defaults to
+    CHECKPOINT_STORE_PATH.
+
+    Parameters
+    ----------
+    cfg : dict
+        Program's configuration file.
+    track : bool, optional
+        If true, the store is created if it does not exist.
+
+    Returns
+    -------
+    CheckpointStore or None
+        The checkpoint store, or None if not tracking and no store exists.
+
+    """
+    checkpoint_store_path = cfg.get('settings', {}).get(
+        'checkpoint_store_path', CHECKPOINT_STORE_PATH)
+    logger_debug.debug("Checkpoint store: {checkpoint_store_path}".format(
+        checkpoint_store_path=checkpoint_store_path))
+
+    if not track and not os.path.exists(checkpoint_store_path):
+        return None
+
+    return checkpoints.CheckpointStore(checkpoint_store_path)
+
+
+def get_metrics_file(cfg, args):
+    """Returns the metrics file to write, or None if metrics are disabled.
+
+    The file is given by the --metrics-file argument or the 'metrics_file' setting. See
+    metrics.write_metrics for the supported formats.
+
+    Parameters
+    ----------
+    cfg : dict
+        Program's configuration file.
+    args : Namespace
+        Arguments passed by the user.
+
+    Returns
+    -------
+    str or None
+        Metrics file path.
+
+    """
+    metrics_file = getattr(args, 'metrics_file', None) or cfg.get('settings', {}).get(
+        'metrics_file')
+    logger_debug.debug("Metrics file: {metrics_file}".format(metrics_file=metrics_file))
+
+    return metrics_file
+
+
+def run_jobs(cfg, output_dir, jobs, workers=1, track=False, checkpoint_store=None,
+             run_metrics=metrics.NULL_METRICS, skipped_errors=SKIPPED_JOB_ERRORS,
+             executor=None):
+    """Processes jobs, in a pool of worker processes if more than one worker is given.
+
+    A job failing with one of the skipped errors (by default an output file whose header
+    does not match, see writers.HeaderMismatchError) is logged and skipped, and is reset
+    to its last committed checkpoint (see restore_checkpoint). The other jobs are still
+    processed. Any other error stops the run.
+
+    Parameters
+    ----------
+    cfg : dict
+        Program's configuration file.
+    output_dir : str
+        Output directory.
+    jobs : list of tuple
+        Jobs as (site, location, datalogger, table) tuples.
+    workers : int, optional
+        Number of worker processes.
+    track: If true, update configuration file with the last read line number and byte
+        offset checkpoint.
+    checkpoint_store : CheckpointStore, optional
+        Checkpoint store to commit checkpoints to, if tracking.
+    run_metrics : Metrics, optional
+        Records each job's time, rows and bytes per stage.
+    skipped_errors : tuple of type, optional
+        Errors that skip a job, instead of stopping the run.
+    executor : ProcessPoolExecutor, optional
+        Worker pool to use if more than one worker is given, see run_jobs_in_pool.
+
+    Returns
+    -------
+        Updated configuration file.
+
+    """
+    if workers > 1 and (len(jobs) > 1 or executor is not None):
+        logger_info.info("Processing jobs using {workers} workers".format(workers=workers))
+        checkpoint_store_path = checkpoint_store.db_path if checkpoint_store else None
+        return run_jobs_in_pool(cfg, output_dir, jobs, workers, track, checkpoint_store_path,
+                                run_metrics, skipped_errors, executor)
+
+    for job in jobs:
+        state = get_checkpoint_state(get_job_cfg(cfg, job))
+        try:
+            cfg = run_job(cfg, output_dir, job, track, checkpoint_store, run_metrics)
+        except skipped_errors:
+            logger_info.exception("Skipped failed job: {job}".format(job=job))
+            restore_checkpoint(cfg, job, state, checkpoint_store)
+
+    return cfg
+
+
+def process_sites(cfg, args):
+    """Unpacks data from the configuration file, calls the core function and updates line
+        number information if tracking is enabled.
+
+    Line numbers and byte offset checkpoints are kept in the checkpoint store, where
+    each datalogger or table commits its progress as soon as its output is written.
+    Stored checkpoints take precedence over the configuration file's line numbers.
+
+    If a metrics file is configured (see get_metrics_file), the time, rows and bytes
+    per job and stage are written to it when done.
+
+    Parameters
+    ----------
+    cfg : dict
+        Program's configuration file.
+    args : Namespace
+        Arguments passed by the user. Includes site, location, tracking and worker
+        information.
+
+    """
+    output_dir = get_output_dir(cfg)
+    logger_debug.debug("Getting configured sites.")
 
     if args.track:
-        logger_info.info("Updating config file.")
-        utils.save_config(APP_CONFIG_PATH, cfg)
+        logger_info.info("Tracking is enabled.")
+    else:
+        logger_info.info("Tracking is disabled.")
+
+    jobs = collect_jobs(cfg, args)
+    logger_info.info("Number of jobs: {num}".format(num=len(jobs)))
+
+    workers = getattr(args, 'workers', 1) or 1
+
+    metrics_file = get_metrics_file(cfg, args)
+    run_metrics = metrics.Metrics(PROGRAM_NAME) if metrics_file else metrics.NULL_METRICS
+
+    checkpoint_store = open_checkpoint_store(cfg, args.track)
+
+    try:
+        if checkpoint_store is None:
+            run_jobs(cfg, output_dir, jobs, workers, run_metrics=run_metrics)
+            return
+
+        with checkpoint_store:
+            cfg = load_checkpoints(cfg, jobs, checkpoint_store)
+            run_jobs(cfg, output_dir, jobs, workers, args.track,
+                     checkpoint_store if args.track else None, run_metrics)
+    finally:
+        if metrics_file:
+            metrics.write_metrics(run_metrics, metrics_file)
+
+
+def watch_sites(cfg, args, max_polls=None):
+    """Keeps processing the configured files as they change (watch mode).
+
+    The configuration and time parser state is kept in memory between passes. With more
+    than one worker, one worker pool is kept for the whole session, so each worker keeps
+    its own time parser state. Each pass processes only the jobs whose source file
+    changed since the previous pass (the first pass processes all jobs). Line numbers
+    and checkpoints are always updated in memory, and committed to the checkpoint store
+    if tracking is enabled. Metrics, if enabled, add up over the passes and are written
+    after each pass.
+
+    A job that fails (e.g. on a row whose time can not be parsed) is logged and reset to
+    its last committed checkpoint (see run_jobs), and retried the next time its source
+    file changes. The other jobs keep running.
+
+    Parquet and Arrow outputs get a new part file per pass, and need to be compacted
+    from time to time (see arrowwriters).
+
+    Parameters
+    ----------
+    cfg : dict
+        Program's configuration file.
+    args : Namespace
+        Arguments passed by the user. Includes site, location, tracking, worker and poll
+        interval information.
+    max_polls : int, optional
+        Stop after this number of polls. If not given, run until interrupted.
+
+    Returns
+    -------
+        Updated configuration file.
+
+    """
+    output_dir = get_output_dir(cfg)
+
+    jobs = collect_jobs(cfg, args)
+    logger_info.info("Watching {num} jobs".format(num=len(jobs)))
+
+    workers = getattr(args, 'workers', 1) or 1
+    poll_interval = getattr(args, 'poll_interval', DEFAULT_POLL_INTERVAL)
+    logger_debug.debug("Poll interval: {poll_interval}".format(poll_interval=poll_interval))
+
+    job_file_paths = {job: get_job_cfg(cfg, job).get('file_path') for job in jobs}
+
+    metrics_file = get_metrics_file(cfg, args)
+    run_metrics = metrics.Metrics(PROGRAM_NAME) if metrics_file else metrics.NULL_METRICS
+
+    checkpoint_store = open_checkpoint_store(cfg, args.track)
+    if checkpoint_store is not None:
+        cfg = load_checkpoints(cfg, jobs, checkpoint_store)
+        if not args.track:
+            checkpoint_store.close()
+            checkpoint_store = None
+
+    executor = make_worker_pool(workers) if workers > 1 else None
+    num_polls = 0
+
+    try:
+        with watching.FileWatcher(job_file_paths.values()) as watcher:
+            while max_polls is None or num_polls < max_polls:
+                changed_file_paths = set(watcher.poll())
+                changed_jobs = [
+                    job for job in jobs if job_file_paths[job] in changed_file_paths]
+
+                if changed_jobs:
+                    logger_info.info("Processing {num} changed jobs".format(
+                        num=len(changed_jobs)))
+                    try:
+                        cfg = run_jobs(
+                            cfg, output_dir, changed_jobs, workers, True, checkpoint_store,
+                            run_metrics, (Exception, ), executor)
+                    except BrokenProcessPool:
+                        logger_info.exception("Worker pool broken, starting a new one")
+                        executor.shutdown()
+                        executor = make_worker_pool(workers)
+                    if metrics_file:
+                        metrics.write_metrics(run_metrics, metrics_file)
+
+                num_polls += 1
+                if max_polls is None or num_polls < max_polls:
+                    watcher.wait(poll_interval)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if checkpoint_store is not None:
+            checkpoint_store.close()
+
+    return cfg
 
 
 def main():
@@ -818,9 +2122,39 @@ def main():
         action='store_true',
         default=False
     )
+    parser.add_argument(
+        '-w', '--workers',
+        help='Number of worker processes. Dataloggers and tables are processed in parallel.',
+        dest='workers',
+        type=int,
+        default=1
+    )
+
+    parser.add_argument(
+        '--watch',
+        help='Keep running and process files as new rows are written.',
+        dest='watch',
+        action='store_true',
+        default=False
+    )
+    parser.add_argument(
+        '--poll-interval',
+        help='Seconds between checks for changed files in watch mode.',
+        dest='poll_interval',
+        type=float,
+        default=DEFAULT_POLL_INTERVAL
+    )
+    parser.add_argument(
+        '--metrics-file',
+        help='Write per-stage metrics to this file (Prometheus textfile if it ends with '
+             '.prom, JSON otherwise).',
+        dest='metrics_file'
+    )
 
     args = parser.parse_args()
 
+    utils.setup_logging(utils.load_config(LOGGING_CONFIG_PATH))
+
     logger_debug.debug("Arguments passed by user")
     args_msg = ', '.join("{arg}: {value}".format(
         arg=arg, value=value) for (arg, value) in vars(args).items())
@@ -831,6 +2165,10 @@ def main():
     if args.table:
         if not args.location or not args.site:
             parser.error("--site and --location is required.")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1.")
+    if args.poll_interval <= 0:
+        parser.error("--poll-interval must be positive.")
 
     app_cfg = utils.load_config(APP_CONFIG_PATH)
 
@@ -842,6 +2180,14 @@ def main():
     logger_info.info("System is active")
     logger_info.info("Initializing")
 
+    if args.watch:
+        logger_info.info("Watching for new rows")
+        try:
+            watch_sites(app_cfg, args)
+        except KeyboardInterrupt:
+            logger_info.info("Stopped watching.")
+        return
+
     start = time.time()
     process_sites(app_cfg, args)
     stop = time.time()
@@ -0,0 +1,301 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+
+"""Per-stage timing and throughput metrics.
+
+A Metrics recorder collects elapsed time, calls, rows and bytes per stage (read,
+parse_time, export, upload, ...) and per set of labels (site, location, datalogger,
+table or file). The results are written as a Prometheus textfile (for the node exporter
+textfile collector) or as JSON.
+
+Metrics are disabled by default: NULL_METRICS has the same interface but records
+nothing, so instrumented code costs a method call per stage and chunk.
+
+Example
+-------
+>>> metrics = Metrics('loggerfilesformatter')
+>>> job_metrics = metrics.scope(site='lake', location='buoy', datalogger='cr10x')
+>>> with job_metrics.stage('export') as stage:
+...     stage.add(rows=10)
+
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from collections import OrderedDict
+
+METRIC_PREFIX = 'erkenlab'
+SAMPLE_FIELDS = ('calls', 'seconds', 'rows', 'bytes')
+
+
+class _Stage(object):
+    """Times one stage call. Rows and bytes handled by the call are added with add. """
+    __slots__ = ('_sample', '_start')
+
+    def __init__(self, sample):
+        self._sample = sample
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._sample['seconds'] += time.perf_counter() - self._start
+        self._sample['calls'] += 1
+
+    def add(self, rows=0, bytes=0):
+        self._sample['rows'] += rows
+        self._sample['bytes'] += bytes
+
+
+class _NullStage(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def add(self, rows=0, bytes=0):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class ScopedMetrics(object):
+    """Records stages for one set of labels, see Metrics.scope. """
+    def __init__(self, metrics, labels):
+        self._metrics = metrics
+        self.labels = labels
+
+    def stage(self, name):
+        """Returns a context manager timing one call of a stage.
+
+        Parameters
+        ----------
+        name : str
+            Stage name.
+
+        """
+        return _Stage(self._metrics._sample(self.labels, name))
+
+    def add(self, name, rows=0, bytes=0, seconds=0.0, calls=0):
+        """Adds rows, bytes or time to a stage without timing a call. """
+        sample = self._metrics._sample(self.labels, name)
+        sample['calls'] += calls
+        sample['rows'] += rows
+        sample['bytes'] += bytes
+        sample['seconds'] += seconds
+
+    def iterate(self, name, iterable):
+        """Iterates over an iterable, timing each step as a call of a stage.
+
+        Useful for readers that yield chunks, where reading happens inside next().
+
+        """
+        iterator = iter(iterable)
+        sample = self._metrics._sample(self.labels, name)
+        while True:
+            start = time.perf_counter()
+            try:
+                value = next(iterator)
+            except StopIteration:
+                sample['seconds'] += time.perf_counter() - start
+                return
+            sample['seconds'] += time.perf_counter() - start
+            sample['calls'] += 1
+            yield value
+
+
+class _NullScopedMetrics(object):
+    labels = {}
+
+    def stage(self, name):
+        return _NULL_STAGE
+
+    def add(self, name, rows=0, bytes=0, seconds=0.0, calls=0):
+        pass
+
+    def iterate(self, name, iterable):
+        return iterable
+
+
+NULL_SCOPE = _NullScopedMetrics()
+
+
+class Metrics(object):
+    """Collects per-stage metrics for a program run.
+
+    Parameters
+    ----------
+    program : str
+        Program name, added as a label to every sample.
+
+    """
+    enabled = True
+
+    def __init__(self, program):
+        self.program = program
+        self.started = time.time()
+        self._samples = OrderedDict()
+
+    def _sample(self, labels, name):
+        key = (tuple(labels.items()), name)
+        sample = self._samples.get(key)
+        if sample is None:
+            sample = self._samples[key] = dict.fromkeys(SAMPLE_FIELDS, 0)
+            sample['seconds'] = 0.0
+        return sample
+
+    def scope(self, **labels):
+        """Returns a recorder for the given labels. Labels set to None are left out. """
+        return ScopedMetrics(self, OrderedDict(
+            (name, str(value)) for name, value in labels.items() if value is not None))
+
+    def snapshot(self):
+        """Returns the samples recorded so far.
+
+        Returns
+        -------
+        list of dict
+            One dict per labels and stage, holding the labels, 'stage' and the
+            SAMPLE_FIELDS values. Can be passed between processes and to merge.
+
+        """
+        samples = []
+        for (labels, name), sample in self._samples.items():
+            record = OrderedDict(labels)
+            record['stage'] = name
+            record.update(sample)
+            samples.append(record)
+
+        return samples
+
+    def merge(self, samples):
+        """Adds samples recorded elsewhere, e.g. in a worker process. """
+        for record in samples:
+            labels = OrderedDict(
+                (name, value) for name, value in record.items()
+                if name != 'stage' and name not in SAMPLE_FIELDS)
+            sample = self._sample(labels, record['stage'])
+            for field in SAMPLE_FIELDS:
+                sample[field] += record[field]
+
+
+class NullMetrics(object):
+    """Disabled metrics. Same interface as Metrics, records nothing. """
+    enabled = False
+    program = None
+
+    def scope(self, **labels):
+        return NULL_SCOPE
+
+    def snapshot(self):
+        return []
+
+    def merge(self, samples):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+def _escape_label_value(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_prometheus(metrics):
+    """Formats metrics in the Prometheus text exposition format.
+
+    Each sample field becomes a gauge named erkenlab_stage_<field>, labelled with the
+    program, the scope's labels and the stage.
+
+    Parameters
+    ----------
+    metrics : Metrics
+        Recorded metrics.
+
+    Returns
+    -------
+    str
+        Metrics text.
+
+    """
+    helps = {
+        'calls': 'Number of calls of a pipeline stage in the last run.',
+        'seconds': 'Time spent in a pipeline stage in the last run.',
+        'rows': 'Rows handled by a pipeline stage in the last run.',
+        'bytes': 'Bytes handled by a pipeline stage in the last run.',
+    }
+    samples = metrics.snapshot()
+    lines = []
+
+    for field in SAMPLE_FIELDS:
+        metric_name = '{prefix}_stage_{field}'.format(prefix=METRIC_PREFIX, field=field)
+        lines.append('# HELP {name} {help}'.format(name=metric_name, help=helps[field]))
+        lines.append('# TYPE {name} gauge'.format(name=metric_name))
+        for record in samples:
+            labels = [('program', metrics.program)] + [
+                (name, value) for name, value in record.items() if name not in SAMPLE_FIELDS]
+            lines.append('{name}{{{labels}}} {value}'.format(
+                name=metric_name,
+                labels=','.join('{name}="{value}"'.format(
+                    name=name, value=_escape_label_value(value)) for name, value in labels),
+                value=repr(record[field])))
+
+    metric_name = '{prefix}_last_run_timestamp_seconds'.format(prefix=METRIC_PREFIX)
+    lines.append('# HELP {name} Start time of the last run.'.format(name=metric_name))
+    lines.append('# TYPE {name} gauge'.format(name=metric_name))
+    lines.append('{name}{{program="{program}"}} {value}'.format(
+        name=metric_name, program=_escape_label_value(metrics.program), value=metrics.started))
+
+    return '\n'.join(lines) + '\n'
+
+
+def format_json(metrics):
+    """Formats metrics as a JSON document. """
+    return json.dumps({
+        'program': metrics.program,
+        'started': metrics.started,
+        'samples': metrics.snapshot(),
+    }, indent=2)
+
+
+def write_metrics(metrics, outfile_path):
+    """Writes metrics to a file, replacing it atomically.
+
+    Files ending with '.prom' are written in the Prometheus text format (see
+    format_prometheus), any other file as JSON.
+
+    Parameters
+    ----------
+    metrics : Metrics
+        Recorded metrics. Nothing is written for disabled metrics.
+    outfile_path : str
+        Output file's absolute path.
+
+    """
+    if not metrics.enabled:
+        return
+
+    if outfile_path.endswith('.prom'):
+        content = format_prometheus(metrics)
+    else:
+        content = format_json(metrics)
+
+    outfile_dir = os.path.dirname(os.path.abspath(outfile_path))
+    os.makedirs(outfile_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=outfile_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, outfile_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
@@ -0,0 +1,469 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+
+"""Readers for datalogger files that resume at a byte offset instead of a line number.
+
+gzip and zstd compressed files are decompressed while read, see services.compression.
+
+"""
+
+import csv
+
+from collections import defaultdict, namedtuple
+
+from campbellsciparser import cr
+
+from services import compression
+
+ReadResult = namedtuple(
+    'ReadResult', ['data', 'byte_offset', 'num_lines', 'last_line'], defaults=(None, ))
+
+FLOAT_REPLACEMENTS = {'.': '0.', '-.': '-0.'}
+
+DEFAULT_ARRAY_CHUNK_SIZE = 10000
+DEFAULT_RANGE_SIZE = 32 * 1024 * 1024
+
+
+class _LineIterator(object):
+    """Iterates over complete lines in a binary file, keeping track of the byte offset.
+
+    A trailing line without a line break is still being written by the datalogger (or
+    the collecting software) and is left for the next read, as is the rest of a
+    compressed file that ends in the middle of a gzip member.
+
+    Parameters
+    ----------
+    f : file object
+        File opened in binary mode.
+    byte_offset : int
+        Byte offset the file is positioned at.
+    end_offset : int, optional
+        Byte offset to stop at. Must be a line start.
+
+    Attributes
+    ----------
+    byte_offset : int
+        Byte offset of the first line not yet returned.
+    num_lines : int
+        Number of lines returned.
+    last_line : str or None
+        Last line returned, including the line break.
+
+    """
+    def __init__(self, f, byte_offset, end_offset=None):
+        self._lines = compression.iter_lines(f)
+        self.byte_offset = byte_offset
+        self.end_offset = end_offset
+        self.num_lines = 0
+        self.last_line = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.end_offset is not None and self.byte_offset >= self.end_offset:
+            raise StopIteration
+        raw_line = next(self._lines)
+        self.byte_offset += len(raw_line)
+        self.num_lines += 1
+        self.last_line = raw_line.decode()
+
+        return self.last_line
+
+
+def find_line_offset(infile_path, line_num):
+    """Returns the byte offset of a given line number.
+
+    Parameters
+    ----------
+    infile_path : str
+        Input file's absolute path.
+    line_num : int
+        Line number to find. NOTE: Zero-based numbering.
+
+    Returns
+    -------
+    int
+        Byte offset of the line, or of the end of the last complete line if the file
+        has fewer lines.
+
+    """
+    byte_offset = 0
+    with compression.open_input(infile_path) as f:
+        for i, raw_line in enumerate(compression.iter_lines(f)):
+            if i >= line_num:
+                break
+            byte_offset += len(raw_line)
+
+    return byte_offset
+
+
+def split_byte_ranges(infile_path, byte_offset=0, range_size=DEFAULT_RANGE_SIZE):
+    """Splits a file into line aligned byte ranges, e.g. to be read in parallel.
+
+    Parameters
+    ----------
+    infile_path : str
+        Input file's absolute path.
+    byte_offset : int, optional
+        Byte offset of the first line to include.
+    range_size : int, optional
+        Approximate size of each range, in bytes.
+
+    Returns
+    -------
+    list of tuple
+        (start, end) byte offsets of each range. Every range starts at a line start and
+        ends after a line break. The last range ends after the last complete line.
+        Compressed files can not be split and are returned as a single range, ending
+        at None (the end of the file).
+
+    """
+    if compression.detect_compression(infile_path) is not None:
+        return [(byte_offset, None)]
+
+    ranges = []
+
+    with open(infile_path, 'rb') as f:
+        f.seek(0, 2)
+        file_size = f.tell()
+        start = byte_offset
+
+        while start < file_size:
+            f.seek(min(start + range_size, file_size) - 1)
+            f.readline()  # Move to the end of the line.
+            end = f.tell()
+            if end > file_size or (end == file_size and not _ends_with_line_break(f, end)):
+                end = _last_line_end(f, start, file_size)
+            if end <= start:
+                break
+            ranges.append((start, end))
+            start = end
+
+    return ranges
+
+
+def _ends_with_line_break(f, byte_offset):
+    f.seek(byte_offset - 1)
+    return f.read(1) == b'\n'
+
+
+def _last_line_end(f, start, end):
+    """Returns the byte offset following the last line break between start and end. """
+    while end > start:
+        block_start = max(start, end - 4096)
+        f.seek(block_start)
+        block = f.read(end - block_start)
+        line_break = block.rfind(b'\n')
+        if line_break >= 0:
+            return block_start + line_break + 1
+        end = block_start
+
+    return start
+
+
+def fix_float_values(values):
+    """Corrects leading zeros for floating point values, in place.
+
+    Many older CR-type dataloggers strips leading zeros, i.e. outputs '.5' instead of
+    '0.5' and '-.5' instead of '-0.5'.
+
+    Parameters
+    ----------
+    values : list of str
+        Row values to correct.
+
+    Returns
+    -------
+    list of str
+        The corrected values.
+
+    """
+    for i, value in enumerate(values):
+        for source, replacement in FLOAT_REPLACEMENTS.items():
+            if value.startswith(source):
+                values[i] = value.replace(source, replacement)
+
+    return values
+
+
+class ColumnLayout(object):
+    """Column names of table based data and their positions, built once per file.
+
+    Parameters
+    ----------
+    columns : list of str
+        Column names, in file order.
+
+    Example
+    -------
+    >>> layout = ColumnLayout(['TIMESTAMP', 'RECORD', 'Value'])
+    >>> layout.indices(['Value', 'TIMESTAMP', 'Missing'])
+    [0, 2]
+    >>> layout.make_row(['2016-05-02 12:34:15', '1', '0.5'])['Value']
+    '0.5'
+
+    """
+    def __init__(self, columns):
+        self.columns = tuple(columns)
+        self.positions = {name: i for i, name in enumerate(self.columns)}
+
+    def __len__(self):
+        return len(self.columns)
+
+    def indices(self, names):
+        """Returns the positions of the given columns found, in file order. """
+        return sorted(self.positions[name] for name in set(names or []) if name in self.positions)
+
+    def make_row(self, values):
+        """Maps a line's values to the column names. """
+        return cr.Row(zip(self.columns, values))
+
+
+def read_header(infile_path, header_row):
+    """Reads a file's header row and the byte offset following it.
+
+    Parameters
+    ----------
+    infile_path : str
+        Input file's absolute path.
+    header_row : int
+        Header row number. NOTE: Zero-based numbering.
+
+    Returns
+    -------
+    tuple
+        Column names found at the header row (an empty list if the file has fewer
+        rows) and the byte offset of the line following the header row.
+
+    """
+    for i, (values, byte_offset, _, _) in enumerate(read_rows(infile_path)):
+        if i == header_row:
+            return values, byte_offset
+
+    return [], None
+
+
+def read_header_row(infile_path, header_row):
+    """Reads a file's header row.
+
+    Parameters
+    ----------
+    infile_path : str
+        Input file's absolute path.
+    header_row : int
+        Header row number. NOTE: Zero-based numbering.
+
+    Returns
+    -------
+    list of str
+        Column names found at the header row.
+
+    """
+    return read_header(infile_path, header_row)[0]
+
+
+def read_rows(infile_path, byte_offset=0, end_offset=None):
+    """Iterate over the rows of a CSV file, starting at a given byte offset.
+
+    Parameters
+    ----------
+    infile_path : str
+        Input file's absolute path.
+    byte_offset : int, optional
+        Byte offset of the first line to read.
+    end_offset : int, optional
+        Byte offset to stop reading at, see split_byte_ranges.
+
+    Yields
+    ------
+    tuple
+        The next row's values, the byte offset following the row, the number of lines
+        read so far (including empty lines) and the row's last line.
+
+    """
+    with compression.open_input(infile_path, byte_offset) as f:
+        lines = _LineIterator(f, byte_offset, end_offset)
+        for values in csv.reader(lines):
+            yield values, lines.byte_offset, lines.num_lines, lines.last_line
+
+
+def read_table_chunks(infile_path, chunk_size=None, byte_offset=0, header=None,
+                      header_row=None, end_offset=None):
+    """Iterate over table data read from a file in chunks, starting at a given byte offset.
+
+    Parameters
+    ----------
+    infile_path : str
+        Input file's absolute path.
+    chunk_size : int, optional
+        Maximum number of rows per chunk. If not given, all data is read as one chunk.
+    byte_offset : int, optional
+        Byte offset of the first line to read.
+    header : list of str, optional
+        Column names to map to each rows' values.
+    header_row : int, optional
+        Input file's header row to map to each rows' values.
+    end_offset : int, optional
+        Byte offset to stop reading at, see split_byte_ranges.
+
+    Yields
+    ------
+    ReadResult
+        The next chunk of data, the byte offset following the chunk's last line, the
+        number of lines read for the chunk and its last line (without line break).
+
+    """
+    if not header and isinstance(header_row, int) and header_row >= 0:
+        header = read_header_row(infile_path, header_row)
+
+    layout = ColumnLayout(header) if header else None
+    data = cr.DataSet()
+    num_lines = 0
+    chunk_first_line = 0
+    last_line = None
+
+    for values, byte_offset, num_lines, last_line in read_rows(
+            infile_path, byte_offset, end_offset):
+        if not values:
+            continue
+        if layout is not None:
+            data.append(layout.make_row(values))
+        else:
+            data.append(cr.Row(enumerate(values)))
+        if chunk_size and len(data) >= chunk_size:
+            yield ReadResult(data, byte_offset, num_lines - chunk_first_line,
+                             last_line.rstrip('\r\n'))
+            data = cr.DataSet()
+            chunk_first_line = num_lines
+
+    if data or num_lines > chunk_first_line:
+        yield ReadResult(data, byte_offset, num_lines - chunk_first_line,
+                         last_line.rstrip('\r\n'))
+
+
+def read_table_data(infile_path, byte_offset=0, header=None, header_row=None, end_offset=None):
+    """Reads table data from a file, starting at a given byte offset.
+
+    Parameters
+    ----------
+    infile_path : str
+        Input file's absolute path.
+    byte_offset : int, optional
+        Byte offset of the first line to read.
+    header : list of str, optional
+        Column names to map to each rows' values.
+    header_row : int, optional
+        Input file's header row to map to each rows' values.
+    end_offset : int, optional
+        Byte offset to stop reading at, see split_byte_ranges.
+
+    Returns
+    -------
+    ReadResult
+        All data found from the given byte offset onwards, the byte offset following
+        the last complete line, the number of lines read and the last line (None if no
+        lines were read).
+
+    """
+    for read_result in read_table_chunks(
+            infile_path, byte_offset=byte_offset, header=header, header_row=header_row,
+            end_offset=end_offset):
+        return read_result
+
+    return ReadResult(cr.DataSet(), byte_offset, 0)
+
+
+def read_array_ids_chunks(infile_path, chunk_size=None, byte_offset=0, fix_floats=True,
+                          array_id_names=None, end_offset=None):
+    """Iterate over mixed array data read from a file in one pass, split by array id.
+
+    Each row is added to its array's chunk as the file is read. As soon as a chunk is
+    full, the chunks of all array ids are yielded, so at most chunk_size rows per array
+    id are held in memory and every line before the yielded byte offset has been
+    yielded (a checkpoint can be committed after each result).
+
+    Parameters
+    ----------
+    infile_path : str
+        Input file's absolute path.
+    chunk_size : int, optional
+        Maximum number of rows per array id chunk. If not given, all data is read as
+        one chunk per array id.
+    byte_offset : int, optional
+        Byte offset of the first line to read.
+    fix_floats : bool
+        Correct leading zeros for floating points values since many older CR-type
+        dataloggers strips leading zeros.
+    array_id_names : dict
+        Lookup table for array id name translation. If given, array ids not found in
+        the lookup table are skipped.
+    end_offset : int, optional
+        Byte offset to stop reading at, see split_byte_ranges.
+
+    Yields
+    ------
+    ReadResult
+        The chunks of all array ids (keyed by array name, at least one of them full),
+        the byte offset following the last line read so far, the number of lines read
+        so far and the last line read (without line break). The last result holds the
+        remaining chunks (possibly none) and is always yielded.
+
+    """
+    if not array_id_names:
+        array_id_names = {}
+
+    data = defaultdict(cr.DataSet)
+    num_lines = 0
+    last_line = None
+
+    for values, byte_offset, num_lines, last_line in read_rows(
+            infile_path, byte_offset, end_offset):
+        if not values:
+            continue
+        array_id = values[0]
+        if array_id_names and array_id not in array_id_names:
+            continue
+        if fix_floats:
+            fix_float_values(values)
+        array_name = array_id_names.get(array_id) or array_id
+        array_data = data[array_name]
+        array_data.append(cr.Row([(i, value) for i, value in enumerate(values)]))
+        if chunk_size and len(array_data) >= chunk_size:
+            yield ReadResult(data, byte_offset, num_lines, last_line.rstrip('\r\n'))
+            data = defaultdict(cr.DataSet)
+
+    yield ReadResult(data, byte_offset, num_lines, last_line and last_line.rstrip('\r\n'))
+
+
+def read_array_ids_data(infile_path, byte_offset=0, fix_floats=True, array_id_names=None,
+                        end_offset=None):
+    """Reads mixed array data from a file, starting at a given byte offset.
+
+    Parameters
+    ----------
+    infile_path : str
+        Input file's absolute path.
+    byte_offset : int, optional
+        Byte offset of the first line to read.
+    fix_floats : bool
+        Correct leading zeros for floating points values since many older CR-type
+        dataloggers strips leading zeros.
+    array_id_names : dict
+        Lookup table for array id name translation. If given, array ids not found in
+        the lookup table are skipped.
+    end_offset : int, optional
+        Byte offset to stop reading at, see split_byte_ranges.
+
+    Returns
+    -------
+    ReadResult
+        All data found from the given byte offset onwards filtered by array id, the
+        byte offset following the last complete line, the number of lines read and
+        the last line (None if no lines were read).
+
+    """
+    for read_result in read_array_ids_chunks(
+            infile_path, byte_offset=byte_offset, fix_floats=fix_floats,
+            array_id_names=array_id_names, end_offset=end_offset):
+        return read_result
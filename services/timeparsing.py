@@ -0,0 +1,684 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+
+"""Cached and vectorized parsing of Campbell CR-type datalogger time columns.
+
+Gives exactly the same results as cr.parse_time. The CR10X year/day/hour-minute
+columns and the table based '%Y-%m-%d %H:%M:%S' timestamps are parsed with integer
+arithmetic, caching the (year, day) dates and hour-minute values. Times are localized
+with a UTC offset table precomputed from the time zone's transitions (see timezones
+module), covering the whole years of each batch. Any other time format, and any value
+the fast paths can not handle, is parsed by cr.parse_time (once per unique combination
+of time values).
+
+"""
+
+import contextlib
+import functools
+import io
+import re
+
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+import pytz
+
+from campbellsciparser import cr
+
+from services import timezones
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CR10X_TIME_FORMATS = ('%Y', '%j', '%H%M')
+TABLE_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+MAX_CACHE_SIZE = 100000
+
+TABLE_DATE_PATTERN = re.compile(r'(\d{4})-(\d{2})-(\d{2})\Z', re.ASCII)
+TABLE_CLOCK_PATTERN = re.compile(r'(\d{2}):(\d{2}):(\d{2})\Z', re.ASCII)
+
+ParsedTimes = namedtuple('ParsedTimes', ['wall', 'utc_offsets', 'tzinfo_codes', 'tzinfos'])
+ParsedTimes.__doc__ = """Vectorized parsed time values.
+
+wall : ndarray of datetime64[us]
+    Wall clock time (naive) of each value.
+utc_offsets : ndarray of int
+    UTC offset of each value, in seconds.
+tzinfo_codes : ndarray of int
+    Index of each value's tzinfo in tzinfos.
+tzinfos : list of tzinfo
+    Unique tzinfo objects.
+"""
+
+
+def _is_digits(value, min_length, max_length):
+    return min_length <= len(value) <= max_length and value.isascii() and value.isdigit()
+
+
+def _is_ascii(column):
+    try:
+        column.astype(bytes)
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def format_utc_offset(seconds):
+    """Returns a UTC offset as formatted by strftime's %z directive.
+
+    Parameters
+    ----------
+    seconds : int
+        UTC offset in seconds.
+
+    Returns
+    -------
+    str
+        Formatted UTC offset, e.g. '+0100'.
+
+    """
+    sign = '-' if seconds < 0 else '+'
+    hours, remainder = divmod(abs(int(seconds)), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    offset = '{sign}{hours:02d}{minutes:02d}'.format(sign=sign, hours=hours, minutes=minutes)
+    if seconds:
+        offset += '{seconds:02d}'.format(seconds=seconds)
+
+    return offset
+
+
+class TimeParser(object):
+    """Parses time values for one time zone, time format library and UTC setting.
+
+    Parameters
+    ----------
+    time_zone : str
+        String representation of a valid pytz time zone. (See pytz docs
+        for a list of valid time zones). The time zone refers to collected data's
+        time zone, which defaults to UTC and is used for localization and time conversion.
+    time_format_args_library : list of str
+        List of the maximum expected string format columns sequence to match against
+        when parsing time values.
+    to_utc : bool, optional
+        Convert time to UTC.
+
+    Raises
+    ------
+    UnknownPytzTimeZoneError: If the provided time zone is not a valid pytz time zone.
+
+    """
+    def __init__(self, time_zone, time_format_args_library, to_utc=False):
+        try:
+            self.pytz_time_zone = pytz.timezone(time_zone)
+        except pytz.UnknownTimeZoneError:
+            msg = "{time_zone} is not a valid pytz time zone! "
+            msg += "See pytz docs for valid time zones".format(time_zone=time_zone)
+            raise cr.UnknownPytzTimeZoneError(msg)
+
+        self.time_zone = time_zone
+        self.time_format_args_library = list(time_format_args_library or [])
+        self.to_utc = to_utc
+        self._dates = {}
+        self._hour_minutes = {}
+        self._table_dates = {}
+        self._table_clocks = {}
+        self._offset_table = None
+        self._parsed_values = {}
+
+    def _formats(self, num_values):
+        # Time values without a matching format are ignored, see cr._parse_custom_time_formats.
+        return tuple(self.time_format_args_library[:num_values])
+
+    def _parse_year_day(self, year, day):
+        key = (year, day)
+        try:
+            return self._dates[key]
+        except KeyError:
+            pass
+
+        parsed_date = None
+        if _is_digits(year, 4, 4) and _is_digits(day, 1, 3) and 1 <= int(day) <= 366:
+            try:
+                parsed_date = date(int(year), 1, 1) + timedelta(days=int(day) - 1)
+            except (ValueError, OverflowError):
+                parsed_date = None
+
+        if len(self._dates) >= MAX_CACHE_SIZE:
+            self._dates.clear()
+        self._dates[key] = parsed_date
+
+        return parsed_date
+
+    def _parse_hour_minute(self, hour_minute):
+        try:
+            return self._hour_minutes[hour_minute]
+        except KeyError:
+            pass
+
+        parsed_hour_minute = None
+        if _is_digits(hour_minute, 1, 4):
+            hour, minute = divmod(int(hour_minute), 100)
+            if hour <= 23 and minute <= 59:
+                parsed_hour_minute = (hour, minute)
+
+        if len(self._hour_minutes) >= MAX_CACHE_SIZE:
+            self._hour_minutes.clear()
+        self._hour_minutes[hour_minute] = parsed_hour_minute
+
+        return parsed_hour_minute
+
+    def _parse_table_date(self, value):
+        try:
+            return self._table_dates[value]
+        except KeyError:
+            pass
+
+        parsed_date = None
+        match = TABLE_DATE_PATTERN.match(value)
+        if match:
+            try:
+                parsed_date = date(*(int(part) for part in match.groups()))
+            except ValueError:
+                parsed_date = None
+
+        if len(self._table_dates) >= MAX_CACHE_SIZE:
+            self._table_dates.clear()
+        self._table_dates[value] = parsed_date
+
+        return parsed_date
+
+    def _parse_table_clock(self, value):
+        try:
+            return self._table_clocks[value]
+        except KeyError:
+            pass
+
+        parsed_clock = None
+        match = TABLE_CLOCK_PATTERN.match(value)
+        if match:
+            hour, minute, second = (int(part) for part in match.groups())
+            if hour <= 23 and minute <= 59 and second <= 59:
+                parsed_clock = (hour, minute, second)
+
+        if len(self._table_clocks) >= MAX_CACHE_SIZE:
+            self._table_clocks.clear()
+        self._table_clocks[value] = parsed_clock
+
+        return parsed_clock
+
+    def _parse_table_timestamp(self, value):
+        """Parses a zero padded '%Y-%m-%d %H:%M:%S' timestamp, or returns None. """
+        if len(value) != 19 or value[10] != ' ':
+            return None
+
+        parsed_date = self._parse_table_date(value[:10])
+        parsed_clock = self._parse_table_clock(value[11:])
+        if parsed_date is None or parsed_clock is None:
+            return None
+
+        return datetime(parsed_date.year, parsed_date.month, parsed_date.day, *parsed_clock)
+
+    def _parse_naive(self, time_values):
+        """Parses time values into a naive datetime, or returns None if not supported. """
+        formats = self._formats(len(time_values))
+
+        if len(formats) >= 2 and formats == CR10X_TIME_FORMATS[:len(formats)]:
+            parsed_date = self._parse_year_day(time_values[0], time_values[1])
+            if parsed_date is None:
+                return None
+            if len(formats) == 2:
+                return datetime(parsed_date.year, parsed_date.month, parsed_date.day)
+            hour_minute = self._parse_hour_minute(time_values[2])
+            if hour_minute is None:
+                return None
+            return datetime(
+                parsed_date.year, parsed_date.month, parsed_date.day, *hour_minute)
+
+        if formats == (TABLE_TIME_FORMAT, ):
+            return self._parse_table_timestamp(time_values[0])
+
+        return None
+
+    def offset_table(self, start, end):
+        """Returns a UTC offset table covering the wall clock times from start to end.
+
+        The table covers the whole years of the span and is reused as long as it covers
+        later spans.
+
+        Parameters
+        ----------
+        start : datetime
+            First wall clock time to cover.
+        end : datetime
+            Last wall clock time to cover.
+
+        Returns
+        -------
+        OffsetTable
+            UTC offset table of the collected data's time zone.
+
+        """
+        if self._offset_table is None or not self._offset_table.covers(start, end):
+            table_end = datetime.max
+            if end.year < datetime.max.year:
+                table_end = datetime(end.year + 1, 1, 1)
+            self._offset_table = timezones.OffsetTable(
+                self.pytz_time_zone, datetime(start.year, 1, 1), table_end)
+
+        return self._offset_table
+
+    def localize(self, naive_dt):
+        """Localizes a naive datetime (and converts it to UTC if enabled).
+
+        Parameters
+        ----------
+        naive_dt : datetime
+            Wall clock time in the collected data's time zone.
+
+        Returns
+        -------
+        datetime
+            Localized datetime.
+
+        """
+        local_dt = self.offset_table(naive_dt, naive_dt).localize(naive_dt)
+
+        if self.to_utc:
+            return (naive_dt - local_dt.utcoffset()).replace(tzinfo=pytz.utc)
+
+        return local_dt
+
+    def _parse_with_cr(self, time_values):
+        """Parses time values using cr.parse_time, caching the result. """
+        try:
+            return self._parsed_values[time_values]
+        except KeyError:
+            pass
+
+        time_columns = list(range(len(time_values)))
+        data = cr.DataSet([cr.Row([(i, value) for i, value in enumerate(time_values)])])
+        parsed_dt = cr.parse_time(
+            data=data,
+            time_zone=self.time_zone,
+            time_format_args_library=self.time_format_args_library,
+            time_columns=time_columns,
+            to_utc=self.to_utc)[0][0]
+
+        if len(self._parsed_values) >= MAX_CACHE_SIZE:
+            self._parsed_values.clear()
+        self._parsed_values[time_values] = parsed_dt
+
+        return parsed_dt
+
+    def parse(self, time_values):
+        """Parses one row's time values into a datetime.
+
+        Parameters
+        ----------
+        time_values : tuple of str
+            Time strings to parse.
+
+        Returns
+        -------
+        datetime
+            Parsed time.
+
+        Raises
+        ------
+        TimeParsingError: If the time values could not be parsed.
+        TimeColumnValueError: If an 'Hour/Minute' value could not be parsed.
+
+        """
+        time_values = tuple(time_values)
+        naive_dt = self._parse_naive(time_values)
+
+        if naive_dt is None:
+            return self._parse_with_cr(time_values)
+
+        return self.localize(naive_dt)
+
+    def try_parse(self, time_values):
+        """Parses one row's time values into a datetime, or returns None.
+
+        Used to tell time values from other values, e.g. a table based file's units
+        rows. Unlike parse, nothing is printed for values cr.parse_time can not parse.
+
+        Parameters
+        ----------
+        time_values : tuple of str
+            Time strings to parse.
+
+        Returns
+        -------
+        datetime or None
+            Parsed time, or None if the time values could not be parsed.
+
+        """
+        time_values = tuple(time_values)
+        naive_dt = self._parse_naive(time_values)
+
+        if naive_dt is not None:
+            return self.localize(naive_dt)
+
+        try:
+            # cr.parse_time prints its parsing errors.
+            with contextlib.redirect_stdout(io.StringIO()):
+                return self._parse_with_cr(time_values)
+        except (ValueError, cr.TimeColumnValueError, cr.TimeParsingError):
+            return None
+
+    def _parse_columns_naive(self, columns):
+        """Vectorized _parse_naive. Returns None if any value is not supported. """
+        formats = self._formats(len(columns))
+        columns = [np.asarray(column, dtype=str) for column in columns[:len(formats)]]
+
+        if len(formats) >= 2 and formats == CR10X_TIME_FORMATS[:len(formats)]:
+            years, days = columns[0], columns[1]
+            valid = (
+                (np.char.str_len(years) == 4) & np.char.isdigit(years) &
+                (np.char.str_len(days) <= 3) & np.char.isdigit(days))
+            if len(formats) == 3:
+                hour_minutes = columns[2]
+                valid &= (np.char.str_len(hour_minutes) <= 4) & np.char.isdigit(hour_minutes)
+            if not valid.all() or not all(_is_ascii(column) for column in columns):
+                return None
+
+            year_values = years.astype(int)
+            day_values = days.astype(int)
+            if ((year_values < 1) | (year_values > 9998) | (day_values < 1) |
+                    (day_values > 366)).any():
+                return None
+
+            wall = ((year_values - 1970).astype('datetime64[Y]').astype('datetime64[D]') +
+                    (day_values - 1).astype('timedelta64[D]')).astype('datetime64[us]')
+
+            if len(formats) == 3:
+                hours, minutes = np.divmod(hour_minutes.astype(int), 100)
+                if (hours > 23).any() or (minutes > 59).any():
+                    return None
+                wall += (hours * 60 + minutes).astype('timedelta64[m]')
+
+            return wall
+
+        if formats == (TABLE_TIME_FORMAT, ):
+            timestamps = columns[0]
+            if not (np.char.str_len(timestamps) == 19).all():
+                return None
+            if not _is_ascii(timestamps):
+                return None
+            chars = timestamps.astype('S19').view('S1').reshape(-1, 19)
+            separators = {4: b'-', 7: b'-', 10: b' ', 13: b':', 16: b':'}
+            for position in range(19):
+                if position in separators:
+                    valid = chars[:, position] == separators[position]
+                else:
+                    valid = np.char.isdigit(chars[:, position])
+                if not valid.all():
+                    return None
+            try:
+                wall = timestamps.astype('datetime64[s]')
+            except ValueError:
+                return None
+            # NumPy accepts some values strptime does not (e.g. leap seconds).
+            if (np.datetime_as_string(wall, unit='s') != np.char.replace(
+                    timestamps, ' ', 'T')).any():
+                return None
+
+            return wall.astype('datetime64[us]')
+
+        return None
+
+    def _localize_columns(self, wall):
+        """Vectorized localize. Returns ParsedTimes. """
+        tzinfos = []
+        tzinfo_codes = np.zeros(0, dtype=int)
+        utc_offsets = np.zeros(0, dtype=np.int64)
+
+        if len(wall):
+            table = self.offset_table(wall.min().item(), wall.max().item())
+            table_codes, tzinfo_codes = np.unique(table.tzinfo_codes(wall), return_inverse=True)
+            tzinfo_codes = tzinfo_codes.reshape(-1)
+            tzinfos = [table.tzinfos[code] for code in table_codes.tolist()]
+            utc_offsets = np.array(table.utc_offsets, dtype=np.int64)[table_codes][tzinfo_codes]
+
+        if self.to_utc:
+            wall = wall - utc_offsets.astype('timedelta64[s]')
+            return ParsedTimes(
+                wall, np.zeros(len(wall), dtype=np.int64),
+                np.zeros(len(wall), dtype=int), [pytz.utc])
+
+        return ParsedTimes(wall, utc_offsets, tzinfo_codes, tzinfos)
+
+    def parse_columns(self, columns):
+        """Parses time columns into vectorized parsed time values.
+
+        Parameters
+        ----------
+        columns : list of ndarray
+            Time columns, in row order.
+
+        Returns
+        -------
+        ParsedTimes
+            Parsed time values.
+
+        Raises
+        ------
+        TimeParsingError: If the time values could not be parsed.
+        TimeColumnValueError: If an 'Hour/Minute' value could not be parsed.
+
+        """
+        wall = self._parse_columns_naive(columns)
+        if wall is not None:
+            return self._localize_columns(wall)
+
+        # Fall back on parsing each unique combination of time values.
+        keys = np.asarray(columns[0], dtype=str)
+        for column in columns[1:]:
+            keys = np.char.add(np.char.add(keys, ','), np.asarray(column, dtype=str))
+        _, first_indices, codes = np.unique(keys, return_index=True, return_inverse=True)
+
+        unique_values = [
+            self.parse(tuple(str(column[i]) for column in columns)) for i in first_indices]
+
+        return from_datetimes(unique_values, codes.reshape(-1))
+
+
+def from_datetimes(unique_values, codes):
+    """Creates vectorized parsed time values from unique datetimes.
+
+    Parameters
+    ----------
+    unique_values : list of datetime
+        Unique, time zone aware datetimes.
+    codes : ndarray of int
+        Each value's index into unique_values.
+
+    Returns
+    -------
+    ParsedTimes
+        Parsed time values.
+
+    """
+    tzinfos = []
+    tzinfo_indices = {}
+    unique_tzinfo_codes = []
+    for value in unique_values:
+        if id(value.tzinfo) not in tzinfo_indices:
+            tzinfo_indices[id(value.tzinfo)] = len(tzinfos)
+            tzinfos.append(value.tzinfo)
+        unique_tzinfo_codes.append(tzinfo_indices[id(value.tzinfo)])
+
+    unique_wall = np.array(
+        [value.replace(tzinfo=None) for value in unique_values], dtype='datetime64[us]')
+    unique_offsets = np.array(
+        [int(value.utcoffset().total_seconds()) for value in unique_values], dtype=np.int64)
+
+    return ParsedTimes(
+        unique_wall[codes], unique_offsets[codes],
+        np.array(unique_tzinfo_codes, dtype=int)[codes], tzinfos)
+
+
+def to_datetimes(parsed_times):
+    """Returns vectorized parsed time values as a list of time zone aware datetimes.
+
+    Parameters
+    ----------
+    parsed_times : ParsedTimes
+        Parsed time values.
+
+    Returns
+    -------
+    list of datetime
+        Parsed time values.
+
+    """
+    tzinfos = parsed_times.tzinfos
+
+    return [
+        naive_dt.replace(tzinfo=tzinfos[code]) for naive_dt, code in zip(
+            parsed_times.wall.astype(datetime).tolist(), parsed_times.tzinfo_codes.tolist())
+    ]
+
+
+def format_times(parsed_times, include_time_zone=False):
+    """Formats vectorized parsed time values as writers.value_to_string does.
+
+    Parameters
+    ----------
+    parsed_times : ParsedTimes
+        Parsed time values.
+    include_time_zone : bool, optional
+        Include the UTC offset.
+
+    Returns
+    -------
+    ndarray of str
+        Formatted time values.
+
+    """
+    wall = parsed_times.wall
+    if len(wall) and wall.min() < np.datetime64('1000-01-01'):
+        from services import writers
+        return np.array([writers.value_to_string(value, include_time_zone)
+                         for value in to_datetimes(parsed_times)], dtype=str)
+
+    formatted = np.char.replace(np.datetime_as_string(wall, unit='s'), 'T', ' ')
+    if not include_time_zone:
+        return formatted
+
+    unique_offsets, offset_codes = np.unique(parsed_times.utc_offsets, return_inverse=True)
+    offset_strings = np.array(
+        [format_utc_offset(offset) for offset in unique_offsets.tolist()], dtype=str)
+
+    return np.char.add(formatted, offset_strings[offset_codes.reshape(-1)])
+
+
+@functools.lru_cache(maxsize=64)
+def _get_time_parser(time_zone, time_format_args_library, to_utc):
+    return TimeParser(time_zone, list(time_format_args_library), to_utc)
+
+
+def get_time_parser(time_zone, time_format_args_library, to_utc=False):
+    """Returns a (shared) time parser, keeping its caches between calls.
+
+    Parameters
+    ----------
+    time_zone : str
+        String representation of a valid pytz time zone.
+    time_format_args_library : list of str
+        List of the maximum expected string format columns sequence to match against
+        when parsing time values.
+    to_utc : bool, optional
+        Convert time to UTC.
+
+    Returns
+    -------
+    TimeParser
+        Time parser.
+
+    """
+    return _get_time_parser(
+        time_zone, tuple(time_format_args_library or []), bool(to_utc))
+
+
+def parse_time(data, time_zone, time_format_args_library, time_columns,
+               time_parsed_column=None, replace_time_column=None, to_utc=False):
+    """
+    Parses specific time columns from a data set into a datetime object. Drop-in
+    replacement for cr.parse_time.
+
+    Parameters
+    ----------
+    data : DataSet
+        Data set to convert.
+    time_zone : str
+        String representation of a valid pytz time zone. (See pytz docs
+        for a list of valid time zones). The time zone refers to collected data's
+        time zone, which defaults to UTC and is used for localization and time conversion.
+    time_format_args_library : list of str
+        List of the maximum expected string
+        format columns sequence to match against when parsing time values.
+    time_columns : list of str or int
+        Column(s) (names or indices) to use for time conversion.
+    time_parsed_column : str, optional
+        Converted time column name. If not given, use the name of the first
+        time column.
+    replace_time_column : str or int, optional
+        Column (name or index) to place the parsed datetime object at. If not given,
+        insert at the first time column index.
+    to_utc : bool, optional
+        Convert time to UTC.
+
+    Returns
+    -------
+    DataSet
+        Time converted data set.
+
+    Raises
+    ------
+    TimeColumnValueError: If not at least one time column is given or if the specified
+        time column to replace is not found.
+    UnknownPytzTimeZoneError: If the provided time zone is not a valid pytz time zone.
+
+    """
+    parser = get_time_parser(time_zone, time_format_args_library, to_utc)
+
+    if not time_columns:
+        raise cr.TimeColumnValueError("At least one time column is required!")
+
+    data_converted = cr.DataSet([])
+
+    for row in data:
+        if not replace_time_column:
+            if time_columns[0] not in row:
+                msg = "First time column '{first_time_column}' not found in column names!"
+                msg = msg.format(first_time_column=time_columns[0])
+                raise cr.TimeColumnValueError(msg)
+            old_name = time_columns[0]
+        else:
+            if replace_time_column not in row:
+                msg = "{0} not found in column names!".format(replace_time_column)
+                raise cr.TimeColumnValueError(msg)
+            old_name = replace_time_column
+
+        row_time_converted = parser.parse(
+            [value for name, value in row.items() if name in time_columns])
+
+        new_name = old_name
+        if time_parsed_column:
+            new_name = time_parsed_column
+
+        row_converted = cr.Row(
+            (new_name if name == old_name else name, value) for name, value in row.items())
+        row_converted[new_name] = row_time_converted
+
+        for time_column in time_columns:
+            if time_column in row_converted and time_column != new_name:
+                del row_converted[time_column]
+
+        data_converted.append(row_converted)
+
+    return data_converted
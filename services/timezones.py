@@ -0,0 +1,164 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+
+"""Precomputed UTC offset tables for localizing wall clock times.
+
+An OffsetTable holds a pytz time zone's UTC offset transitions over a time span as
+sorted wall clock boundaries, so localizing a time is a binary search (or a single
+np.searchsorted for a whole column) followed by integer offset arithmetic, instead of
+a pytz localize call per value.
+
+Wall clock times that are ambiguous (when the clock is set back) or non-existent (when
+the clock is set forward) are localized as pytz localize does by default (is_dst=False),
+i.e. as cr.parse_time does:
+
+- Ambiguous times get the standard time offset, usually the one after the change.
+- Non-existent times get the offset in effect before the change, i.e. they are taken
+  to be read from a clock that has not been set forward yet.
+
+"""
+
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Margin around a span for transitions that shift wall clock times into it.
+TRANSITION_MARGIN = timedelta(days=2)
+
+
+def _utc_offset(tzinfo):
+    # pytz tzinfo objects only give their own offset for datetimes they are attached to.
+    return datetime(2000, 1, 1, tzinfo=tzinfo).utcoffset()
+
+
+def _shift(value, delta):
+    try:
+        return value + delta
+    except OverflowError:
+        return datetime.max if delta > timedelta(0) else datetime.min
+
+
+class OffsetTable(object):
+    """A time zone's UTC offsets by wall clock time, over a time span.
+
+    Parameters
+    ----------
+    pytz_time_zone : tzinfo
+        pytz time zone.
+    start : datetime
+        First (naive) wall clock time to cover.
+    end : datetime
+        Last (naive) wall clock time to cover.
+
+    Attributes
+    ----------
+    boundaries : list of datetime
+        Wall clock times at which the tzinfo changes, in order.
+    tzinfos : list of tzinfo
+        Unique tzinfo objects, as returned by pytz localize.
+    utc_offsets : list of int
+        UTC offset of each tzinfo, in seconds.
+
+    Example
+    -------
+    >>> import pytz
+    >>> table = OffsetTable(
+    ...     pytz.timezone('Europe/Stockholm'), datetime(2016, 1, 1), datetime(2016, 12, 31))
+    >>> table.localize(datetime(2016, 3, 27, 2, 30))  # Non-existent
+    datetime.datetime(2016, 3, 27, 2, 30, tzinfo=<DstTzInfo 'Europe/Stockholm' CET+1:00:00 STD>)
+
+    """
+    def __init__(self, pytz_time_zone, start, end):
+        self.pytz_time_zone = pytz_time_zone
+        self.start = start
+        self.end = end
+        self.boundaries = []
+        self.tzinfos = []
+        self.utc_offsets = []
+        self._segment_codes = []
+        self._boundaries_array = None
+        self._codes_array = None
+
+        transition_times = getattr(pytz_time_zone, '_utc_transition_times', None)
+        if not transition_times:  # Fixed offset (StaticTzInfo or UTC).
+            self._add_segment(pytz_time_zone)
+            return
+
+        transition_info = pytz_time_zone._transition_info
+        zone_tzinfos = pytz_time_zone._tzinfos
+
+        first = max(bisect_right(transition_times, _shift(start, -TRANSITION_MARGIN)) - 1, 0)
+        last = bisect_right(transition_times, _shift(end, TRANSITION_MARGIN))
+
+        self._add_segment(zone_tzinfos[transition_info[first]])
+        for i in range(first + 1, last):
+            before = zone_tzinfos[transition_info[i - 1]]
+            after = zone_tzinfos[transition_info[i]]
+            old_wall = transition_times[i] + _utc_offset(before)
+            new_wall = transition_times[i] + _utc_offset(after)
+
+            if old_wall != new_wall:
+                # Ambiguous or non-existent wall clock times, localized by pytz once.
+                changed_wall = min(old_wall, new_wall)
+                self._add_segment(
+                    pytz_time_zone.localize(changed_wall).tzinfo, changed_wall)
+            self._add_segment(after, max(old_wall, new_wall))
+
+    def _add_segment(self, tzinfo, boundary=None):
+        if boundary is not None:
+            if self.boundaries and boundary < self.boundaries[-1]:
+                boundary = self.boundaries[-1]  # Overlapping changes, the later wins.
+            self.boundaries.append(boundary)
+
+        if tzinfo not in self.tzinfos:
+            self.tzinfos.append(tzinfo)
+            self.utc_offsets.append(int(_utc_offset(tzinfo).total_seconds()))
+        self._segment_codes.append(self.tzinfos.index(tzinfo))
+
+    def covers(self, start, end):
+        """Returns True if the table covers the wall clock times from start to end. """
+        return self.start <= start and end <= self.end
+
+    def tzinfo(self, naive_dt):
+        """Returns the tzinfo of a wall clock time.
+
+        Parameters
+        ----------
+        naive_dt : datetime
+            Wall clock time within the table's span.
+
+        Returns
+        -------
+        tzinfo
+            The tzinfo pytz localizes the time to.
+
+        """
+        return self.tzinfos[self._segment_codes[bisect_right(self.boundaries, naive_dt)]]
+
+    def localize(self, naive_dt):
+        """Localizes a wall clock time, see pytz localize. """
+        return naive_dt.replace(tzinfo=self.tzinfo(naive_dt))
+
+    def tzinfo_codes(self, wall):
+        """Returns the index of each wall clock time's tzinfo in tzinfos.
+
+        Parameters
+        ----------
+        wall : ndarray of datetime64[us]
+            Wall clock times within the table's span.
+
+        Returns
+        -------
+        ndarray of int
+            tzinfo indices.
+
+        """
+        if self._boundaries_array is None:
+            self._boundaries_array = np.array(self.boundaries, dtype='datetime64[us]')
+            self._codes_array = np.array(self._segment_codes, dtype=int)
+
+        return self._codes_array[np.searchsorted(self._boundaries_array, wall, side='right')]
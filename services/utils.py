@@ -3,10 +3,21 @@
 
 """Misc tools for common datalogger file operations. """
 
+import hashlib
+import logging.config
 import os
+import pickle
+import tempfile
 
 import yaml
 
+CONFIG_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+    'erkenlab-data-framework')
+
+
+_logging_conf = None
+
 
 class ConfigFileKeyError(KeyError):
     pass
@@ -16,20 +27,77 @@ class InvalidRatingValueError(ValueError):
     pass
 
 
-def load_config(cfg_file):
+def _yaml_loader():
+    """Returns the libyaml based (C) safe loader if available, otherwise the pure Python one. """
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def _config_cache_path(cfg_file, cache_dir):
+    key = hashlib.sha1(os.path.abspath(cfg_file).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, key + '.pickle')
+
+
+def _read_config_cache(cache_path, cfg_file, st):
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+
+    if (not isinstance(cached, dict) or cached.get('path') != os.path.abspath(cfg_file) or
+            cached.get('size') != st.st_size or cached.get('mtime_ns') != st.st_mtime_ns):
+        return None
+
+    return cached
+
+
+def _write_config_cache(cache_path, cfg_file, st, cfg_dict):
+    cached = {
+        'path': os.path.abspath(cfg_file),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'config': cfg_dict,
+    }
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # The cache is an optimization only.
+
+
+def load_config(cfg_file, cache_dir=CONFIG_CACHE_DIR):
     """Loads the YAML configuration file into a dictionary.
 
+    The libyaml C loader is used when available. The parsed configuration is cached
+    (pickled) in the cache directory, keyed by the file's path, size and modification
+    time, so an unchanged configuration file is not parsed again.
+
     Args
     ----
         cfg_file (str): Configuration file's absolute path.
+        cache_dir (str): Cache directory. If None, the cache is not used.
 
     Returns
     -------
         Configuration file stored in a dictionary.
 
     """
+    st = os.stat(cfg_file)
+
+    if cache_dir is not None:
+        cache_path = _config_cache_path(cfg_file, cache_dir)
+        cached = _read_config_cache(cache_path, cfg_file, st)
+        if cached is not None:
+            return cached['config']
+
     with open(cfg_file) as f:
-        cfg_dict = yaml.load(f)
+        cfg_dict = yaml.load(f, Loader=_yaml_loader())
+
+    if cache_dir is not None:
+        _write_config_cache(cache_path, cfg_file, st, cfg_dict)
 
     return cfg_dict
 
@@ -47,6 +115,28 @@ def save_config(cfg_file, cfg_mod):
         yaml.dump(cfg_mod, f)
 
 
+def setup_logging(logging_conf):
+    """Configures logging for the running program.
+
+    The configuration is remembered, so worker processes can be configured the same
+    way (see get_logging_config). Nothing is configured on import; programs call this
+    from their entry point.
+
+    Args
+    ----
+        logging_conf (dict): Logging configuration, in logging.config.dictConfig format.
+
+    """
+    global _logging_conf
+    logging.config.dictConfig(logging_conf)
+    _logging_conf = logging_conf
+
+
+def get_logging_config():
+    """Returns the configuration passed to setup_logging, or None if logging was not set up. """
+    return _logging_conf
+
+
 def clean_data_output_dir(data_output_dir, *file_types):
     """Delete from the working directory all files of the given type (file extension).
 
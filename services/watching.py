@@ -0,0 +1,109 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+
+"""Cheap change detection for datalogger files, used by long-running (watch) processing.
+
+Files are polled with os.stat and reported as changed when their size, modification
+time or inode differs from the previous poll. If the optional inotify_simple package is
+installed (Linux), the watcher sleeps on inotify events for the files' directories
+instead of the full poll interval, so appended rows are picked up right away.
+
+"""
+
+import os
+import time
+
+from services import checkpoints
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+
+def _stat_identity(file_path):
+    try:
+        return checkpoints.get_file_identity(file_path)
+    except OSError:
+        return None
+
+
+class FileWatcher(object):
+    """Detects changed files between polls.
+
+    Parameters
+    ----------
+    file_paths : list of str
+        Files to watch. Files that do not exist (yet) are watched as well.
+    use_inotify : bool, optional
+        Wake up on inotify events, if inotify_simple is installed.
+
+    Example
+    -------
+    >>> watcher = FileWatcher(['/data/cr10x.dat'])
+    >>> watcher.poll()
+    ['/data/cr10x.dat']
+    >>> watcher.poll()
+    []
+
+    """
+    def __init__(self, file_paths, use_inotify=True):
+        self.file_paths = list(dict.fromkeys(file_paths))
+        self._identities = {}
+        self._inotify = None
+
+        if use_inotify and inotify_simple is not None:
+            self._inotify = inotify_simple.INotify()
+            flags = inotify_simple.flags
+            watch_flags = flags.MODIFY | flags.CLOSE_WRITE | flags.CREATE | flags.MOVED_TO
+            for dir_path in sorted({os.path.dirname(os.path.abspath(file_path))
+                                    for file_path in self.file_paths}):
+                if os.path.isdir(dir_path):
+                    self._inotify.add_watch(dir_path, watch_flags)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def poll(self):
+        """Returns the files that changed since the previous poll.
+
+        The first poll reports every existing file, so any backlog is processed.
+
+        Returns
+        -------
+        list of str
+            Changed files, in watched order.
+
+        """
+        changed = []
+
+        for file_path in self.file_paths:
+            identity = _stat_identity(file_path)
+            if identity is not None and identity != self._identities.get(file_path):
+                changed.append(file_path)
+            self._identities[file_path] = identity
+
+        return changed
+
+    def wait(self, timeout):
+        """Waits for the next poll.
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum time to wait, in seconds.
+
+        """
+        if self._inotify is not None:
+            self._inotify.read(timeout=int(timeout * 1000), read_delay=None)
+        else:
+            time.sleep(timeout)
+
+    def close(self):
+        """Stops watching. """
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
@@ -0,0 +1,514 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+
+"""Writers for exporting processed datalogger data.
+
+Output files with a .gz or .zst extension are compressed, one gzip member or zstd
+frame per write, see services.compression.
+
+"""
+
+import io
+import os
+
+from collections import OrderedDict
+from datetime import datetime
+
+from campbellsciparser import cr
+
+from services import compression
+
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+MAX_OPEN_OUTPUT_FILES = 64
+
+PARTITION_FORMATS = OrderedDict([
+    ('daily', '%Y-%m-%d'),
+    ('monthly', '%Y-%m'),
+    ('yearly', '%Y'),
+])
+
+
+def value_to_string(value, include_time_zone=False):
+    """Returns the string representation of a value, as written to output files.
+
+    Parameters
+    ----------
+    value : object
+        Value to convert.
+    include_time_zone : bool, optional
+        Include time zone for datetime values.
+
+    Returns
+    -------
+    str
+        String representation of the value.
+
+    """
+    if isinstance(value, datetime):
+        if include_time_zone:
+            return value.strftime("%Y-%m-%d %H:%M:%S%z")
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+
+    return str(value)
+
+
+class ExportPlan(object):
+    """Column projection for exporting, compiled once per array id or table.
+
+    The plan is reused for every chunk of data and honours the order of the export
+    columns. Export columns not found in a row are skipped.
+
+    Parameters
+    ----------
+    export_columns : list of str or int, optional
+        Columns to export, in output order. If not given, all columns are exported in
+        the data's column order.
+
+    Example
+    -------
+    >>> plan = ExportPlan(['Label_2', 'Label_1'])
+    >>> plan.columns(cr.Row([('Label_1', '123'), ('Label_2', '456'), ('Label_3', '789')]))
+    ['Label_2', 'Label_1']
+
+    """
+    def __init__(self, export_columns=None):
+        self.export_columns = list(export_columns) if export_columns is not None else None
+        self._layout = None
+        self._columns = None
+
+    def columns(self, row):
+        """Returns a row's columns to export, in output order.
+
+        The columns are resolved against the row's column names once, and reused for
+        rows with the same column names.
+
+        Parameters
+        ----------
+        row : Row
+            Row to export.
+
+        Returns
+        -------
+        list of str or int
+            Columns to export. NOTE: Shared by rows with the same column names.
+
+        """
+        layout = tuple(row.keys())
+        if layout != self._layout:
+            if self.export_columns is None:
+                self._columns = list(layout)
+            else:
+                self._columns = [name for name in self.export_columns if name in row]
+            self._layout = layout
+
+        return self._columns
+
+    def iter_columns(self, data):
+        """Iterate over a data set's rows and their columns to export.
+
+        The columns are only resolved again for a row with another number of columns
+        than the row before it, e.g. a short last line; rows of the same length share
+        the data's layout.
+
+        Parameters
+        ----------
+        data : iterable of Row
+            Data to export.
+
+        Yields
+        ------
+        tuple
+            The next row and its columns to export, in output order.
+
+        """
+        columns = num_columns = None
+        for row in data:
+            if len(row) != num_columns:
+                columns, num_columns = self.columns(row), len(row)
+            yield row, columns
+
+    def project(self, data):
+        """Returns a data set holding only the columns to export.
+
+        Parameters
+        ----------
+        data : DataSet
+            Data set to extract columns from.
+
+        Returns
+        -------
+        DataSet
+            Data set ready to export.
+
+        """
+        return cr.DataSet(
+            [cr.Row([(name, row[name]) for name in columns])
+             for row, columns in self.iter_columns(data)])
+
+    def select(self, data):
+        """Returns a columnar data set holding only the columns to export.
+
+        Parameters
+        ----------
+        data : ColumnarDataSet
+            Data set to extract columns from.
+
+        Returns
+        -------
+        ColumnarDataSet
+            Data set ready to export.
+
+        """
+        if self.export_columns is None:
+            return data
+
+        return data.select(self.export_columns)
+
+
+class HeaderMismatchError(ValueError):
+    pass
+
+
+class UnsupportedPartitionError(ValueError):
+    pass
+
+
+def check_partition(partition):
+    """Validates a partition setting.
+
+    Parameters
+    ----------
+    partition : str or None
+        One of PARTITION_FORMATS, or None for no partitioning.
+
+    Raises
+    ------
+    UnsupportedPartitionError: If the partition is not supported.
+
+    """
+    if partition is not None and partition not in PARTITION_FORMATS:
+        msg = "Unsupported partition: {partition}. Supported partitions: {partitions}"
+        raise UnsupportedPartitionError(msg.format(
+            partition=partition, partitions=', '.join(PARTITION_FORMATS)))
+
+
+def get_partition_path(outfile_path, partition_key):
+    """Returns a partition's output path.
+
+    Parameters
+    ----------
+    outfile_path : str
+        Unpartitioned output path.
+    partition_key : str or None
+        Partition key, e.g. '2016-05'. If None, the output is not partitioned.
+
+    Returns
+    -------
+    str
+        Output path with the partition key added to the file name, e.g.
+        /data/Table_2016-05.dat for /data/Table.dat.
+
+    """
+    if partition_key is None:
+        return outfile_path
+
+    root, ext = os.path.splitext(outfile_path)
+    return '{root}_{partition_key}{ext}'.format(root=root, partition_key=partition_key, ext=ext)
+
+
+def partition_data(data, time_column, partition):
+    """Splits a data set into time partitions by a parsed time column.
+
+    Parameters
+    ----------
+    data : DataSet
+        Data set to split.
+    time_column : str or int
+        Parsed time column. Its values' (wall clock) dates decide the partitions.
+    partition : str or None
+        One of PARTITION_FORMATS. If None, the data set is not split.
+
+    Returns
+    -------
+    list of tuple
+        (partition key, DataSet) tuples, in order of first appearance. The partition
+        key is None if not partitioned.
+
+    """
+    if partition is None:
+        return [(None, data)]
+
+    partition_format = PARTITION_FORMATS[partition]
+    partitions = OrderedDict()
+    last_date, last_data = None, None
+
+    for row in data:
+        value = row[time_column]
+        date = value.date()
+        if date != last_date:  # Consecutive rows mostly share a partition.
+            partition_key = value.strftime(partition_format)
+            last_data = partitions.get(partition_key)
+            if last_data is None:
+                last_data = partitions[partition_key] = cr.DataSet()
+            last_date = date
+        last_data.append(row)
+
+    return list(partitions.items())
+
+
+def read_first_line(file_path):
+    """Returns a file's first line, without the line break.
+
+    Parameters
+    ----------
+    file_path : str
+        File's absolute path.
+
+    Returns
+    -------
+    str
+        The file's first line, or an empty string if the file is empty.
+
+    """
+    if compression.get_path_compression(file_path) is not None:
+        with compression.open_input(file_path) as f:
+            return next(compression.iter_lines(f), b'').decode().rstrip('\r\n')
+
+    with open(file_path, 'r') as f:
+        return f.readline().rstrip('\r\n')
+
+
+class AppendWriter(object):
+    """Appends lines to a text file, writing the header only when the file is created.
+
+    The file is opened in append mode with a large write buffer. Each write ends with
+    a single flush and fsync. Compressed files (see services.compression) get one
+    complete gzip member or zstd frame per write, so a file is never left with an
+    unfinished member.
+
+    Parameters
+    ----------
+    outfile_path : str
+        Output file's absolute path.
+    buffer_size : int, optional
+        Write buffer size, in bytes.
+
+    Example
+    -------
+    >>> with AppendWriter(outfile_path) as writer:
+    ...     writer.write(['2016-09-19 00:10:00,0.794'], header='Timestamp,Value')
+
+    """
+    def __init__(self, outfile_path, buffer_size=OUTPUT_BUFFER_SIZE):
+        self.outfile_path = outfile_path
+        self.buffer_size = buffer_size
+        self.compression = compression.get_path_compression(outfile_path)
+        self._file = None
+        self._header_checked = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.outfile_path), exist_ok=True)
+            mode = 'ab' if self.compression else 'a+'
+            self._file = open(self.outfile_path, mode, buffering=self.buffer_size)
+
+        return self._file
+
+    def _check_header(self, f_out, header, out):
+        """Writes the header to out if the file is new, or verifies the existing header. """
+        self._header_checked = True
+
+        if f_out.tell() == 0:
+            out.write(header + "\n")
+            return
+
+        existing_header = read_first_line(self.outfile_path)
+        if existing_header != header:
+            msg = "Header of {outfile_path} does not match: expected '{header}', found "
+            msg += "'{existing_header}'. Move the file aside to start a new one."
+            raise HeaderMismatchError(msg.format(
+                outfile_path=self.outfile_path, header=header,
+                existing_header=existing_header))
+
+    def write(self, lines, header=None):
+        """Appends lines to the file.
+
+        Parameters
+        ----------
+        lines : iterable of str
+            Lines to write, without line breaks.
+        header : str, optional
+            Header line. Written if the file is empty, otherwise verified against the
+            file's first line (once per writer).
+
+        Raises
+        ------
+        HeaderMismatchError: If the file's existing header does not match the header.
+
+        """
+        f_out = self._open()
+        out = io.StringIO() if self.compression else f_out
+
+        if header is not None and not self._header_checked:
+            self._check_header(f_out, header, out)
+
+        for line in lines:
+            out.write(line + "\n")
+
+        if self.compression and out.tell():
+            f_out.write(compression.compress(out.getvalue().encode(), self.compression))
+
+        self.sync()
+
+    def sync(self):
+        """Flushes written lines to disk. """
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """Closes the file. """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class OutputFiles(object):
+    """Append writers kept open for a run, one per output path.
+
+    At most max_open files are kept open. When more are needed (e.g. when writing a
+    backlog to daily partitions), the least recently used file is closed.
+
+    Parameters
+    ----------
+    buffer_size : int, optional
+        Write buffer size, in bytes.
+    max_open : int, optional
+        Maximum number of open files.
+
+    Example
+    -------
+    >>> with OutputFiles() as output_files:
+    ...     export_to_csv(data, outfile_path, output_files=output_files)
+
+    """
+    def __init__(self, buffer_size=OUTPUT_BUFFER_SIZE, max_open=MAX_OPEN_OUTPUT_FILES):
+        self.buffer_size = buffer_size
+        self.max_open = max_open
+        self._writers = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, outfile_path):
+        """Returns the append writer of an output file, creating it if needed.
+
+        Parameters
+        ----------
+        outfile_path : str
+            Output file's absolute path.
+
+        Returns
+        -------
+        AppendWriter
+            The output file's writer.
+
+        """
+        writer = self._writers.get(outfile_path)
+        if writer is None:
+            while len(self._writers) >= self.max_open:
+                _, lru_writer = self._writers.popitem(last=False)
+                lru_writer.close()
+            writer = AppendWriter(outfile_path, buffer_size=self.buffer_size)
+            self._writers[outfile_path] = writer
+        else:
+            self._writers.move_to_end(outfile_path)
+
+        return writer
+
+    def close(self):
+        """Closes all output files. """
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+
+def append_lines(outfile_path, lines, header=None, output_files=None):
+    """Appends lines to a text file.
+
+    Parameters
+    ----------
+    outfile_path : str
+        Output file's absolute path.
+    lines : list of str
+        Lines to write, without line breaks.
+    header : str, optional
+        Header line to write at the top of the output file, if the file is empty.
+    output_files : OutputFiles, optional
+        Open output files to write to. If not given, the output file is opened and
+        closed by this call.
+
+    Raises
+    ------
+    HeaderMismatchError: If the output file's existing header does not match the header.
+
+    """
+    if output_files is None:
+        with AppendWriter(outfile_path) as writer:
+            writer.write(lines, header=header)
+    else:
+        output_files.get(outfile_path).write(lines, header=header)
+
+
+def export_to_csv(data, outfile_path, export_header=False, include_time_zone=False,
+                  export_plan=None, output_files=None):
+    """Appends a data set to a CSV file.
+
+    Output is identical to cr.export_to_csv, except that the header is only written
+    when the output file is created (and otherwise verified).
+
+    Parameters
+    ----------
+    data : iterable of Row
+        Data to export.
+    outfile_path : str
+        Output file's absolute path.
+    export_header : bool, optional
+        Write file header at the top of the output file, if the file is empty.
+    include_time_zone : bool, optional
+        Include time zone in string converted datetime values.
+    export_plan : ExportPlan, optional
+        Columns to export. If not given, all columns are exported.
+    output_files : OutputFiles, optional
+        Open output files to write to. If not given, the output file is opened and
+        closed by this call.
+
+    Raises
+    ------
+    HeaderMismatchError: If the output file's existing header does not match the
+        exported columns.
+
+    """
+    if export_plan is None:
+        export_plan = ExportPlan()
+
+    header = None
+    lines = []
+
+    for row, columns in export_plan.iter_columns(data):
+        if export_header and header is None:
+            header = ",".join(str(name) for name in columns)
+        lines.append(",".join(
+            value_to_string(row[name], include_time_zone) for name in columns))
+
+    if lines:
+        append_lines(outfile_path, lines, header=header, output_files=output_files)
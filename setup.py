@@ -61,7 +61,7 @@ setup(
 
     # You can just specify the packages manually here if your project is
     # simple. Or you can use find_packages().
-    packages=find_packages(exclude=['contrib', 'docs', ]),
+    packages=find_packages(exclude=['contrib', 'docs', 'benchmarks', ]),
 
     # Alternatively, if you want to distribute just a my_module.py, uncomment
     # this:
@@ -80,6 +80,9 @@ setup(
     extras_require={
         #'dev': ['check-manifest'],
         #'test': ['coverage'],
+        'columnar': ['numpy'],
+        'arrow': ['pyarrow'],
+        'watch': ['inotify_simple'],
     },
 
     # If there are data files included in your packages that need to be
@@ -0,0 +1,34 @@
+from benchmarks import datagen
+from benchmarks import formatter_benchmarks
+
+
+def test_generated_files(tmp_path):
+    mixed_file_path, table_file_path = datagen.get_data_files(str(tmp_path), 300)
+
+    with open(mixed_file_path) as f:
+        mixed_lines = f.read().splitlines()
+    with open(table_file_path) as f:
+        table_lines = f.read().splitlines()
+
+    assert len(mixed_lines) == 300
+    assert mixed_lines[144].startswith('101,2016,1,')
+    assert len(table_lines) == 304
+    assert table_lines[4].startswith('"2016-01-01 00:10:00",0,')
+    assert datagen.cr10x_float(0.794) == '.794'
+    assert datagen.cr10x_float(-0.5) == '-.5'
+
+
+def test_run_benchmarks(tmp_path):
+    results = formatter_benchmarks.run_benchmarks([300], data_dir=str(tmp_path), engines=['rows'])
+
+    names = [record['name'] for record in results['results']]
+    assert names == [
+        'process_mixed_array[rows]', 'process_table_based',
+        'mixed_array.read', 'mixed_array.update_column_names', 'mixed_array.parse_time',
+        'mixed_array.projection', 'mixed_array.export',
+        'table.read', 'table.parse_time', 'table.projection', 'table.export',
+    ]
+    assert all(record['rows'] == 300 and record['size'] == '300' for record in results['results'])
+
+    comparison = formatter_benchmarks.compare_results(results, results)
+    assert [ratio for *_, ratio in comparison] == [1.0] * len(names)
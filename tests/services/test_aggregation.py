@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pytest
+import pytz
+
+from services import aggregation
+
+
+def make_aggregation(closed='left'):
+    return aggregation.compile_aggregations({
+        'hourly': {'closed': closed, 'columns': {'Temp': ['mean', 'min', 'max', 'count']}},
+    })[0]
+
+
+def test_incremental_aggregation_matches_single_run():
+    compiled = make_aggregation()
+    times = [datetime(2016, 5, 2, 12, minute) for minute in (0, 30)] + [
+        datetime(2016, 5, 2, 13, minute) for minute in (0, 30)] + [datetime(2016, 5, 2, 14, 0)]
+    values = ['1', '3', 'NAN', '4', '5']
+
+    single_run, _ = aggregation.aggregate(compiled, 'Timestamp', times, {'Temp': values})
+
+    first_run, state = aggregation.aggregate(
+        compiled, 'Timestamp', times[:3], {'Temp': values[:3]})
+    second_run, state = aggregation.aggregate(
+        compiled, 'Timestamp', times[3:], {'Temp': values[3:]}, state)
+
+    assert list(first_run) + list(second_run) == list(single_run)
+    assert [list(row.values()) for row in single_run] == [
+        [datetime(2016, 5, 2, 12), '2.0', '1.0', '3.0', 2],
+        [datetime(2016, 5, 2, 13), '4.0', '4.0', '4.0', 1],
+    ]
+    assert state == {'window': '2016-05-02T14:00:00', 'accumulators': {'Temp': [1, 5.0, 5.0, 5.0]}}
+
+
+def test_right_closed_windows_are_labelled_by_their_end():
+    tz = pytz.timezone('Europe/Stockholm')
+    assert aggregation.get_window(
+        datetime(2016, 5, 2, 12, 0), 'hourly', 'right') == datetime(2016, 5, 2, 12, 0)
+    assert aggregation.get_window(
+        datetime(2016, 5, 2, 12, 10), 'hourly', 'right') == datetime(2016, 5, 2, 13, 0)
+    # The day starts at UTC+1, before the change to daylight saving time.
+    assert aggregation.get_window(
+        tz.localize(datetime(2016, 3, 27, 12, 0)), 'daily') == tz.localize(datetime(2016, 3, 27))
+
+
+def test_compile_aggregations_validates_config():
+    assert aggregation.compile_aggregations(None) == []
+
+    with pytest.raises(aggregation.InvalidAggregationError):
+        aggregation.compile_aggregations({'weekly': {'columns': {'Temp': ['mean']}}})
+    with pytest.raises(aggregation.InvalidAggregationError):
+        aggregation.compile_aggregations({'hourly': {'columns': {'Temp': ['median']}}})
+    with pytest.raises(aggregation.InvalidAggregationError):
+        aggregation.aggregate(make_aggregation(), 'Timestamp', [], {})
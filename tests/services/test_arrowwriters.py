@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+
+from datetime import datetime
+
+import pytest
+import pytz
+
+from campbellsciparser import cr
+
+from services import arrowwriters
+from services import columnar
+from services import writers
+
+pa = pytest.importorskip('pyarrow')
+ds = pytest.importorskip('pyarrow.dataset')
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+TIMES = [datetime(2016, 3, 27, 3, 10), datetime(2016, 3, 27, 1, 50)]
+
+
+def make_data(values):
+    tz = pytz.timezone('Europe/Stockholm')
+    return cr.DataSet([
+        cr.Row([('Timestamp', tz.localize(time)), ('Station', 'Erken'), ('Value', value)])
+        for time, value in zip(TIMES, values)
+    ])
+
+
+@pytest.mark.parametrize('output_format', ['parquet', 'arrow'])
+def test_export_to_file_adds_parts(tmp_path, output_format):
+    outfile_path = arrowwriters.get_output_path(str(tmp_path), 'Table', output_format)
+    export_plan = writers.ExportPlan(['Timestamp', 'Value'])
+
+    arrowwriters.export_to_file(make_data(['0.5', '']), outfile_path, output_format, export_plan)
+    arrowwriters.export_to_file(make_data(['2']), outfile_path, output_format, export_plan)
+
+    table = ds.dataset(outfile_path, format='parquet' if output_format == 'parquet' else 'arrow')
+    table = table.to_table()
+    assert table.schema.types == [pa.timestamp('us', tz='Europe/Stockholm'), pa.float64()]
+    assert table.column('Value').to_pylist() == [0.5, None, 2.0]
+    assert [value.isoformat() for value in table.column('Timestamp').to_pylist()] == [
+        '2016-03-27T03:10:00+02:00', '2016-03-27T01:50:00+01:00', '2016-03-27T03:10:00+02:00']
+
+    with pytest.raises(arrowwriters.SchemaMismatchError):
+        arrowwriters.export_to_file(make_data(['n/a']), outfile_path, output_format, export_plan)
+    with pytest.raises(arrowwriters.SchemaMismatchError):
+        arrowwriters.export_to_file(make_data(['1']), outfile_path, output_format)
+
+
+def test_export_columnar_to_file_matches_rows(tmp_path):
+    pytest.importorskip('numpy')
+    data = make_data(['0.5', '1.5'])
+    column_names = ['Timestamp', 'Station', 'Value']
+    columnar_data = columnar.ColumnarDataSet(column_names, {
+        'Station': columnar.np.array(['Erken', 'Erken']),
+        'Value': columnar.np.array(['0.5', '1.5']),
+    })
+    columnar_data.columns['Timestamp'] = None
+    parsed_times = columnar.timeparsing.from_datetimes(
+        [row['Timestamp'] for row in data], columnar.np.arange(2))
+    columnar._set_time_column(columnar_data, 'Timestamp', parsed_times)
+
+    rows_path = arrowwriters.export_to_file(data, str(tmp_path / 'rows'), 'parquet')
+    columnar_path = arrowwriters.export_columnar_to_file(
+        columnar_data, str(tmp_path / 'columnar'), 'parquet')
+
+    assert pq.read_table(rows_path).equals(pq.read_table(columnar_path))
+
+
+def test_check_output_format():
+    arrowwriters.check_output_format('csv')
+    with pytest.raises(arrowwriters.UnsupportedOutputFormatError):
+        arrowwriters.check_output_format('xlsx')
+
+
+def test_formatter_does_not_import_pyarrow():
+    code = 'import sys; import services.loggerfilesformatter; print("pyarrow" in sys.modules)'
+    output = subprocess.check_output(
+        [sys.executable, '-c', code],
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+    assert output.decode().strip() == 'False'
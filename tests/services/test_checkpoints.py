@@ -0,0 +1,129 @@
+import os
+
+from services import checkpoints
+
+
+def write_lines(file_path, lines, mode='w'):
+    with open(file_path, mode) as f:
+        f.write(''.join(lines))
+
+
+def test_resume_offset_after_append(tmp_path):
+    file_path = str(tmp_path / 'data.dat')
+    write_lines(file_path, ['1,2\n', '3,4\n'])
+
+    identity = checkpoints.get_file_identity(file_path)
+    checkpoint = checkpoints.make_checkpoint(identity.size, identity)
+
+    write_lines(file_path, ['5,6\n'], mode='a')
+    new_identity = checkpoints.get_file_identity(file_path)
+
+    assert checkpoints.get_resume_offset(checkpoint, new_identity) == 8
+
+
+def test_resume_offset_invalid_checkpoints(tmp_path):
+    file_path = str(tmp_path / 'data.dat')
+    write_lines(file_path, ['1,2\n', '3,4\n'])
+    identity = checkpoints.get_file_identity(file_path)
+
+    assert checkpoints.get_resume_offset(None, identity) is None
+
+    other_inode = checkpoints.make_checkpoint(8, identity._replace(inode=identity.inode + 1))
+    assert checkpoints.get_resume_offset(other_inode, identity) is None
+
+    shrunk = checkpoints.make_checkpoint(8, identity._replace(size=identity.size + 1))
+    assert checkpoints.get_resume_offset(shrunk, identity) is None
+
+    rewritten = checkpoints.make_checkpoint(8, identity._replace(mtime=identity.mtime - 1))
+    assert checkpoints.get_resume_offset(rewritten, identity) is None
+
+
+def test_resolve_start_position_without_checkpoint(tmp_path):
+    file_path = str(tmp_path / 'data.dat')
+    write_lines(file_path, ['"Label_1","Label_2"\n', '1,2\n', '3,4\n'])
+    identity = checkpoints.get_file_identity(file_path)
+
+    assert checkpoints.resolve_start_position(file_path, 0, None, identity) == (0, 0)
+    assert checkpoints.resolve_start_position(
+        file_path, 0, None, identity, header_row=0) == (20, 1)
+    assert checkpoints.resolve_start_position(
+        file_path, 2, None, identity, header_row=0) == (24, 2)
+
+
+
+def line_time(line):
+    values = line.split(',')
+    return int(values[0]) if values[0].isdigit() else None
+
+
+def test_find_time_offset_matches_linear_scan(tmp_path):
+    file_path = str(tmp_path / 'data.dat')
+    lines = ['"Time","Value"\n']
+    lines += ['{0},{1}\n'.format(time, value) for time in range(0, 60, 3) for value in 'ab']
+    lines.insert(8, 'n/a,c\n')
+    write_lines(file_path, lines)
+    start_offset = len(lines[0])
+
+    for after in range(-1, 62):
+        expected = start_offset
+        for line in lines[1:]:
+            time = line_time(line)
+            if time is not None and time > after:
+                break
+            expected += len(line)
+        assert checkpoints.find_time_offset(file_path, start_offset, line_time, after) == expected
+
+
+def test_resolve_start_position_after_rotation(tmp_path):
+    file_path = str(tmp_path / 'data.dat')
+    write_lines(file_path, ['1,a\n', '2,b\n', '2,c\n', 'x,d\n', '3,e\n'])
+    identity = checkpoints.get_file_identity(file_path)
+    checkpoint = checkpoints.make_checkpoint(
+        16, identity, file_path, lambda line: line_time(line) is not None)
+    assert (checkpoint['last_line'], checkpoint['num_lines_after']) == ('2,c', 1)
+    assert checkpoints.get_resume_offset(checkpoint, identity, file_path) == 16
+
+    # Rotated: older lines archived, new lines appended.
+    os.remove(file_path)
+    write_lines(file_path, ['2,b\n', '2,c\n', 'x,d\n', '3,e\n', '4,f\n'])
+    identity = checkpoints.get_file_identity(file_path)
+
+    assert checkpoints.get_resume_offset(checkpoint, identity, file_path) is None
+    assert checkpoints.resolve_start_position(
+        file_path, 4, checkpoint, identity, line_time=line_time) == (12, 3)
+
+
+def test_cached_header_skips_unchanged_header(tmp_path, monkeypatch):
+    file_path = str(tmp_path / 'data.dat')
+    write_lines(file_path, ['"TOA5","CR1000"\n', '"TIMESTAMP","Value"\n', '"2016-05-02",1\n'])
+    identity = checkpoints.get_file_identity(file_path)
+
+    header = checkpoints.read_header(file_path, 1)
+    assert header['columns'] == ['TIMESTAMP', 'Value']
+    assert header['size'] == 36
+    checkpoint = checkpoints.make_checkpoint(identity.size, identity, file_path, header=header)
+
+    write_lines(file_path, ['"2016-05-03",2\n'], mode='a')
+    monkeypatch.setattr(checkpoints.readers, 'read_header', None)
+    assert checkpoints.get_cached_header(checkpoint, 1, identity, file_path) == header
+    assert checkpoints.get_cached_header(checkpoint, 0, identity, file_path) is None
+
+    with open(file_path, 'r+') as f:
+        f.write('"TOA5","CR3000"')
+    assert checkpoints.get_cached_header(checkpoint, 1, identity, file_path) is None
+
+
+def test_checkpoint_store_commits_each_save(tmp_path):
+    db_path = str(tmp_path / 'checkpoints.sqlite')
+    key = checkpoints.make_key('loggerfilesformatter', 'site', 'location', 'datalogger', None)
+
+    with checkpoints.CheckpointStore(db_path) as checkpoint_store:
+        assert checkpoint_store.load(key) is None
+        checkpoint_store.save(key, {'line_num': 10, 'checkpoint': None})
+        checkpoint_store.save(key, {'line_num': 12, 'checkpoint': {'byte_offset': 96}})
+
+        with checkpoints.CheckpointStore(db_path) as other_checkpoint_store:
+            assert other_checkpoint_store.load(key) == {
+                'line_num': 12, 'checkpoint': {'byte_offset': 96}}
+
+    assert key == 'loggerfilesformatter/site/location/datalogger'
@@ -0,0 +1,153 @@
+import os
+
+import pytest
+
+from campbellsciparser import cr
+
+from services import columnar
+from services import dedup
+from services import readers
+from services import writers
+
+np = pytest.importorskip('numpy')
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'testdata')
+
+COLUMN_NAMES = ['ID', 'Year', 'Day', 'Hour_Minute', 'Value_1', 'Value_2']
+
+
+def write_lines(file_path, lines):
+    with open(file_path, 'w') as f:
+        f.write(''.join(lines))
+
+
+def test_fix_float_values():
+    values = np.array(['.5', '-.5', '1.5', '-1.5', '100'])
+    assert columnar.fix_float_values(values).tolist() == ['0.5', '-0.5', '1.5', '-1.5', '100']
+
+
+def test_split_array_id(tmp_path):
+    file_path = str(tmp_path / 'data.dat')
+    write_lines(file_path, [
+        '100,2016,263,0,.794,40.99\n',
+        '101,2016,263,14.05,18.11\n',
+        '100,2016,263,10,-.5,41.01\n',
+        '100,2016,263\n',
+    ])
+
+    result = columnar.read_mixed_array_data(file_path)
+    assert columnar.count_array_ids(result.data, ['100']) == 3
+
+    data, mismatches = columnar.split_array_id(result.data, '100', COLUMN_NAMES)
+
+    assert len(data) == 2
+    assert data['Value_1'].tolist() == ['0.794', '-0.5']
+    assert mismatches == [['100', '2016', '263']]
+
+
+def test_parse_time_matches_cr():
+    file_path = os.path.join(TEST_DATA_DIR, 'cr10x_sample_data.dat')
+    time_columns = ['Year', 'Day', 'Hour_Minute']
+
+    rows = readers.read_array_ids_data(file_path, array_id_names={'100': None}).data['100']
+    rows = cr.update_column_names(rows, COLUMN_NAMES)
+    expected = cr.parse_time(
+        rows, time_zone='Europe/Stockholm', time_format_args_library=['%Y', '%j', '%H%M'],
+        time_columns=time_columns, time_parsed_column='Timestamp', to_utc=True)
+
+    data, _ = columnar.split_array_id(
+        columnar.read_mixed_array_data(file_path).data, '100', COLUMN_NAMES)
+    parsed = columnar.parse_time(
+        data, time_zone='Europe/Stockholm', time_format_args_library=['%Y', '%j', '%H%M'],
+        time_columns=time_columns, time_parsed_column='Timestamp', to_utc=True)
+
+    assert parsed.column_names == list(expected[0].keys())
+    assert parsed.datetimes('Timestamp') == [row['Timestamp'] for row in expected]
+
+
+def test_export_to_csv(tmp_path):
+    file_path = str(tmp_path / 'data.dat')
+    outfile_path = str(tmp_path / 'out' / 'data.dat')
+    write_lines(file_path, ['100,2016,263,0,.794,40.99\n', '100,2016,263,10,.5,41.01\n'])
+
+    data, _ = columnar.split_array_id(
+        columnar.read_mixed_array_data(file_path).data, '100', COLUMN_NAMES)
+    data = columnar.parse_time(
+        data, time_zone='UTC', time_format_args_library=['%Y', '%j', '%H%M'],
+        time_columns=['Year', 'Day', 'Hour_Minute'], time_parsed_column='Timestamp')
+
+    columnar.export_to_csv(data.select(['Timestamp', 'Value_1']), outfile_path, export_header=True)
+
+    with open(outfile_path) as f:
+        assert f.read().splitlines() == [
+            'Timestamp,Value_1',
+            '2016-09-19 00:00:00,0.794',
+            '2016-09-19 00:10:00,0.5',
+        ]
+
+
+def read_rows_and_columns(tmp_path):
+    file_path = str(tmp_path / 'data.dat')
+    write_lines(file_path, [
+        '100,2016,263,2350,.794,40.99\n',
+        '100,2016,264,0,.5,41.01\n',
+        '100,2016,263,2350,.794,40.99\n',
+        '100,2016,264,10,.6,41.02\n',
+        '100,2016,265,0,.7,41.03\n',
+    ])
+    time_kwargs = dict(
+        time_zone='Europe/Stockholm', time_format_args_library=['%Y', '%j', '%H%M'],
+        time_columns=['Year', 'Day', 'Hour_Minute'], time_parsed_column='Timestamp')
+
+    rows = readers.read_array_ids_data(file_path, array_id_names={'100': None}).data['100']
+    rows = cr.parse_time(cr.update_column_names(rows, COLUMN_NAMES), **time_kwargs)
+
+    data, _ = columnar.split_array_id(
+        columnar.read_mixed_array_data(file_path).data, '100', COLUMN_NAMES)
+    data = columnar.parse_time(data, **time_kwargs)
+
+    return rows, data
+
+
+def test_partition_data_matches_rows(tmp_path):
+    rows, data = read_rows_and_columns(tmp_path)
+
+    partitions = columnar.partition_data(data, 'Timestamp', 'daily')
+    expected = writers.partition_data(rows, 'Timestamp', 'daily')
+
+    assert [key for key, _ in partitions] == ['2016-09-19', '2016-09-20', '2016-09-21']
+    assert [key for key, _ in partitions] == [key for key, _ in expected]
+    for (_, partition), (_, expected_rows) in zip(partitions, expected):
+        assert partition.datetimes('Timestamp') == [row['Timestamp'] for row in expected_rows]
+        assert partition['Value_1'].tolist() == [row['Value_1'] for row in expected_rows]
+
+
+def test_drop_emitted_rows_matches_rows(tmp_path):
+    rows, data = read_rows_and_columns(tmp_path)
+    high_water_mark = dedup.format_high_water_mark(rows[0]['Timestamp'])
+
+    expected = dedup.drop_emitted_rows(rows, 'Timestamp', high_water_mark)
+    data_new, data_high_water_mark = columnar.drop_emitted_rows(data, 'Timestamp', high_water_mark)
+
+    assert data_new['Value_1'].tolist() == ['0.5', '0.6', '0.7']
+    assert data_new.datetimes('Timestamp') == [row['Timestamp'] for row in expected[0]]
+    assert data_high_water_mark == expected[1]
+
+
+def test_numeric_conversions_match_rows(tmp_path):
+    from services import loggerfilesformatter
+
+    rows, data = read_rows_and_columns(tmp_path)
+    values_to_convert = {
+        'Value_1': {'value_type': 'linear', 'scale': 10, 'offset': -1},
+        'Value_2': {'value_type': 'polynomial', 'coefficients': [0, 0, 1], 'decimals': 1},
+    }
+    time_kwargs = dict(time_zone='UTC', time_format_args_library=['%Y'], to_utc=False)
+
+    rows = loggerfilesformatter.convert_data_column_values(rows, values_to_convert, **time_kwargs)
+    data = columnar.convert_data_column_values(data, values_to_convert, **time_kwargs)
+
+    assert data['Value_1'].tolist() == ['6.94', '4.0', '6.94', '5.0', '6.0']
+    assert data['Value_2'].tolist() == ['1680.2', '1681.8', '1680.2', '1682.6', '1683.5']
+    for name in values_to_convert:
+        assert data[name].tolist() == [row[name] for row in rows]
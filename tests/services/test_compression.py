@@ -0,0 +1,96 @@
+import pytest
+
+from services import checkpoints
+from services import compression
+from services import readers
+from services import writers
+
+
+def append_member(file_path, lines, file_compression=compression.GZIP):
+    with open(file_path, 'ab') as f:
+        f.write(compression.compress(''.join(lines).encode(), file_compression))
+
+
+@pytest.mark.parametrize('file_compression', [compression.GZIP, compression.ZSTD])
+def test_read_appended_compressed_file(tmp_path, file_compression):
+    if file_compression == compression.ZSTD:
+        pytest.importorskip('zstandard')
+    file_path = str(tmp_path / 'data')  # Detected by magic bytes.
+    append_member(file_path, ['"TIMESTAMP","Value"\n', '2016-05-02 12:00:00,1\n'], file_compression)
+
+    first_result = readers.read_table_data(
+        file_path, byte_offset=readers.find_line_offset(file_path, 1), header_row=0)
+    identity = checkpoints.get_file_identity(file_path)
+    checkpoint = checkpoints.make_checkpoint(first_result.byte_offset, identity, file_path)
+
+    append_member(file_path, ['2016-05-02 13:00:00,2\n', '2016-05-02 14:00:00,3\n'], file_compression)
+    identity = checkpoints.get_file_identity(file_path)
+    byte_offset, _ = checkpoints.resolve_start_position(file_path, 2, checkpoint, identity, 0)
+    second_result = readers.read_table_data(file_path, byte_offset=byte_offset, header_row=0)
+
+    assert checkpoint['compression'] == file_compression
+    assert byte_offset == first_result.byte_offset == 42
+    assert [row['Value'] for row in list(first_result.data) + list(second_result.data)] == [
+        '1', '2', '3']
+
+
+def test_resync_rewritten_compressed_file(tmp_path):
+    file_path = str(tmp_path / 'data.dat.gz')
+    append_member(file_path, ['1,a\n', '2,b\n', '3,c\n'])
+    identity = checkpoints.get_file_identity(file_path)
+    checkpoint = checkpoints.make_checkpoint(8, identity, file_path)
+
+    (tmp_path / 'data.dat.gz').unlink()
+    append_member(file_path, ['2,b\n', '3,c\n', '4,d\n'])
+
+    def line_time(line):
+        return int(line.split(',')[0])
+
+    byte_offset, line_num = checkpoints.resolve_start_position(
+        file_path, 2, checkpoint, checkpoints.get_file_identity(file_path), line_time=line_time)
+    assert (byte_offset, line_num) == (4, 1)
+
+
+def test_chunk_checkpoints_do_not_reread_compressed_file(tmp_path, monkeypatch):
+    file_path = str(tmp_path / 'data.dat.gz')
+    append_member(file_path, ['"N","L"\r\n', '1,a\r\n', '\r\n', '2,b\r\n', '3,c\r\n', '4,'])
+    identity = checkpoints.get_file_identity(file_path)
+
+    results = list(readers.read_table_chunks(
+        file_path, chunk_size=1, byte_offset=readers.find_line_offset(file_path, 1),
+        header_row=0))
+    expected = [checkpoints.make_checkpoint(result.byte_offset, identity, file_path)
+                for result in results]
+
+    def read_last_line(*args):
+        raise AssertionError("The last line read is known")
+
+    # Reading the last line back would decompress the file from its start for every chunk.
+    monkeypatch.setattr(checkpoints, 'read_last_line', read_last_line)
+    assert [checkpoints.make_checkpoint(
+        result.byte_offset, identity, file_path, last_line=result.last_line)
+        for result in results] == expected
+    assert [checkpoint['last_line'] for checkpoint in expected] == ['1,a', '2,b', '3,c']
+
+def test_export_to_compressed_csv_appends_members(tmp_path):
+    outfile_path = compression.get_compressed_path(str(tmp_path / 'Table.dat'), compression.GZIP)
+    data = [{'Timestamp': '2016-05-02 12:34:15', 'Value': '1.5'}]
+
+    for _ in range(2):
+        with writers.OutputFiles() as output_files:
+            writers.export_to_csv(data, outfile_path, export_header=True, output_files=output_files)
+
+    assert outfile_path.endswith('Table.dat.gz')
+    assert compression.detect_compression(outfile_path) == compression.GZIP
+    with compression.open_input(outfile_path) as f:
+        assert f.read().decode().splitlines() == [
+            'Timestamp,Value', '2016-05-02 12:34:15,1.5', '2016-05-02 12:34:15,1.5']
+    with pytest.raises(writers.HeaderMismatchError):
+        writers.export_to_csv(data, outfile_path, export_header=True,
+                              export_plan=writers.ExportPlan(['Value']))
+
+
+def test_check_compression():
+    compression.check_compression(None)
+    with pytest.raises(compression.UnsupportedCompressionError):
+        compression.check_compression('bz2')
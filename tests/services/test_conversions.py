@@ -0,0 +1,33 @@
+import pytest
+
+from services import conversions
+
+np = pytest.importorskip('numpy')
+
+
+def test_numeric_conversion_keeps_values_that_are_not_numbers():
+    conversion = conversions.NumericConversion([-40.0, 0.1], decimals=2)
+
+    assert conversion.convert(['650', '-.5', '', 'NAN', 'x']).tolist() == [
+        '25.00', '-40.05', '', 'NAN', 'x']
+    assert conversion.convert([]).tolist() == []
+
+
+def test_conversion_plan():
+    plan = conversions.ConversionPlan({
+        'Timestamp': {'value_type': 'time', 'value_time_columns': ['Year', 'Day']},
+        'Temp_C': {'value_type': 'polynomial', 'coefficients': [1, 2, 3]},
+        'Wind': {'value_type': 'linear', 'scale': 0.5},
+    })
+
+    assert plan.time_conversions == {'Timestamp': ['Year', 'Day']}
+    assert plan.numeric_conversions['Temp_C'].convert(['2']).tolist() == ['17.0']
+    assert plan.numeric_conversions['Wind'].convert(['3']).tolist() == ['1.5']
+    assert not conversions.ConversionPlan(None)
+
+    with pytest.raises(conversions.UnsupportedValueConversionType):
+        conversions.ConversionPlan({'Value': {'value_type': 'lookup'}})
+    with pytest.raises(conversions.InvalidConversionError):
+        conversions.ConversionPlan({'Value': {'value_type': 'polynomial', 'coefficients': []}})
+    with pytest.raises(conversions.InvalidConversionError):
+        conversions.ConversionPlan({'Value': {'value_type': 'linear', 'scale': 'x'}})
@@ -1,43 +1,42 @@
 import os
-import shutil
 
-from services import cr10xformatter
+from services import loggerfilesformatter
 from services import utils
 
 TEST_BASE_DIR = os.path.join(os.path.dirname(__file__))
 TEST_CFG_DIR = os.path.join(TEST_BASE_DIR, 'cfg')
 TEST_DATA_DIR = os.path.join(TEST_BASE_DIR, 'testdata')
-TEST_OUTPUT_DIR = os.path.join(TEST_BASE_DIR, 'testoutput')
 
 
-def test_process_location():
+def test_process_mixed_array(tmp_path):
     config_file = os.path.join(TEST_CFG_DIR, 'cr10x_sample_config.yaml')
-    cfg = utils.load_config(config_file)
+    cfg = utils.load_config(config_file, cache_dir=None)
     site = 'lake'
     location = 'lake_location'
-    testdata_file_path = cfg['sites'][site]['locations'][location]['file_path']
+    datalogger = 'cr10x'
+    output_dir = str(tmp_path)
+    datalogger_info = cfg['sites'][site]['locations'][location]['dataloggers'][datalogger]
+    datalogger_info['file_path'] = os.path.join(TEST_DATA_DIR, datalogger_info['file_path'])
 
-    cfg['sites'][site]['locations'][location]['file_path'] = (
-        os.path.join(TEST_DATA_DIR, testdata_file_path)
-    )
-
-    location_info = cfg['sites'][site]['locations'][location]
-
-    cr10xformatter.process_location(
+    loggerfilesformatter.process_mixed_array(
         cfg=cfg,
-        output_dir=TEST_OUTPUT_DIR,
+        output_dir=output_dir,
         site=site,
         location=location,
-        location_info=location_info
+        datalogger=datalogger,
+        datalogger_info=datalogger_info
     )
 
-    array_ids = location_info.get('array_ids')
+    array_ids = datalogger_info.get('array_ids')
 
     for array_id, array_id_info in array_ids.items():
         array_name = array_id_info.get('name')
-        array_id_path = os.path.join(TEST_OUTPUT_DIR, site, location, array_name + '.dat')
+        array_id_path = os.path.join(output_dir, site, location, datalogger, array_name + '.dat')
 
         assert os.path.exists(array_id_path)
 
-    site_dir_path = os.path.join(TEST_OUTPUT_DIR, site)
-    shutil.rmtree(site_dir_path)
+    with open(os.path.join(output_dir, site, location, datalogger, 'Array_ID_Label_1.dat')) as f:
+        assert f.read().splitlines() == [
+            'Time_parsed_column,Column_name_5,Column_name_6',
+            '2016-09-19 00:00:00,0.794,40.99',
+        ]
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+import pytz
+
+from campbellsciparser import cr
+
+from services import dedup
+
+
+def make_data(times):
+    tz = pytz.timezone('Europe/Stockholm')
+    return cr.DataSet([cr.Row([('Timestamp', tz.localize(time)), ('Value', str(i))])
+                       for i, time in enumerate(times)])
+
+
+def test_drop_emitted_rows():
+    data = make_data([datetime(2016, 5, 2, 12, 0), datetime(2016, 5, 2, 13, 0),
+                      datetime(2016, 5, 2, 13, 0), datetime(2016, 5, 2, 12, 30)])
+
+    data_new, high_water_mark = dedup.drop_emitted_rows(data, 'Timestamp')
+    assert [row['Value'] for row in data_new] == ['0', '1']
+    assert high_water_mark == '2016-05-02T11:00:00+00:00'
+
+    # Memory re-collected: the overlapping rows have already been emitted.
+    data = make_data([datetime(2016, 5, 2, 12, 0), datetime(2016, 5, 2, 13, 0),
+                      datetime(2016, 5, 2, 14, 0)])
+    data_new, high_water_mark = dedup.drop_emitted_rows(data, 'Timestamp', high_water_mark)
+    assert [row['Value'] for row in data_new] == ['2']
+    assert dedup.parse_high_water_mark(high_water_mark) == datetime(
+        2016, 5, 2, 12, 0, tzinfo=pytz.utc)
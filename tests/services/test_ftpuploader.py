@@ -0,0 +1,83 @@
+import ftplib
+import json
+from argparse import Namespace
+
+from services import ftpuploader
+
+FTP_CFG = {'settings': {'ftp-address': 'ftp.example.com'}, 'logging': {'debuglevel': 0}}
+
+
+class FakeFTP(object):
+    connections = []
+
+    def __init__(self, host, *credentials):
+        self.dirs = {'/home'}
+        self.cwd_path = '/home'
+        self.uploads = []
+        self.closed = False
+        FakeFTP.connections.append(self)
+
+    def set_debuglevel(self, level):
+        pass
+
+    def pwd(self):
+        return self.cwd_path
+
+    def cwd(self, path):
+        if path not in self.dirs:
+            raise ftplib.error_perm('550 No such directory')
+        self.cwd_path = path
+
+    def mkd(self, path):
+        self.dirs.add(path)
+
+    def nlst(self):
+        return []
+
+    def storbinary(self, cmd, f):
+        self.uploads.append((self.cwd_path, cmd, f.read().decode('utf-8').splitlines()))
+
+    def quit(self):
+        self.closed = True
+
+
+def make_cfg(tmp_path, line_num):
+    file_path = str(tmp_path / 'table.dat')
+    with open(file_path, 'w') as f:
+        f.write('Timestamp,Value\n2016-05-02 12:00:00,1.5\n')
+
+    return {
+        'settings': {
+            'data_output_dir': str(tmp_path / 'output'),
+            'checkpoint_store_path': str(tmp_path / 'checkpoints.sqlite'),
+        },
+        'sites': {'site': {'locations': {'location': {'files': {'table': {
+            'file_path': file_path, 'header_row': 0, 'line_num': line_num}}}}}},
+    }
+
+
+def test_ftp_session_connects_on_first_upload(tmp_path, monkeypatch):
+    monkeypatch.setattr(ftplib, 'FTP', FakeFTP)
+    monkeypatch.setattr(FakeFTP, 'connections', [])
+    args = Namespace(site=None, location=None, file=None)
+
+    cfg = make_cfg(tmp_path, line_num=2)
+    ftpuploader.process_sites(cfg, args, ftpuploader.FTPSession(FTP_CFG))
+    assert FakeFTP.connections == []
+
+    cfg = make_cfg(tmp_path, line_num=1)
+    cfg['settings']['metrics_file'] = str(tmp_path / 'metrics.json')
+    ftpuploader.process_sites(cfg, args, ftpuploader.FTPSession(FTP_CFG))
+
+    ftp, = FakeFTP.connections
+    assert ftp.uploads == [
+        ('/home/site/location/table', 'STOR table.dat',
+         ['Timestamp,Value', '2016-05-02 12:00:00,1.5'])]
+    assert ftp.closed
+    assert cfg['sites']['site']['locations']['location']['files']['table']['line_num'] == 2
+
+    with open(str(tmp_path / 'metrics.json')) as f:
+        samples = json.load(f)['samples']
+    assert [sample['stage'] for sample in samples] == [
+        'read', 'ftp_session', 'export', 'upload', 'checkpoint']
+    assert samples[3]['rows'] == 1
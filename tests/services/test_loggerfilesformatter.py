@@ -0,0 +1,311 @@
+import copy
+import os
+
+from argparse import Namespace
+
+import pytest
+
+from campbellsciparser import cr
+
+from benchmarks import datagen
+from services import checkpoints
+from services import loggerfilesformatter
+
+TABLE_INFO = {
+    'header_row': 1,
+    'line_num': 4,
+    'time_zone': 'Etc/GMT-1',
+    'time_format_args_library': ['%Y-%m-%d %H:%M:%S'],
+    'time_columns': ['TIMESTAMP'],
+    'time_parsed_column_name': 'Timestamp',
+    'export_columns': ['Timestamp', 'AirTC', 'RH', 'BattV'],
+    'to_utc': True,
+}
+
+
+def make_cfg(tmp_path, num_rows=500, datalogger_settings=None, table_settings=None):
+    mixed_file_path, table_file_path = datagen.get_data_files(str(tmp_path / 'data'), num_rows)
+
+    datalogger_info = {
+        'memory_structure': 'mixed array',
+        'file_path': mixed_file_path,
+        'line_num': 0,
+        'time_zone': 'Europe/Stockholm',
+        'time_format_args_library': ['%Y', '%j', '%H%M'],
+        'array_ids': copy.deepcopy(datagen.MIXED_ARRAY_IDS),
+    }
+    datalogger_info.update(datalogger_settings or {})
+
+    tables = {}
+    for table in ('Hourly', 'Daily'):
+        tables[table] = dict(TABLE_INFO, name=table, file_path=table_file_path)
+        tables[table].update(copy.deepcopy(table_settings or {}))
+
+    return {'sites': {'site': {'locations': {'location': {'dataloggers': {
+        'cr10x': datalogger_info,
+        'cr1000': {'memory_structure': 'table based', 'tables': tables},
+    }}}}}}
+
+
+def get_jobs(cfg):
+    return loggerfilesformatter.collect_jobs(
+        cfg, Namespace(site=None, location=None, datalogger=None, table=None))
+
+
+def read_output_files(output_dir):
+    output_files = {}
+    for dir_path, _, file_names in os.walk(output_dir):
+        for file_name in file_names:
+            file_path = os.path.join(dir_path, file_name)
+            with open(file_path, 'rb') as f:
+                output_files[os.path.relpath(file_path, output_dir)] = f.read()
+
+    return output_files
+
+
+def run_tracked(cfg, output_dir, checkpoint_store_path, workers=1):
+    jobs = get_jobs(cfg)
+    with checkpoints.CheckpointStore(checkpoint_store_path) as checkpoint_store:
+        cfg = loggerfilesformatter.run_jobs(
+            cfg, output_dir, jobs, workers, True, checkpoint_store)
+        stored = [
+            checkpoint_store.load(loggerfilesformatter.get_checkpoint_key(job)) for job in jobs]
+
+    return cfg, stored
+
+
+def test_run_jobs_in_pool_matches_serial_run(tmp_path):
+    serial_cfg = make_cfg(tmp_path)
+    pool_cfg = copy.deepcopy(serial_cfg)
+
+    serial_cfg, serial_stored = run_tracked(
+        serial_cfg, str(tmp_path / 'serial'), str(tmp_path / 'serial.sqlite'))
+    pool_cfg, pool_stored = run_tracked(
+        pool_cfg, str(tmp_path / 'pool'), str(tmp_path / 'pool.sqlite'), workers=2)
+
+    assert get_jobs(pool_cfg) == [
+        ('site', 'location', 'cr10x', None),
+        ('site', 'location', 'cr1000', 'Hourly'),
+        ('site', 'location', 'cr1000', 'Daily'),
+    ]
+    assert pool_cfg == serial_cfg
+    assert pool_stored == serial_stored
+    assert [state['line_num'] for state in pool_stored] == [500, 504, 504]
+    assert read_output_files(str(tmp_path / 'pool')) == read_output_files(
+        str(tmp_path / 'serial'))
+
+
+def test_convert_data_column_values_in_place():
+    data = cr.DataSet([
+        cr.Row([('ID', '101'), ('Year', '2016'), ('Day', '88'), ('Hour_Minute', '230'),
+                ('Value', '.5')])])
+    rows = list(data)
+    values_to_convert = {
+        'Day': {'value_type': 'time', 'value_time_columns': ['Year', 'Day']},
+        'Hour_Minute': {
+            'value_type': 'time', 'value_time_columns': ['Year', 'Day', 'Hour_Minute']},
+    }
+
+    converted = loggerfilesformatter.convert_data_column_values(
+        data, values_to_convert, 'Europe/Stockholm', ['%Y', '%j', '%H%M'], to_utc=True)
+
+    # Both conversions read the original Day value, not the other's converted value.
+    expected = [
+        cr.parse_time(
+            cr.DataSet([cr.Row([('Year', '2016'), ('Day', '88'), ('Hour_Minute', '230')])]),
+            'Europe/Stockholm', ['%Y', '%j', '%H%M'], time_columns, to_utc=True)[0]['Year']
+        for time_columns in (['Year', 'Day'], ['Year', 'Day', 'Hour_Minute'])]
+    assert converted is data
+    assert list(converted) == rows and converted[0] is rows[0]
+    assert list(converted[0].items()) == [
+        ('ID', '101'), ('Year', '2016'), ('Day', expected[0]), ('Hour_Minute', expected[1]),
+        ('Value', '.5')]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_header_mismatch_skips_job(tmp_path, workers):
+    cfg = make_cfg(tmp_path)
+    output_dir = tmp_path / 'output'
+    hourly_file_path = output_dir / 'site' / 'location' / 'cr1000' / 'Hourly.dat'
+    hourly_file_path.parent.mkdir(parents=True)
+    hourly_file_path.write_text('Timestamp,AirTC\n')  # Written with other export columns.
+
+    cfg, stored = run_tracked(cfg, str(output_dir), str(tmp_path / 'cp.sqlite'), workers)
+
+    assert [state and state['line_num'] for state in stored] == [500, None, 504]
+    assert loggerfilesformatter.get_job_cfg(
+        cfg, ('site', 'location', 'cr1000', 'Hourly'))['line_num'] == 4
+    assert hourly_file_path.read_text() == 'Timestamp,AirTC\n'
+
+    # Once the old file is moved aside, the job starts over where it left off.
+    hourly_file_path.rename(tmp_path / 'Hourly.old')
+    cfg, stored = run_tracked(cfg, str(output_dir), str(tmp_path / 'cp.sqlite'), workers)
+
+    assert [state['line_num'] for state in stored] == [500, 504, 504]
+    assert hourly_file_path.read_bytes() == (
+        output_dir / 'site' / 'location' / 'cr1000' / 'Daily.dat').read_bytes()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_watch_sites_processes_appended_rows(tmp_path, monkeypatch, caplog, workers):
+    full_cfg = make_cfg(tmp_path)
+    run_tracked(copy.deepcopy(full_cfg), str(tmp_path / 'batch'), str(tmp_path / 'batch.sqlite'))
+
+    # The watched files start with a part of the data, the rest is appended while watching.
+    full_lines = {}
+    for job in get_jobs(full_cfg):
+        file_path = loggerfilesformatter.get_job_cfg(full_cfg, job)['file_path']
+        with open(file_path) as f:
+            full_lines[os.path.basename(file_path)] = f.readlines()
+
+    watched_dir = tmp_path / 'watched'
+    watched_dir.mkdir()
+    cfg = copy.deepcopy(full_cfg)
+    cfg['settings'] = {'data_output_dir': str(tmp_path / 'output'),
+                       'checkpoint_store_path': str(tmp_path / 'watch.sqlite')}
+    for job in get_jobs(cfg):
+        job_cfg = loggerfilesformatter.get_job_cfg(cfg, job)
+        job_cfg['file_path'] = str(watched_dir / os.path.basename(job_cfg['file_path']))
+
+    def append(file_name, lines):
+        with open(str(watched_dir / file_name), 'a') as f:
+            f.writelines(lines)
+
+    def rewrite(file_name, lines):
+        with open(str(watched_dir / 'tmp'), 'w') as f:
+            f.writelines(lines)
+        os.replace(str(watched_dir / 'tmp'), str(watched_dir / file_name))
+
+    mixed_file_name, table_file_name = sorted(full_lines)
+    mixed_lines, table_lines = full_lines[mixed_file_name], full_lines[table_file_name]
+    bad_line = '"2016-01-01 25:61:00",99,1,2,3,4,5\n'
+    changes = iter([
+        lambda: (append(mixed_file_name, mixed_lines[200:350]),
+                 append(table_file_name, table_lines[200:350])),
+        # The bad row fails the table jobs, the mixed array job keeps running.
+        lambda: (append(mixed_file_name, mixed_lines[350:]),
+                 append(table_file_name, [bad_line] + table_lines[350:400])),
+        lambda: rewrite(table_file_name, table_lines),
+    ])
+    append(mixed_file_name, mixed_lines[:200])
+    append(table_file_name, table_lines[:200])
+    monkeypatch.setattr(
+        loggerfilesformatter.watching.FileWatcher, 'wait', lambda self, timeout: next(changes)())
+
+    args = Namespace(site=None, location=None, datalogger=None, table=None, track=True,
+                     workers=workers, poll_interval=0, metrics_file=None)
+    cfg = loggerfilesformatter.watch_sites(cfg, args, max_polls=4)
+
+    failed = [record for record in caplog.records if record.exc_info]
+    assert len(failed) == 2 and 'TimeParsingError' in failed[0].exc_text
+    assert [loggerfilesformatter.get_job_cfg(cfg, job)['line_num'] for job in get_jobs(cfg)] == [
+        500, 504, 504]
+    assert read_output_files(str(tmp_path / 'output')) == read_output_files(
+        str(tmp_path / 'batch'))
+
+
+def test_resync_after_rewrite_skips_units_rows_quietly(tmp_path, capsys):
+    full_cfg = make_cfg(tmp_path)
+    run_tracked(copy.deepcopy(full_cfg), str(tmp_path / 'batch'), str(tmp_path / 'batch.sqlite'))
+
+    cfg = copy.deepcopy(full_cfg)
+    table_file_path = loggerfilesformatter.get_job_cfg(
+        cfg, ('site', 'location', 'cr1000', 'Hourly'))['file_path']
+    with open(table_file_path) as f:
+        table_lines = f.readlines()
+    with open(table_file_path, 'w') as f:
+        f.writelines(table_lines[:5])
+    run_tracked(cfg, str(tmp_path / 'output'), str(tmp_path / 'cp.sqlite'))
+
+    # The rewritten file gets a new inode, so the units rows before the first (and last
+    # read) data line are searched for the last line read.
+    with open(table_file_path + '.tmp', 'w') as f:
+        f.writelines(table_lines)
+    os.replace(table_file_path + '.tmp', table_file_path)
+    capsys.readouterr()
+    cfg, stored = run_tracked(cfg, str(tmp_path / 'output'), str(tmp_path / 'cp.sqlite'))
+
+    assert capsys.readouterr().out == ''
+    assert [state['line_num'] for state in stored] == [500, 504, 504]
+    assert read_output_files(str(tmp_path / 'output')) == read_output_files(
+        str(tmp_path / 'batch'))
+
+
+def test_parallel_byte_ranges_match_serial_run(tmp_path, monkeypatch):
+    run_byte_ranges_in_pool = loggerfilesformatter.run_byte_ranges_in_pool
+    num_ranges = []
+
+    def count_ranges(prepare_range, byte_ranges, *args):
+        num_ranges.append(len(byte_ranges))
+        return run_byte_ranges_in_pool(prepare_range, byte_ranges, *args)
+
+    monkeypatch.setattr(loggerfilesformatter, 'run_byte_ranges_in_pool', count_ranges)
+    serial_cfg = make_cfg(tmp_path)
+    parallel_settings = {'parallel_workers': 2, 'parallel_range_size': 2000}
+    parallel_cfg = make_cfg(tmp_path, datalogger_settings=parallel_settings,
+                            table_settings=parallel_settings)
+
+    # The last lines are still being written.
+    file_paths = sorted({loggerfilesformatter.get_job_cfg(serial_cfg, job)['file_path']
+                         for job in get_jobs(serial_cfg)})
+    full_lines = {}
+    for file_path in file_paths:
+        with open(file_path) as f:
+            full_lines[file_path] = f.readlines()
+        with open(file_path, 'w') as f:
+            f.writelines(full_lines[file_path][:-100])
+            f.write(full_lines[file_path][-100][:10])
+
+    line_nums = []
+    for _ in range(2):
+        serial_cfg, serial_stored = run_tracked(
+            serial_cfg, str(tmp_path / 'serial'), str(tmp_path / 'serial.sqlite'))
+        parallel_cfg, parallel_stored = run_tracked(
+            parallel_cfg, str(tmp_path / 'parallel'), str(tmp_path / 'parallel.sqlite'))
+
+        assert parallel_stored == serial_stored
+        line_nums.append([state['line_num'] for state in parallel_stored])
+        assert read_output_files(str(tmp_path / 'parallel')) == read_output_files(
+            str(tmp_path / 'serial'))
+
+        for file_path in file_paths:
+            with open(file_path, 'w') as f:
+                f.writelines(full_lines[file_path])
+
+    # Reading resumes at the line that was partly written.
+    assert line_nums == [[400, 404, 404], [500, 504, 504]]
+    assert min(num_ranges) > 1
+
+
+@pytest.mark.parametrize('datalogger_settings', [
+    {'chunk_size': 20}, {'parallel_workers': 2, 'parallel_range_size': 2000}])
+def test_mixed_array_resumes_after_failure_without_duplicates(tmp_path, monkeypatch,
+                                                              datalogger_settings):
+    run_tracked(make_cfg(tmp_path), str(tmp_path / 'batch'), str(tmp_path / 'batch.sqlite'))
+
+    process_array_ids = loggerfilesformatter.process_array_ids
+    num_calls = []
+
+    def fail_third_call(**kwargs):
+        num_calls.append(1)
+        if len(num_calls) == 3:
+            raise RuntimeError("Failed mid-file")
+        return process_array_ids(**kwargs)
+
+    monkeypatch.setattr(loggerfilesformatter, 'process_array_ids', fail_third_call)
+    cfg = make_cfg(tmp_path, datalogger_settings=datalogger_settings)
+    with pytest.raises(RuntimeError):
+        run_tracked(cfg, str(tmp_path / 'output'), str(tmp_path / 'cp.sqlite'))
+    monkeypatch.undo()
+
+    # The chunks written before the failure are committed, the run resumes after them.
+    cfg = make_cfg(tmp_path, datalogger_settings=datalogger_settings)
+    with checkpoints.CheckpointStore(str(tmp_path / 'cp.sqlite')) as checkpoint_store:
+        cfg = loggerfilesformatter.load_checkpoints(cfg, get_jobs(cfg), checkpoint_store)
+    assert 0 < loggerfilesformatter.get_job_cfg(cfg, get_jobs(cfg)[0])['line_num'] < 500
+
+    cfg, stored = run_tracked(cfg, str(tmp_path / 'output'), str(tmp_path / 'cp.sqlite'))
+
+    assert [state['line_num'] for state in stored] == [500, 504, 504]
+    assert read_output_files(str(tmp_path / 'output')) == read_output_files(
+        str(tmp_path / 'batch'))
@@ -0,0 +1,55 @@
+import json
+
+from services import metrics
+
+
+def test_metrics_records_stages():
+    run_metrics = metrics.Metrics('loggerfilesformatter')
+    job_metrics = run_metrics.scope(site='lake', location='buoy', datalogger='cr10x', table=None)
+
+    for rows in [10, 5]:
+        with job_metrics.stage('export') as stage:
+            stage.add(rows=rows)
+    assert list(job_metrics.iterate('read', [1, 2])) == [1, 2]
+    job_metrics.add('read', rows=3, bytes=120)
+
+    samples = run_metrics.snapshot()
+    assert [(sample['stage'], sample['calls'], sample['rows'], sample['bytes'])
+            for sample in samples] == [('export', 2, 15, 0), ('read', 2, 3, 120)]
+    assert 'table' not in samples[0]
+
+    merged_metrics = metrics.Metrics('loggerfilesformatter')
+    merged_metrics.merge(samples)
+    merged_metrics.merge(samples)
+    assert [sample['rows'] for sample in merged_metrics.snapshot()] == [30, 6]
+
+
+def test_null_metrics_records_nothing():
+    job_metrics = metrics.NULL_METRICS.scope(site='lake')
+    with job_metrics.stage('export') as stage:
+        stage.add(rows=10)
+    job_metrics.add('read', rows=3)
+
+    assert metrics.NULL_METRICS.snapshot() == []
+
+
+def test_write_metrics(tmp_path):
+    run_metrics = metrics.Metrics('ftpuploader')
+    run_metrics.scope(site='lake', file='"table"').add('upload', rows=2, bytes=64, seconds=0.5)
+
+    prometheus_file = str(tmp_path / 'metrics.prom')
+    json_file = str(tmp_path / 'metrics.json')
+    metrics.write_metrics(run_metrics, prometheus_file)
+    metrics.write_metrics(run_metrics, json_file)
+
+    with open(prometheus_file) as f:
+        lines = f.read().splitlines()
+    assert ('erkenlab_stage_bytes{program="ftpuploader",site="lake",file="\\"table\\"",'
+            'stage="upload"} 64') in lines
+    assert '# TYPE erkenlab_stage_seconds gauge' in lines
+
+    with open(json_file) as f:
+        written = json.load(f)
+    assert written['program'] == 'ftpuploader'
+    assert written['samples'] == [{'site': 'lake', 'file': '"table"', 'stage': 'upload',
+                                   'calls': 0, 'seconds': 0.5, 'rows': 2, 'bytes': 64}]
@@ -0,0 +1,102 @@
+import os
+
+from services import readers
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'testdata')
+
+
+def write_lines(file_path, lines, mode='w'):
+    with open(file_path, mode) as f:
+        f.write(''.join(lines))
+
+
+def test_find_line_offset(tmp_path):
+    file_path = str(tmp_path / 'data.dat')
+    write_lines(file_path, ['a,b\n', 'c,d\n', 'e,f\n'])
+
+    assert readers.find_line_offset(file_path, 0) == 0
+    assert readers.find_line_offset(file_path, 2) == 8
+    assert readers.find_line_offset(file_path, 10) == 12
+
+
+def test_read_array_ids_data():
+    file_path = os.path.join(TEST_DATA_DIR, 'cr10x_sample_data.dat')
+    result = readers.read_array_ids_data(
+        file_path, array_id_names={'100': 'Array_1', '101': None})
+
+    assert result.num_lines == 2
+    assert result.byte_offset == os.path.getsize(file_path)
+    assert list(result.data['Array_1'][0].values()) == [
+        '100', '2016', '263', '0', '0.794', '40.99']
+    assert list(result.data['101'][0].values()) == [
+        '101', '2016', '263', '14.05', '18.11', '10.67']
+
+
+def test_read_array_ids_data_skips_unknown_array_ids(tmp_path):
+    file_path = str(tmp_path / 'data.dat')
+    write_lines(file_path, ['100,1\n', '102,2\n', '\n', '100,-.5\n'])
+
+    result = readers.read_array_ids_data(file_path, array_id_names={'100': 'A'})
+
+    assert result.num_lines == 4
+    assert [list(row.values()) for row in result.data['A']] == [['100', '1'], ['100', '-0.5']]
+    assert '102' not in result.data
+
+
+def test_read_table_data_resumes_at_byte_offset(tmp_path):
+    file_path = str(tmp_path / 'data.dat')
+    write_lines(file_path, ['"Label_1","Label_2"\n', '1,2\n'])
+
+    byte_offset = readers.find_line_offset(file_path, 1)
+    first_result = readers.read_table_data(file_path, byte_offset=byte_offset, header_row=0)
+    assert [dict(row) for row in first_result.data] == [{'Label_1': '1', 'Label_2': '2'}]
+
+    write_lines(file_path, ['3,4\n', '5,'], mode='a')
+    second_result = readers.read_table_data(
+        file_path, byte_offset=first_result.byte_offset, header_row=0)
+
+    assert [dict(row) for row in second_result.data] == [{'Label_1': '3', 'Label_2': '4'}]
+    assert second_result.num_lines == 1
+    assert second_result.byte_offset == os.path.getsize(file_path) - 2
+
+
+def test_read_table_chunks(tmp_path):
+    file_path = str(tmp_path / 'data.dat')
+    write_lines(file_path, ['1,a\n', '2,b\n', '\n', '3,c\n', '4,d\n', '\n'])
+
+    chunks = list(readers.read_table_chunks(file_path, chunk_size=2, header=['N', 'L']))
+
+    assert [[row['N'] for row in chunk.data] for chunk in chunks] == [['1', '2'], ['3', '4'], []]
+    assert [chunk.num_lines for chunk in chunks] == [2, 3, 1]
+    assert [chunk.byte_offset for chunk in chunks] == [8, 17, 18]
+
+
+def test_read_array_ids_chunks(tmp_path):
+    file_path = str(tmp_path / 'data.dat')
+    write_lines(file_path, ['100,1\n', '101,2\n', '100,3\n', '102,4\n', '100,5\n', '101,6\n'])
+
+    results = list(readers.read_array_ids_chunks(
+        file_path, chunk_size=2, array_id_names={'100': 'A', '101': 'B'}))
+
+    # Every line before a result's byte offset is in the results so far.
+    assert [{name: [row[1] for row in data] for name, data in result.data.items()}
+            for result in results] == [{'A': ['1', '3'], 'B': ['2']}, {'A': ['5'], 'B': ['6']}]
+    assert [result.num_lines for result in results] == [3, 6]
+    assert [result.last_line for result in results] == ['100,3', '101,6']
+    assert results[-1].byte_offset == os.path.getsize(file_path)
+
+
+def test_split_byte_ranges_reads_every_line_once(tmp_path):
+    file_path = str(tmp_path / 'data.dat')
+    write_lines(file_path, ['1,a\n', '22,bb\n', '\n', '333,ccc\n', '4,d\n', '5,'])
+
+    ranges = readers.split_byte_ranges(file_path, byte_offset=4, range_size=5)
+
+    assert ranges == [(4, 10), (10, 19), (19, 23)]
+    results = [readers.read_table_data(file_path, byte_offset=start, end_offset=end,
+                                       header=['N', 'L'])
+               for start, end in ranges]
+    assert [[row['N'] for row in result.data] for result in results] == [
+        ['22'], ['333'], ['4']]
+    assert [result.byte_offset for result in results] == [end for _, end in ranges]
+    assert readers.split_byte_ranges(file_path, byte_offset=23) == []
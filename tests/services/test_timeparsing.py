@@ -0,0 +1,96 @@
+import pytest
+
+from campbellsciparser import cr
+
+from services import timeparsing
+
+CR10X_TIME_FORMATS = ['%Y', '%j', '%H%M']
+
+# Spans the 2016 Central European daylight saving time changes (days 87 and 304).
+CR10X_TIME_VALUES = [
+    (year, day, hour_minute)
+    for year in ['2015', '2016']
+    for day in ['1', '05', '087', '88', '304', '366']
+    for hour_minute in ['0', '5', '59', '100', '159', '200', '230', '300', '2359']
+]
+
+
+def cr_parse_time(time_values, time_zone, time_format_args_library, to_utc=False):
+    time_columns = list(range(len(time_values[0])))
+    data = cr.DataSet([cr.Row(enumerate(values)) for values in time_values])
+
+    return [row[0] for row in cr.parse_time(
+        data, time_zone, time_format_args_library, time_columns, to_utc=to_utc)]
+
+
+@pytest.mark.parametrize('time_zone,to_utc', [
+    ('Europe/Stockholm', False), ('Europe/Stockholm', True), ('Etc/GMT-1', False)])
+def test_parse_matches_cr(time_zone, to_utc):
+    parser = timeparsing.TimeParser(time_zone, CR10X_TIME_FORMATS, to_utc)
+
+    parsed = [parser.parse(values) for values in CR10X_TIME_VALUES]
+    expected = cr_parse_time(CR10X_TIME_VALUES, time_zone, CR10X_TIME_FORMATS, to_utc)
+
+    assert parsed == expected
+    assert [str(value) for value in parsed] == [str(value) for value in expected]
+
+
+def test_parse_falls_back_to_cr():
+    parser = timeparsing.TimeParser('UTC', ['%d/%m/%Y %H:%M'])
+    assert parser.parse(['02/05/2016 12:30']) == cr_parse_time(
+        [['02/05/2016 12:30']], 'UTC', ['%d/%m/%Y %H:%M'])[0]
+
+    parser = timeparsing.TimeParser('UTC', CR10X_TIME_FORMATS)
+    with pytest.raises(cr.TimeParsingError):
+        parser.parse(['2016', '123', '2400'])
+    with pytest.raises(cr.TimeColumnValueError):
+        parser.parse(['2016', '123', '12345'])
+
+
+def test_try_parse_returns_none_quietly(capsys):
+    parser = timeparsing.TimeParser('UTC', ['%Y-%m-%d %H:%M:%S'])
+    assert parser.try_parse(['2016-05-02 12:30:00']) == parser.parse(['2016-05-02 12:30:00'])
+    assert parser.try_parse(['TS']) is None
+
+    parser = timeparsing.TimeParser('UTC', ['%d/%m/%Y %H:%M'])
+    assert parser.try_parse(['02/05/2016 12:30']) == parser.parse(['02/05/2016 12:30'])
+    assert parser.try_parse(['Smp']) is None
+
+    parser = timeparsing.TimeParser('UTC', CR10X_TIME_FORMATS)
+    assert parser.try_parse(['2016', '123', '12345']) is None
+
+    assert capsys.readouterr().out == ''
+
+def test_parse_columns_matches_parse():
+    np = pytest.importorskip('numpy')
+
+    for time_format_args_library, time_values in [
+            (CR10X_TIME_FORMATS, CR10X_TIME_VALUES),
+            (['%Y-%m-%d %H:%M:%S'], [('2016-03-27 01:59:00', ), ('2016-10-30 02:30:00', )]),
+            (['%d/%m/%Y %H:%M'], [('02/05/2016 12:30', ), ('02/05/2016 12:30', )])]:
+        parser = timeparsing.TimeParser('Europe/Stockholm', time_format_args_library)
+        columns = [np.array(column) for column in zip(*time_values)]
+
+        parsed_times = parser.parse_columns(columns)
+
+        expected = [parser.parse(values) for values in time_values]
+        assert timeparsing.to_datetimes(parsed_times) == expected
+        assert timeparsing.format_times(parsed_times, include_time_zone=True).tolist() == [
+            value.strftime('%Y-%m-%d %H:%M:%S%z') for value in expected]
+
+
+def test_parse_time():
+    data = cr.DataSet([cr.Row([
+        ('ID', '100'), ('Year', '2016'), ('Day', '123'), ('Hour_Minute', '1230'),
+        ('Value', '0.5')])])
+    time_columns = ['Year', 'Day', 'Hour_Minute']
+
+    parsed = timeparsing.parse_time(
+        data, 'Europe/Stockholm', CR10X_TIME_FORMATS, time_columns,
+        time_parsed_column='Timestamp', to_utc=True)
+    expected = cr.parse_time(
+        data, 'Europe/Stockholm', CR10X_TIME_FORMATS, time_columns,
+        time_parsed_column='Timestamp', to_utc=True)
+
+    assert parsed.rows == expected.rows
+    assert list(parsed[0]) == list(expected[0])
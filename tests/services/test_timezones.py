@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+from services import timezones
+
+
+@pytest.mark.parametrize('time_zone', ['Europe/Stockholm', 'America/New_York', 'Etc/GMT-1'])
+def test_localize_matches_pytz(time_zone):
+    pytz_time_zone = pytz.timezone(time_zone)
+    table = timezones.OffsetTable(pytz_time_zone, datetime(2016, 1, 1), datetime(2017, 1, 1))
+    # Every quarter of an hour around the 2016 US and EU changes, including ambiguous and
+    # non-existent times.
+    values = [start + timedelta(minutes=15 * i)
+              for start in (datetime(2016, 3, 12), datetime(2016, 3, 26), datetime(2016, 10, 29),
+                            datetime(2016, 11, 5))
+              for i in range(3 * 96)]
+
+    assert [table.localize(value) for value in values] == [
+        pytz_time_zone.localize(value) for value in values]
+    assert [str(table.localize(value)) for value in values] == [
+        str(pytz_time_zone.localize(value)) for value in values]
+
+
+def test_ambiguous_and_non_existent_times():
+    table = timezones.OffsetTable(
+        pytz.timezone('Europe/Stockholm'), datetime(2016, 1, 1), datetime(2017, 1, 1))
+
+    # Non-existent times get the offset before the clock is set forward.
+    assert table.localize(datetime(2016, 3, 27, 2, 30)).utcoffset() == timedelta(hours=1)
+    assert table.localize(datetime(2016, 3, 27, 3, 0)).utcoffset() == timedelta(hours=2)
+    # Ambiguous times get standard time.
+    assert table.localize(datetime(2016, 10, 30, 1, 59)).utcoffset() == timedelta(hours=2)
+    assert table.localize(datetime(2016, 10, 30, 2, 30)).utcoffset() == timedelta(hours=1)
+    assert table.covers(datetime(2016, 5, 2), datetime(2016, 12, 31))
+    assert not table.covers(datetime(2016, 5, 2), datetime(2017, 5, 2))
+
+
+def test_tzinfo_codes_match_localize():
+    np = pytest.importorskip('numpy')
+    table = timezones.OffsetTable(
+        pytz.timezone('Europe/Stockholm'), datetime(2016, 1, 1), datetime(2017, 1, 1))
+    values = [datetime(2016, 3, 27, 1, 59), datetime(2016, 3, 27, 2, 30),
+              datetime(2016, 10, 30, 2, 30), datetime(2016, 10, 30, 3, 0)]
+
+    codes = table.tzinfo_codes(np.array(values, dtype='datetime64[us]'))
+
+    assert [table.tzinfos[code] for code in codes.tolist()] == [
+        table.localize(value).tzinfo for value in values]
+    assert [table.utc_offsets[code] for code in codes.tolist()] == [3600, 3600, 3600, 3600]
@@ -47,6 +47,22 @@ def test_load_config_content():
     assert cfg == expected_cfg_dict
 
 
+def test_load_config_cache(tmp_path):
+    config_file = str(tmp_path / 'config.yaml')
+    cache_dir = str(tmp_path / 'cache')
+    with open(config_file, 'w') as f:
+        f.write('root: test_title\n')
+
+    assert utils.load_config(config_file, cache_dir=cache_dir) == {'root': 'test_title'}
+    assert len(os.listdir(cache_dir)) == 1
+    assert utils.load_config(config_file, cache_dir=cache_dir) == {'root': 'test_title'}
+
+    with open(config_file, 'w') as f:
+        f.write('root: other_title\n')
+
+    assert utils.load_config(config_file, cache_dir=cache_dir) == {'root': 'other_title'}
+
+
 def test_save_config_content():
     output_config_file = os.path.join(TEST_OUTPUT_DIR, 'output_config.yaml')
     cfg = {'root': 'test_title'}
@@ -0,0 +1,25 @@
+import os
+
+from services import watching
+
+
+def test_file_watcher_reports_changed_files(tmp_path):
+    file_path = str(tmp_path / 'data.dat')
+    missing_file_path = str(tmp_path / 'missing.dat')
+    with open(file_path, 'w') as f:
+        f.write('100,2016\n')
+
+    with watching.FileWatcher([file_path, missing_file_path], use_inotify=False) as watcher:
+        assert watcher.poll() == [file_path]
+        assert watcher.poll() == []
+
+        with open(file_path, 'a') as f:
+            f.write('100,2017\n')
+        with open(missing_file_path, 'w') as f:
+            f.write('101,2016\n')
+
+        assert watcher.poll() == [file_path, missing_file_path]
+        assert watcher.poll() == []
+
+        os.remove(missing_file_path)
+        assert watcher.poll() == []
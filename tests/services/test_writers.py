@@ -0,0 +1,118 @@
+from datetime import datetime
+
+import pytest
+import pytz
+
+from campbellsciparser import cr
+
+from services import writers
+
+
+def read_lines(file_path):
+    with open(file_path) as f:
+        return f.read().splitlines()
+
+
+def test_export_to_csv_writes_header_once(tmp_path):
+    outfile_path = str(tmp_path / 'site' / 'output.dat')
+    data = cr.DataSet([
+        cr.Row([('Timestamp', datetime(2016, 5, 2, 12, 34, 15, tzinfo=pytz.UTC)), ('Value', 1.5)])
+    ])
+
+    writers.export_to_csv(data, outfile_path, export_header=True)
+    writers.export_to_csv(data, outfile_path, export_header=True, include_time_zone=True)
+
+    assert read_lines(outfile_path) == [
+        'Timestamp,Value',
+        '2016-05-02 12:34:15,1.5',
+        '2016-05-02 12:34:15+0000,1.5',
+    ]
+
+
+def test_export_to_csv_matches_cr(tmp_path):
+    data = cr.DataSet([
+        cr.Row([(0, '100'), (1, datetime(2016, 9, 19, 0, 10, tzinfo=pytz.UTC)), (2, '0.794')]),
+        cr.Row([(0, '100'), (1, datetime(2016, 9, 19, 0, 20, tzinfo=pytz.UTC)), (2, '-0.5')]),
+    ])
+    cr_outfile_path = str(tmp_path / 'cr.dat')
+    outfile_path = str(tmp_path / 'writers.dat')
+
+    cr.export_to_csv(data, cr_outfile_path, export_header=True)
+    writers.export_to_csv(data, outfile_path, export_header=True)
+
+    assert read_lines(outfile_path) == read_lines(cr_outfile_path)
+
+
+def test_export_to_csv_honours_export_plan_order(tmp_path):
+    outfile_path = str(tmp_path / 'output.dat')
+    data = cr.DataSet([
+        cr.Row([('Timestamp', datetime(2016, 5, 2, 12, 34, 15)), ('Value_1', '0.5'), ('Value_2', '1')]),
+    ])
+    export_plan = writers.ExportPlan(['Value_2', 'Timestamp', 'Missing'])
+
+    writers.export_to_csv(data, outfile_path, export_header=True, export_plan=export_plan)
+
+    assert read_lines(outfile_path) == ['Value_2,Timestamp', '1,2016-05-02 12:34:15']
+    assert list(export_plan.project(data)[0].keys()) == ['Value_2', 'Timestamp']
+
+
+def test_export_plan_resolves_columns_once_per_layout(tmp_path, monkeypatch):
+    outfile_path = str(tmp_path / 'output.dat')
+    export_plan = writers.ExportPlan(['Value', 'Timestamp'])
+    resolved = []
+    columns = export_plan.columns
+    monkeypatch.setattr(export_plan, 'columns', lambda row: resolved.append(row) or columns(row))
+    chunks = [
+        cr.DataSet([cr.Row([('Timestamp', '2016-05-02 12:00:00'), ('Value', str(i))])
+                    for i in range(3)]),
+        # A short last line, then the next chunk with the same layout as the first.
+        cr.DataSet([cr.Row([('Timestamp', '2016-05-02 13:00:00')])]),
+        cr.DataSet([cr.Row([('Timestamp', '2016-05-02 14:00:00'), ('Value', '3')])]),
+    ]
+
+    for chunk in chunks:
+        writers.export_to_csv(chunk, outfile_path, export_plan=export_plan)
+
+    assert read_lines(outfile_path) == [
+        '0,2016-05-02 12:00:00', '1,2016-05-02 12:00:00', '2,2016-05-02 12:00:00',
+        '2016-05-02 13:00:00', '3,2016-05-02 14:00:00']
+    assert resolved == [chunks[0][0], chunks[1][0], chunks[2][0]]
+
+def test_export_to_csv_verifies_existing_header(tmp_path):
+    outfile_path = str(tmp_path / 'output.dat')
+    data = cr.DataSet([cr.Row([('Timestamp', '2016-05-02 12:34:15'), ('Value', '1.5')])])
+
+    with writers.OutputFiles() as output_files:
+        writers.export_to_csv(data, outfile_path, export_header=True, output_files=output_files)
+        writers.export_to_csv(data, outfile_path, export_header=True, output_files=output_files)
+
+    with pytest.raises(writers.HeaderMismatchError):
+        writers.export_to_csv(
+            data, outfile_path, export_header=True, export_plan=writers.ExportPlan(['Value']))
+
+    assert read_lines(outfile_path) == [
+        'Timestamp,Value', '2016-05-02 12:34:15,1.5', '2016-05-02 12:34:15,1.5']
+
+
+def test_partition_data_routes_rows_by_time(tmp_path):
+    times = [datetime(2016, 5, 31, 23, 50), datetime(2016, 6, 1, 0, 0), datetime(2016, 5, 31, 23, 59)]
+    data = cr.DataSet([cr.Row([('Timestamp', time), ('Value', str(i))])
+                       for i, time in enumerate(times)])
+
+    assert writers.partition_data(data, 'Timestamp', None) == [(None, data)]
+    partitions = writers.partition_data(data, 'Timestamp', 'monthly')
+    assert [(key, [row['Value'] for row in rows]) for key, rows in partitions] == [
+        ('2016-05', ['0', '2']), ('2016-06', ['1'])]
+
+    assert writers.get_partition_path('/data/Table.dat', '2016-05') == '/data/Table_2016-05.dat'
+    assert writers.get_partition_path('/data/Table.dat', None) == '/data/Table.dat'
+    with pytest.raises(writers.UnsupportedPartitionError):
+        writers.check_partition('weekly')
+
+    with writers.OutputFiles(max_open=1) as output_files:
+        for key, rows in partitions + partitions:
+            writers.export_to_csv(rows, writers.get_partition_path(str(tmp_path / 'T.dat'), key),
+                                  export_header=True, output_files=output_files)
+
+    assert read_lines(str(tmp_path / 'T_2016-06.dat')) == [
+        'Timestamp,Value', '2016-06-01 00:00:00,1', '2016-06-01 00:00:00,1']